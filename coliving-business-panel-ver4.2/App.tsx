@@ -1,5 +1,6 @@
-import { useState, useEffect, useMemo } from 'react';
+import { useState, useEffect } from 'react';
 import { Conversation } from './lib/data'; 
+import { getConversationsPage, ConversationQuery } from './lib/api';
 import { ConversationTable } from './components/ConversationTable';
 
 import { ConversationDetailSheet } from './components/ConversationDetailSheet';
@@ -15,6 +16,20 @@ import { MessageCircle, CheckCircle, AlertTriangle, ThumbsDown, AlertCircle } fr
 
 
 const API_BASE = "http://127.0.0.1:4000/coliving-ai-os/chat-analysis"; // adjust if backend is elsewhere
+const CONVERSATION_PAGE_SIZE = 200; // conversations per /conversations request
+const FILTER_DEBOUNCE_MS = 300; // wait for typing to pause before re-querying
+
+// The dashboard filters as /conversations query parameters.
+function toConversationQuery(filters: FilterState): ConversationQuery {
+  return {
+    status: filters.status,
+    sentiment: filters.sentiment,
+    emotions: filters.emotions,
+    topics: filters.topics,
+    agentId: filters.agent,
+    search: filters.search,
+  };
+}
 
 export default function App() {
   const [conversations, setConversations] = useState<Conversation[]>([]);
@@ -55,18 +70,21 @@ export default function App() {
   // ----------------------------
   // Fetch conversations
   // ----------------------------
+  // Page through the matches of the current filters (keyset cursor): the
+  // table shows after the first page and the following ones are appended as
+  // they arrive. Filtering happens in the server; a filter change re-queries.
   useEffect(() => {
-    setLoading(true);
-    fetch(`${API_BASE}/conversations`)
-      .then(res => {
-        if (!res.ok) throw new Error(`HTTP ${res.status}`);
-        return res.json();
-      })
-      .then(data => {
-        console.log("✅ Conversations API raw response:", data);
+    let cancelled = false;
+    const query = toConversationQuery(filters);
+
+    const loadPages = async () => {
+      let cursor: string | null = null;
+      do {
+        const page = await getConversationsPage(query, cursor, CONVERSATION_PAGE_SIZE);
+        if (cancelled) return;
 
         try {
-          const normalized: Conversation[] = data.map((c: any) => ({
+          const normalized: Conversation[] = page.conversations.map((c: any) => ({
             ...c,
             id: String(c.id),
             tenantId: String(c.tenantId),
@@ -100,19 +118,34 @@ export default function App() {
             }))
           }));
 
-          console.log("📊 Normalized Conversations:", normalized);
-          setConversations(normalized);
+          const firstPage = cursor === null;
+          setConversations(prev => (firstPage ? normalized : [...prev, ...normalized]));
         } catch (err) {
           console.error("❌ Error normalizing conversations:", err);
           setError("Failed to process conversation data");
+          return;
         }
-      })
-      .catch(err => {
-        console.error("❌ Error fetching conversations:", err);
-        setError(`Failed to fetch conversations: ${err.message}`);
-      })
-      .finally(() => setLoading(false));
-  }, []);
+        setLoading(false);
+        cursor = page.nextCursor;
+      } while (cursor);
+    };
+
+    const timer = setTimeout(() => {
+      loadPages()
+        .catch(err => {
+          console.error("❌ Error fetching conversations:", err);
+          setError(`Failed to fetch conversations: ${err.message}`);
+        })
+        .finally(() => {
+          if (!cancelled) setLoading(false);
+        });
+    }, FILTER_DEBOUNCE_MS);
+
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [filters]);
 
   // ----------------------------
   // Fetch Stats Cards
@@ -124,7 +157,6 @@ export default function App() {
         return res.json();
       })
       .then(data => {
-        console.log("✅ KPIs API response:", data);
         setStats({
           total: data.total ?? 0,
           inProgress: data.inProgress ?? 0,
@@ -141,46 +173,7 @@ export default function App() {
       });
   }, []);
 
-  // Filters (frontend only)
-  const filteredConversations = useMemo(() => {
-    const filtered = conversations.filter(conversation => {
-      try {
-        if (filters.search) {
-          const searchLower = filters.search.toLowerCase();
-          const matchesSearch = 
-            conversation.summary?.toLowerCase().includes(searchLower) ||
-            conversation.topics.some((topic: string) => topic.toLowerCase().includes(searchLower)) ||
-            conversation.emotions.some((emotion: string) => emotion.toLowerCase().includes(searchLower));
-          
-          if (!matchesSearch) return false;
-        }
-
-        if (filters.status !== 'all' && conversation.status !== filters.status) return false;
-        if (filters.sentiment !== 'all' && conversation.sentiment !== filters.sentiment) return false;
-
-        if (filters.emotions.length > 0) {
-          const hasMatchingEmotion = filters.emotions.some(emotion => conversation.emotions.includes(emotion));
-          if (!hasMatchingEmotion) return false;
-        }
-
-        if (filters.topics.length > 0) {
-          const hasMatchingTopic = filters.topics.some(topic => conversation.topics.includes(topic));
-          if (!hasMatchingTopic) return false;
-        }
-
-        return true;
-      } catch (err) {
-        console.error("❌ Error filtering conversation:", err, conversation);
-        return false;
-      }
-    });
-
-    console.log("🎯 Filtered Conversations:", filtered);
-    return filtered;
-  }, [conversations, filters]);
-
   const handleConversationClick = (conversation: Conversation) => {
-    console.log("🔍 Selected conversation:", conversation);
     setSelectedConversation(conversation);
     setIsDetailOpen(true);
   };
@@ -325,7 +318,7 @@ export default function App() {
 
           {/* Trending Topics */}
           <div className="bg-white rounded-xl shadow-sm border border-gray-100 overflow-hidden">
-            <TrendingTopics conversations={filteredConversations} />
+            <TrendingTopics conversations={conversations} />
           </div>
         </div>
 
@@ -344,7 +337,7 @@ export default function App() {
               <div>
                 <h2 className="text-lg font-semibold">Conversation Management</h2>
                 <p className="text-sm text-gray-600 mt-1">
-                  Showing {filteredConversations.length} of {conversations.length} conversations
+                  Showing {conversations.length} of {stats.total} conversations
                 </p>
               </div>
               <div className="text-sm text-gray-500">
@@ -353,7 +346,7 @@ export default function App() {
             </div>
           </div>
           <ConversationTable
-            conversations={filteredConversations}
+            conversations={conversations}
             onConversationClick={handleConversationClick}
           />
         </div>
@@ -363,7 +356,7 @@ export default function App() {
           {/* Sentiment Distribution Plot */}
           <div className="bg-white rounded-xl shadow-sm border border-gray-100 overflow-hidden">
             <SentimentDistributionPlot
-              conversations={filteredConversations}
+              conversations={conversations}
               onConversationClick={handleConversationClick}
               selectedRange={selectedRange}
               customDateRange={customDateRange}
@@ -375,7 +368,7 @@ export default function App() {
           {/* Emotion Distribution Over Time - Right below Sentiment Distribution */}
           <div className="bg-white rounded-xl shadow-sm border border-gray-100 overflow-hidden">
             <EmotionDistributionOverTime 
-              conversations={filteredConversations}
+              conversations={conversations}
               selectedRange={selectedRange}
               customDateRange={customDateRange}
               onRangeChange={setSelectedRange}
@@ -389,7 +382,7 @@ export default function App() {
           {/* Sentiment Trend Over Time */}
           <div className="bg-white rounded-xl shadow-sm border border-gray-100 overflow-hidden">
             <SentimentTrendOverTime 
-              conversations={filteredConversations}
+              conversations={conversations}
               selectedRange={trendSelectedRange}
               customDateRange={trendCustomDateRange}
               onRangeChange={setTrendSelectedRange}
@@ -400,7 +393,7 @@ export default function App() {
           {/* Emotion Trend Over Time */}
           <div className="bg-white rounded-xl shadow-sm border border-gray-100 overflow-hidden">
             <EmotionTrendOverTime 
-              conversations={filteredConversations}
+              conversations={conversations}
               selectedRange={trendSelectedRange}
               customDateRange={trendCustomDateRange}
               onRangeChange={setTrendSelectedRange}
@@ -1,11 +1,15 @@
 import { useEffect, useState } from "react";
-import { Conversation, getSentimentColor } from "../lib/data";
+import { Conversation, Message, getSentimentColor } from "../lib/data";
+import { getConversationMessages } from "../lib/api";
 import { Sheet, SheetContent, SheetHeader, SheetTitle, SheetDescription } from "./ui/sheet";
 import { Badge } from "./ui/badge";
 import { ScrollArea } from "./ui/scroll-area";
 import { Separator } from "./ui/separator";
 import { Avatar, AvatarFallback } from "./ui/avatar";
 
+// Messages per request; the server's default page size.
+const MESSAGE_PAGE_SIZE = 200;
+
 interface ConversationDetailSheetProps {
   conversation: Conversation | null;
   open: boolean;
@@ -40,6 +44,7 @@ export function ConversationDetailSheet({
 }: ConversationDetailSheetProps) {
   const [tenants, setTenants] = useState<Tenant[]>([]);
   const [agents, setAgents] = useState<Agent[]>([]);
+  const [messages, setMessages] = useState<Message[] | null>(null);
 
   useEffect(() => {
     // Fetch tenants
@@ -55,8 +60,43 @@ export function ConversationDetailSheet({
       .catch((err) => console.error("Error fetching agents:", err));
   }, []);
 
+  // Fetch the thread only when a conversation is opened, page by page
+  // (oldest first) until the server has no further cursor.
+  useEffect(() => {
+    setMessages(null);
+    if (!open || !conversation) return;
+
+    let cancelled = false;
+    const loadThread = async () => {
+      let loaded: Message[] = [];
+      let cursor: string | null = null;
+      do {
+        const page = await getConversationMessages(conversation.id, cursor, MESSAGE_PAGE_SIZE);
+        if (cancelled) return;
+        loaded = loaded.concat(
+          page.messages.map((m: any) => ({
+            ...m,
+            id: String(m.id),
+            senderId: String(m.senderId),
+            sentiment: m.sentiment ?? 0,
+            emotionScores: m.emotionScores ?? {},
+          }))
+        );
+        setMessages(loaded);
+        cursor = page.nextCursor;
+      } while (cursor);
+    };
+    loadThread().catch((err) => console.error("Error fetching conversation messages:", err));
+
+    return () => {
+      cancelled = true;
+    };
+  }, [open, conversation?.id]);
+
   if (!conversation) return null;
 
+  const thread = messages ?? conversation.messages ?? [];
+
   const tenant = tenants.find((t) => t.id === conversation.tenantId);
   const getAgent = (agentId: string) => agents.find((a) => a.id === agentId);
 
@@ -136,7 +176,7 @@ export function ConversationDetailSheet({
             <h3 className="font-medium mb-3">Conversation Thread</h3>
             <ScrollArea className="h-[400px] pr-4">
               <div className="space-y-4">
-                {conversation.messages.map((message) => {
+                {thread.map((message) => {
                   const isFromTenant = message.senderType === "tenant";
                   const agent = isFromTenant ? null : getAgent(message.senderId);
 
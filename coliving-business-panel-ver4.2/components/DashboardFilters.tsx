@@ -163,7 +163,7 @@ export function DashboardFilters({ filters, onFiltersChange }: DashboardFiltersP
               <SelectContent>
                 <SelectItem value="all">All</SelectItem>
                 {agents.map((agent) => (
-                  <SelectItem key={agent.id} value={agent.name}>
+                  <SelectItem key={agent.id} value={agent.id}>
                     {agent.name}
                   </SelectItem>
                 ))}
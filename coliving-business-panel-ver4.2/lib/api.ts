@@ -76,14 +76,11 @@ export const topicTypes = [
 ];
 
 // --- API Base ---
-const API_BASE_URL =
-  process.env.NEXT_PUBLIC_API_URL || "http://localhost:4000";
+const API_BASE_URL = `${process.env.NEXT_PUBLIC_API_URL || "http://localhost:4000"}/coliving-ai-os/chat-analysis`;
 
 // --- Generic fetch helpers ---
 async function fetchJSON<T>(path: string): Promise<T> {
-  const res = await fetch(`${API_BASE_URL}${path}`, {
-    headers: { "Content-Type": "application/json" },
-  });
+  const res = await fetch(`${API_BASE_URL}${path}`);
   if (!res.ok) throw new Error(`Failed to fetch ${path}: ${res.statusText}`);
   return res.json();
 }
@@ -97,18 +94,88 @@ export async function getAgents(): Promise<Agent[]> {
   return fetchJSON<Agent[]>("/agents");
 }
 
-export async function getConversations(): Promise<Conversation[]> {
-  const data = await fetchJSON<Conversation[]>("/conversations");
+function normalizeConversation(conv: Conversation): Conversation {
   // convert ISO strings to Date objects
-  return data.map((conv) => ({
+  return {
     ...conv,
     startedAt: new Date(conv.startedAt),
     lastUpdated: new Date(conv.lastUpdated),
-    messages: conv.messages.map((m) => ({
+    messages: (conv.messages || []).map((m) => ({
       ...m,
       timestamp: new Date(m.timestamp),
     })),
-  }));
+  };
+}
+
+export async function getConversations(): Promise<Conversation[]> {
+  const data = await fetchJSON<Conversation[]>("/conversations");
+  return data.map(normalizeConversation);
+}
+
+// --- Server-side filtering + cursor pagination ---
+export interface ConversationQuery {
+  status?: string;
+  tenantId?: string;
+  agentId?: string;
+  dateFrom?: Date;
+  dateTo?: Date;
+  sentiment?: string;
+  emotions?: string[];
+  topics?: string[];
+  search?: string; // text in the summary, a topic or an emotion
+}
+
+export interface ConversationPage {
+  conversations: Conversation[];
+  nextCursor: string | null;
+}
+
+export async function getConversationsPage(
+  query: ConversationQuery = {},
+  cursor: string | null = null,
+  limit = 50
+): Promise<ConversationPage> {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set("cursor", cursor);
+  if (query.status && query.status !== "all") params.set("status", query.status);
+  if (query.tenantId) params.set("tenant_id", query.tenantId);
+  if (query.agentId && query.agentId !== "all") params.set("agent_id", query.agentId);
+  if (query.dateFrom) params.set("date_from", query.dateFrom.toISOString());
+  if (query.dateTo) params.set("date_to", query.dateTo.toISOString());
+  if (query.sentiment && query.sentiment !== "all") params.set("sentiment", query.sentiment);
+  (query.emotions || []).forEach((e) => params.append("emotion", e));
+  (query.topics || []).forEach((t) => params.append("topic", t));
+  if (query.search && query.search.trim()) params.set("search", query.search.trim());
+
+  const res = await fetch(`${API_BASE_URL}/conversations?${params}`);
+  if (!res.ok) throw new Error(`Failed to fetch /conversations: ${res.statusText}`);
+  const data: Conversation[] = await res.json();
+  return {
+    conversations: data.map(normalizeConversation),
+    nextCursor: res.headers.get("X-Next-Cursor"),
+  };
+}
+
+// --- Lazy detail loading ---
+export async function getConversationDetail(id: string): Promise<Conversation> {
+  const data = await fetchJSON<Conversation>(`/conversations/${encodeURIComponent(id)}`);
+  return normalizeConversation(data);
+}
+
+export async function getConversationMessages(
+  id: string,
+  cursor: string | null = null,
+  limit = 200
+): Promise<{ messages: Message[]; nextCursor: string | null }> {
+  const params = new URLSearchParams({ limit: String(limit) });
+  if (cursor) params.set("cursor", cursor);
+  const res = await fetch(`${API_BASE_URL}/conversations/${encodeURIComponent(id)}/messages?${params}`);
+  if (!res.ok) throw new Error(`Failed to fetch messages for ${id}: ${res.statusText}`);
+  const data: Message[] = await res.json();
+  return {
+    messages: data.map((m) => ({ ...m, timestamp: new Date(m.timestamp) })),
+    nextCursor: res.headers.get("X-Next-Cursor"),
+  };
 }
 
 // --- Utility functions (same as data.ts) ---
@@ -0,0 +1,297 @@
+"""
+Optional columnar engine (DuckDB) for the trend charts' full-history scans.
+
+The trend endpoints bucket every analysed message by time. On SQLite that is a
+walk over Message with a lookup per row, plus a Python call per row for the
+local time in zones with DST. With ANALYTICS_ENGINE=duckdb the server keeps,
+per database, an in-memory DuckDB copy of just what those queries read:
+
+    sentiments(ts, sentiment)            one row per analysed message
+    emotions(message_id, ts, emotion)    one row per emotion label
+
+exported through Arrow batches (see columnar.py) in one read transaction, and
+answers the trends there, bucketing in the caller's zone natively. A
+background thread exports a database again once it has changed and its copy is
+ANALYTICS_INTERVAL seconds old; the new copy replaces the old one in a single
+assignment. Until a database's first copy exists, the trends run on SQLite.
+
+Point lookups, listings and the rollup-backed aggregates (KPIs,
+distributions, by-service) stay on SQLite: they read a few hundred
+pre-aggregated rows, which a column scan does not beat (compare the two with
+`python benchmark.py --analytics`).
+
+duckdb and pyarrow are optional; without them the setting is ignored with a
+warning.
+
+    ANALYTICS_ENGINE=duckdb
+    ANALYTICS_INTERVAL=60     seconds; with the export time, how far trends may lag the database
+    ANALYTICS_THREADS=2       DuckDB threads per query
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import timezone
+from typing import Dict, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+import columnar
+from changes import content_version as database_content_version
+from trends import GRANULARITIES, utc_bound
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+ANALYTICS_ENGINE = os.environ.get("ANALYTICS_ENGINE", "sqlite").strip().lower()
+ANALYTICS_INTERVAL = float(os.environ.get("ANALYTICS_INTERVAL", 60))
+ANALYTICS_THREADS = int(os.environ.get("ANALYTICS_THREADS", 2))
+ANALYTICS_POLL = 1.0  # seconds between checks for changed databases
+
+# table -> (columns, SELECT on the SQLite file)
+EXPORTS = {
+    "sentiments": (
+        [("ts", "timestamp"), ("sentiment", "string")],
+        """
+        SELECT m.timestamp, sa.sentiment
+        FROM Message m
+        CROSS JOIN Sentiment_Analysis sa ON sa.message_id = m.message_id
+        WHERE m.timestamp IS NOT NULL
+        """,
+    ),
+    "emotions": (
+        [("message_id", "int64"), ("ts", "timestamp"), ("emotion", "string")],
+        """
+        SELECT m.message_id, m.timestamp, ea.emotion
+        FROM Message m
+        CROSS JOIN Emotion_Analysis ea ON ea.message_id = m.message_id
+        WHERE m.timestamp IS NOT NULL
+        """,
+    ),
+}
+
+logger = logging.getLogger(__name__)
+
+
+def available() -> bool:
+    return duckdb is not None and columnar.available()
+
+
+def enabled() -> bool:
+    return ANALYTICS_ENGINE == "duckdb" and available()
+
+
+# ----------------------------
+# Columnar copies
+# ----------------------------
+class ColumnarCopy:
+    """The DuckDB copy of one database (a federation Shard)."""
+
+    def __init__(self, shard):
+        self.shard = shard
+        self.db = None
+        self.version = None  # shard.version() the copy was exported at
+        self.content: Optional[str] = None  # changes.content_version() of the exported snapshot
+        self.built_at: Optional[float] = None  # monotonic
+        self.attempted_at: Optional[float] = None
+        self.export_seconds: Optional[float] = None
+        self.rows: Dict[str, int] = {}
+        self.exports = 0
+
+    def due(self) -> bool:
+        if self.attempted_at is None:
+            return True
+        if time.monotonic() - self.attempted_at < ANALYTICS_INTERVAL:
+            return False
+        return self.db is None or self.shard.version() != self.version
+
+    def export(self) -> None:
+        """Export the database into a new DuckDB copy and switch to it."""
+        started = time.perf_counter()
+        self.attempted_at = time.monotonic()  # a failed export is retried after the interval
+        version = self.shard.version()
+        db = duckdb.connect(":memory:", config={"threads": ANALYTICS_THREADS})
+        rows = {}
+        with closing(self.shard.read_pool.open()) as source:
+            source.row_factory = None
+            source.execute("BEGIN")  # both tables from one snapshot
+            try:
+                try:
+                    content = database_content_version(source)
+                except sqlite3.OperationalError:
+                    content = "-"  # no change log
+                for table, (columns, sql) in EXPORTS.items():
+                    arrow_schema = columnar.schema(columns)
+                    reader = columnar.pa.RecordBatchReader.from_batches(
+                        arrow_schema, columnar.cursor_batches(source.execute(sql), arrow_schema)
+                    )
+                    db.register("export", reader)
+                    db.execute(f"CREATE TABLE {table} AS SELECT * FROM export")
+                    db.unregister("export")
+                    rows[table] = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            finally:
+                source.rollback()
+        # Queries already running keep the previous copy alive until they finish.
+        self.db, self.version, self.content, self.rows = db, version, content, rows
+        self.built_at = time.monotonic()
+        self.export_seconds = time.perf_counter() - started
+        self.exports += 1
+
+    def stats(self) -> Dict:
+        return {
+            "version": self.version,
+            "contentVersion": self.content,
+            "rows": self.rows,
+            "ageSeconds": round(time.monotonic() - self.built_at, 3) if self.built_at else None,
+            "exportSeconds": round(self.export_seconds, 3) if self.export_seconds is not None else None,
+            "exports": self.exports,
+        }
+
+
+_copies: Dict[str, ColumnarCopy] = {}
+
+
+def copy_of(shard) -> Optional[ColumnarCopy]:
+    """The shard's columnar copy once one was exported, else None (use SQLite)."""
+    copy = _copies.get(shard.path)
+    return copy if copy is not None and copy.db is not None else None
+
+
+def cursor(shard):
+    """A DuckDB connection on the shard's current copy, or None. The caller closes it."""
+    copy = copy_of(shard)
+    return copy.db.cursor() if copy is not None else None
+
+
+def content_version() -> str:
+    """What the copies hold, as changes.content_version() per database ('-' for none yet); for ETags."""
+    return "_".join(copy.content or "-" for copy in _copies.values())
+
+
+def stats() -> Dict:
+    return {path: copy.stats() for path, copy in _copies.items()}
+
+
+class AnalyticsRefresher:
+    """Background thread exporting every database when its copy is missing or due."""
+
+    def __init__(self, shards: Sequence):
+        for shard in shards:
+            _copies.setdefault(shard.path, ColumnarCopy(shard))
+        self.copies = [_copies[shard.path] for shard in shards]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="analytics-refresher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def export_due(self) -> None:
+        """One pass over the databases; also run once before start() to have copies before traffic."""
+        for copy in self.copies:
+            if self._stop.is_set():
+                return
+            try:
+                if copy.due():
+                    copy.export()
+                    logger.info(f"Exported {copy.shard.path} to DuckDB in {copy.export_seconds:.1f}s: {copy.rows}")
+            except Exception:
+                # Typically the schema is not there yet; trends keep running on SQLite.
+                logger.exception(f"DuckDB export of {copy.shard.path} failed")
+
+    def _run(self) -> None:
+        while True:
+            self.export_due()
+            if self._stop.wait(ANALYTICS_POLL):
+                return
+
+
+# ----------------------------
+# Trends
+# ----------------------------
+# Same arguments and results as trends.sentiment_trend / emotion_trend, on a
+# DuckDB connection from cursor().
+def _bucket_query(granularity: str, tz_name: str, date_from: Optional[str], date_to: Optional[str]):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    tz = ZoneInfo(tz_name)
+    clauses: List[str] = ["ts IS NOT NULL"]
+    params: List = [granularity, tz.key]
+    if date_from:
+        clauses.append("ts >= ?")
+        params.append(utc_bound(date_from, tz).replace(tzinfo=timezone.utc))
+    if date_to:
+        clauses.append("ts < ?")
+        params.append(utc_bound(date_to, tz, end=True).replace(tzinfo=timezone.utc))
+    # Weeks truncate to Monday, as in SQLite.
+    return tz, "date_trunc(?, timezone(?, ts))", " AND ".join(clauses), params
+
+
+def sentiment_trend(
+    conn,
+    granularity: str = "day",
+    tz_name: str = "UTC",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> List[Dict]:
+    """Analysed messages per bucket, split into positive / neutral / negative."""
+    tz, bucket, where, params = _bucket_query(granularity, tz_name, date_from, date_to)
+    rows = conn.execute(f"""
+        SELECT
+            {bucket} AS bucket,
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE sentiment = 'positive') AS positive,
+            COUNT(*) FILTER (WHERE sentiment = 'negative') AS negative
+        FROM sentiments
+        WHERE {where}
+        GROUP BY bucket
+        ORDER BY bucket
+    """, params).fetchall()
+    return [
+        {
+            "bucket": start.replace(tzinfo=tz).isoformat(),
+            "total": total,
+            "positive": positive,
+            "neutral": total - positive - negative,
+            "negative": negative,
+        }
+        for start, total, positive, negative in rows
+    ]
+
+
+def emotion_trend(
+    conn,
+    granularity: str = "day",
+    tz_name: str = "UTC",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> List[Dict]:
+    """Per bucket: how many analysed messages there were and how many carried each emotion."""
+    tz, bucket, where, params = _bucket_query(granularity, tz_name, date_from, date_to)
+    rows = conn.execute(f"""
+        WITH bucketed AS (
+            SELECT {bucket} AS bucket, message_id, emotion FROM emotions WHERE {where}
+        )
+        SELECT bucket, emotion, COUNT(DISTINCT message_id), GROUPING(emotion) AS whole_bucket
+        FROM bucketed
+        GROUP BY GROUPING SETS ((bucket, emotion), (bucket))
+    """, params).fetchall()
+
+    totals: Dict = {}
+    emotions: Dict = {}
+    for start, emotion, count, whole_bucket in rows:
+        if whole_bucket:
+            totals[start] = count
+        else:
+            emotions.setdefault(start, {})[emotion] = count
+    return [
+        {"bucket": start.replace(tzinfo=tz).isoformat(), "total": total, "emotions": emotions.get(start, {})}
+        for start, total in sorted(totals.items())
+    ]
@@ -0,0 +1,380 @@
+"""
+Endpoint benchmark against synthetic databases.
+
+For each dataset size, starts the server on a generated database (see
+generate_data.py), calls every endpoint with a fixed number of requests at a
+fixed concurrency over keep-alive connections, and records latency
+percentiles, throughput and the server's peak resident memory. Results are
+written as JSON so runs can be compared over time.
+
+    python benchmark.py --sizes 10k 100k 1M
+    python benchmark.py --sizes 100k --requests 500 --concurrency 8
+    python benchmark.py --compare bench/results/old.json bench/results/new.json
+    python benchmark.py --analytics --sizes 1M       # SQLite vs the DuckDB copy, in process
+
+Identical requests that overlap are coalesced by the server, so results at
+concurrency > 1 include that effect, as they would in production.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from generate_data import generate, parse_size
+
+BASE = "/coliving-ai-os/chat-analysis"
+
+# (path, requests) -- None uses --requests. Full exports are capped because one
+# response is the whole dataset.
+ENDPOINTS: List[Tuple[str, Optional[int]]] = [
+    ("/kpis", None),
+    ("/conversations?limit=50", None),
+    ("/conversations?limit=50&include_messages=false", None),
+    ("/conversations?status=urgent&limit=50", None),
+    ("/conversations?date_from=2025-03-01&date_to=2025-03-31&limit=50", None),
+    ("/conversations", 3),
+    ("/conversations?stream=1&include_messages=false", 3),
+    ("/conversations/CONV-1", None),
+    ("/conversations/CONV-1/messages?limit=50", None),
+    ("/sentiment-distribution", None),
+    ("/sentiment-distribution?date_from=2025-03-01&date_to=2025-03-31", None),
+    ("/emotion-distribution", None),
+    ("/sentiment-trend?granularity=day", None),
+    ("/emotion-trend?granularity=week", None),
+    ("/sentiment-by-service", None),
+    ("/emotion-by-service", None),
+    ("/trending-topics", None),
+    ("/summary", None),
+    ("/tenants", None),
+    ("/agents", None),
+]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+# ----------------------------------------
+# Server process
+# ----------------------------------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path: str, port: int, timeout: float) -> Tuple[subprocess.Popen, float]:
+    """Run the app under uvicorn on `db_path`. Returns the process and its startup time."""
+    env = dict(os.environ, CHAT_DB_PATH=os.path.abspath(db_path))
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE,
+        env=env,
+    )
+    # Startup migrates and backfills documents and rollups; wait for it.
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+            conn.request("GET", BASE + "/kpis")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return process, time.perf_counter() - started
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise TimeoutError(f"server did not answer within {timeout}s")
+
+
+def reset_peak_rss(pid: int) -> bool:
+    """Reset VmHWM so the next reading is the peak for one endpoint (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+# ----------------------------------------
+# Load
+# ----------------------------------------
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_endpoint(port: int, path: str, requests: int, concurrency: int, timeout: float) -> Dict:
+    latencies: List[float] = []
+    errors: List[str] = []
+    sizes: List[int] = []
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker() -> None:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    break
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                conn.request("GET", BASE + path)
+                response = conn.getresponse()
+                body = response.read()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    if response.status == 200:
+                        latencies.append(elapsed)
+                        sizes.append(len(body))
+                    else:
+                        errors.append(str(response.status))
+            except (OSError, http.client.HTTPException) as e:
+                with lock:
+                    errors.append(type(e).__name__)
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(min(concurrency, requests))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    result = {"requests": requests, "errors": len(errors), "wallSeconds": round(wall, 3)}
+    if errors:
+        result["errorKinds"] = sorted(set(errors))
+    if latencies:
+        ms = [value * 1000 for value in latencies]
+        result.update(
+            p50Ms=round(percentile(ms, 50), 2),
+            p95Ms=round(percentile(ms, 95), 2),
+            p99Ms=round(percentile(ms, 99), 2),
+            meanMs=round(statistics.fmean(ms), 2),
+            maxMs=round(max(ms), 2),
+            throughputRps=round(len(latencies) / wall, 1),
+            responseBytes=round(statistics.fmean(sizes)),
+        )
+    return result
+
+
+def bench_database(db_path: str, requests: int, concurrency: int, warmup: int, timeout: float) -> Dict:
+    port = free_port()
+    process, startup = start_server(db_path, port, timeout)
+    try:
+        results = {}
+        for path, count in ENDPOINTS:
+            count = count or requests
+            run_endpoint(port, path, min(warmup, count), 1, timeout)
+            tracked = reset_peak_rss(process.pid)
+            result = run_endpoint(port, path, count, concurrency, timeout)
+            result["peakRssMb"] = peak_rss_mb(process.pid) if tracked else None
+            results[path] = result
+            print(f"  {path:<70} p50 {result.get('p50Ms', '-'):>8} ms  p95 {result.get('p95Ms', '-'):>8} ms  "
+                  f"p99 {result.get('p99Ms', '-'):>8} ms  {result.get('throughputRps', '-'):>8} rps  "
+                  f"{result['peakRssMb'] or '-':>7} MB" + (f"  {result['errors']} errors" if result["errors"] else ""))
+        return {"startupSeconds": round(startup, 2), "endpoints": results}
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def dataset(path: str) -> Dict:
+    with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+        counts = {
+            table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("Conversation", "Message", "Client", "Agent")
+        }
+    counts["fileMb"] = round(os.path.getsize(path) / 1024 / 1024, 1)
+    return counts
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------------
+# SQLite vs DuckDB (analytics.py)
+# ----------------------------------------
+# (label, trend function name, granularity, timezone, date_from, date_to)
+TREND_CASES = [
+    ("sentiment-trend day UTC", "sentiment_trend", "day", "UTC", None, None),
+    ("sentiment-trend week America/New_York", "sentiment_trend", "week", "America/New_York", None, None),
+    ("sentiment-trend hour, 10 days", "sentiment_trend", "hour", "UTC", "2025-03-01", "2025-03-10"),
+    ("emotion-trend week UTC", "emotion_trend", "week", "UTC", None, None),
+    ("emotion-trend month Europe/Berlin", "emotion_trend", "month", "Europe/Berlin", None, None),
+]
+# Served from the day rollups on SQLite; DuckDB scans its copy instead.
+DISTRIBUTION_CASES = [
+    ("sentiment-distribution",
+     "SELECT sentiment, SUM(count) FROM Rollup_Sentiment_Daily GROUP BY sentiment",
+     "SELECT sentiment, COUNT(*) FROM sentiments GROUP BY sentiment"),
+    ("emotion-distribution",
+     "SELECT emotion, SUM(count) FROM Rollup_Emotion_Daily GROUP BY emotion",
+     "SELECT emotion, COUNT(DISTINCT message_id) FROM emotions GROUP BY emotion"),
+]
+
+
+def _timed(fn, repeat: int) -> Tuple[Dict, object]:
+    result = fn()  # warm-up, and the result to compare
+    ms = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        ms.append((time.perf_counter() - started) * 1000)
+    return {"p50Ms": round(percentile(ms, 50), 2), "maxMs": round(max(ms), 2)}, result
+
+
+def bench_analytics(db_path: str, repeat: int) -> Dict:
+    """Each trend (and distribution) query on SQLite and on a DuckDB copy of the same database."""
+    import analytics
+    import trends
+    from federation import Shard
+    from migrations import migrate
+    from rollups import install_rollups
+
+    if not analytics.available():
+        raise SystemExit("--analytics needs duckdb and pyarrow: pip install duckdb pyarrow")
+    with sqlite3.connect(db_path) as conn:
+        migrate(conn)
+        install_rollups(conn)
+    shard = Shard(db_path)
+    copy = analytics.ColumnarCopy(shard)
+    copy.export()
+    duckdb_mb = copy.db.execute("SELECT SUM(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0] / 1024 / 1024
+    print(f"  DuckDB export {copy.export_seconds:.2f}s, {duckdb_mb:.0f} MB, rows {copy.rows}")
+
+    sqlite_conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    sqlite_conn.row_factory = sqlite3.Row
+    duck = copy.db.cursor()
+    cases = {}
+    for label, name, *args in TREND_CASES:
+        on_sqlite, expected = _timed(lambda: getattr(trends, name)(sqlite_conn, *args), repeat)
+        on_duckdb, got = _timed(lambda: getattr(analytics, name)(duck, *args), repeat)
+        cases[label] = {"sqlite": on_sqlite, "duckdb": on_duckdb, "sameResult": got == expected}
+    for label, rollup_sql, scan_sql in DISTRIBUTION_CASES:
+        on_sqlite, _ = _timed(lambda: sqlite_conn.execute(rollup_sql).fetchall(), repeat)
+        on_duckdb, _ = _timed(lambda: duck.execute(scan_sql).fetchall(), repeat)
+        cases[label] = {"sqlite": on_sqlite, "duckdb": on_duckdb}
+    for label, case in cases.items():
+        case["speedup"] = round(case["sqlite"]["p50Ms"] / case["duckdb"]["p50Ms"], 1) if case["duckdb"]["p50Ms"] else None
+        print(f"  {label:<45} sqlite p50 {case['sqlite']['p50Ms']:>9} ms  duckdb p50 {case['duckdb']['p50Ms']:>8} ms  "
+              f"x{case['speedup']}" + ("" if case.get("sameResult", True) else "  RESULTS DIFFER"))
+    duck.close()
+    sqlite_conn.close()
+    return {
+        "exportSeconds": round(copy.export_seconds, 2),
+        "duckdbMb": round(duckdb_mb, 1),
+        "exportedRows": copy.rows,
+        "cases": cases,
+    }
+
+
+# ----------------------------------------
+# Comparison
+# ----------------------------------------
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    for size, run in new["sizes"].items():
+        before = old["sizes"].get(size)
+        if not before:
+            continue
+        print(f"{size} ({old['meta'].get('commit')} -> {new['meta'].get('commit')})")
+        for path, result in run.get("endpoints", {}).items():
+            previous = before["endpoints"].get(path)
+            if not previous or "p95Ms" not in previous or "p95Ms" not in result:
+                continue
+            change = (result["p95Ms"] - previous["p95Ms"]) / previous["p95Ms"] * 100 if previous["p95Ms"] else 0
+            print(f"  {path:<70} p95 {previous['p95Ms']:>8} -> {result['p95Ms']:>8} ms  ({change:+.0f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the chat-analysis endpoints.")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k", "1M"], help="dataset sizes in messages")
+    parser.add_argument("--data-dir", default=os.path.join("bench", "data"), help="where generated databases live")
+    parser.add_argument("--out", default=os.path.join("bench", "results"), help="where results are written")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests per endpoint")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds for startup and each request")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="print p95 changes between two result files")
+    parser.add_argument("--analytics", action="store_true",
+                        help="time the trend queries on SQLite and on the DuckDB copy instead of the endpoints")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per query with --analytics")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    now = datetime.now(timezone.utc)
+    report = {
+        "meta": {
+            "timestamp": now.isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "mode": "analytics" if args.analytics else "endpoints",
+        },
+        "sizes": {},
+    }
+    for size in args.sizes:
+        path = os.path.join(args.data_dir, f"{size.lower()}.db")
+        if not os.path.exists(path):
+            print(f"Generating {path}...")
+            generate(path, parse_size(size))
+        print(f"{size}: {path}")
+        report["sizes"][size] = {"dataset": dataset(path)}
+        if args.analytics:
+            report["sizes"][size].update(bench_analytics(path, args.repeat))
+        else:
+            report["sizes"][size].update(bench_database(path, args.requests, args.concurrency, args.warmup, args.timeout))
+
+    os.makedirs(args.out, exist_ok=True)
+    prefix = "analytics-" if args.analytics else ""
+    out = os.path.join(
+        args.out, f"{prefix}{now.strftime('%Y%m%dT%H%M%SZ')}-{'-'.join(s.lower() for s in args.sizes)}.json"
+    )
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out}")
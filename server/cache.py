@@ -0,0 +1,49 @@
+"""
+In-process result cache for cheap-to-serve, expensive-to-compute endpoints.
+
+An entry is reused while it is younger than its TTL *and* the database has not
+changed since it was computed. Changes are detected with `PRAGMA data_version`,
+which moves whenever another connection commits to the file. The pragma is only
+meaningful per connection, so one long-lived watcher connection per database
+answers it for the whole process.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+_lock = threading.Lock()
+_watchers: Dict[str, sqlite3.Connection] = {}
+_entries: Dict[Hashable, Tuple[int, float, Any]] = {}
+
+
+def data_version(db_path: str) -> int:
+    """A counter that changes whenever any other connection commits to db_path."""
+    with _lock:
+        conn = _watchers.get(db_path)
+        if conn is None:
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            _watchers[db_path] = conn
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def cached(key: Hashable, version: Any, ttl: float, compute: Callable[[], Any]) -> Any:
+    """
+    Return the cached value for key, or compute and store it.
+
+    `version` is the data_version (or replica generation) read before
+    computing, so a commit racing with compute() only makes the next call
+    recompute; it never pins a stale value.
+    """
+    now = time.monotonic()
+    entry = _entries.get(key)
+    if entry is not None and entry[0] == version and now - entry[1] < ttl:
+        return entry[2]
+    value = compute()
+    _entries[key] = (version, now, value)
+    return value
+
+
+def clear() -> None:
+    _entries.clear()
@@ -0,0 +1,220 @@
+"""
+Change feed for live dashboard updates.
+
+Triggers append one `Change_Log` row per write to the tables the panel shows:
+new or edited messages, analysis rows (sentiment, emotion, topic, summary) and
+conversations opening, changing status or going away. Each row carries its
+payload as JSON built at write time, so a delete can be reported after the row
+is gone, and `change_id` (AUTOINCREMENT, never reused) is the cursor clients
+resume from.
+
+Writes to the other tables the API reads (tenants, agents, conversation fields
+other than status) are not logged but counted in `Change_Count`; with the
+latest change_id that gives content_version(), the data's version as every
+server process sees it (ETags).
+
+An `INSERT OR REPLACE` logs only its insert, so clients apply "insert" as an
+upsert. The log is trimmed to the most recent CHANGE_LOG_KEEP rows; a client
+whose cursor is older than that is told to reload instead.
+"""
+
+import json
+import sqlite3
+from typing import Dict, List, Optional
+
+from conversation_store import iso_utc
+
+CHANGE_LOG_KEEP = 100_000
+
+_SENDER_TYPE = """CASE
+                WHEN {ref}.client_id IS NOT NULL THEN 'tenant'
+                WHEN {ref}.agent_id IS NOT NULL THEN 'agent'
+                ELSE 'system'
+            END"""
+
+_STATUS = "CASE {ref}.status WHEN 'in_progress' THEN 'In Progress' ELSE {ref}.status END"
+
+_CONVERSATION_OF_MESSAGE = "(SELECT 'CONV-' || conversation_id FROM Message WHERE message_id = {ref}.message_id)"
+
+# kind -> (table, payload of the changed row as SQL on {ref} = NEW or OLD)
+_PAYLOADS = {
+    "message": ("Message", """json_object(
+            'conversationId', 'CONV-' || {ref}.conversation_id,
+            'id', {ref}.message_id,
+            'senderId', COALESCE({ref}.client_id, {ref}.agent_id),
+            'senderType', """ + _SENDER_TYPE + """,
+            'content', {ref}.content,
+            'timestamp', """ + iso_utc("{ref}.timestamp") + """
+        )"""),
+    "conversation": ("Conversation", """json_object(
+            'conversationId', 'CONV-' || {ref}.conversation_id,
+            'tenantId', {ref}.client_id,
+            'status', """ + _STATUS + """
+        )"""),
+    "sentiment": ("Sentiment_Analysis", """json_object(
+            'conversationId', """ + _CONVERSATION_OF_MESSAGE + """,
+            'messageId', {ref}.message_id,
+            'sentiment', {ref}.sentiment
+        )"""),
+    "emotion": ("Emotion_Analysis", """json_object(
+            'conversationId', """ + _CONVERSATION_OF_MESSAGE + """,
+            'messageId', {ref}.message_id,
+            'emotion', {ref}.emotion
+        )"""),
+    "topic": ("Topic_Analysis", """json_object(
+            'conversationId', 'CONV-' || {ref}.conversation_id,
+            'topic', {ref}.topic
+        )"""),
+    "summary": ("Conversation_Summary", """json_object(
+            'conversationId', 'CONV-' || {ref}.conversation_id,
+            'summary', {ref}.summary_text
+        )"""),
+}
+
+
+def _trigger(kind: str, op: str) -> str:
+    table, payload = _PAYLOADS[kind]
+    ref = "OLD" if op == "delete" else "NEW"
+    event = op.upper()
+    if kind == "conversation" and op == "update":
+        # Only status changes are news to the panel.
+        event, when = "UPDATE OF status", "\n    WHEN OLD.status IS NOT NEW.status"
+    else:
+        when = ""
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS trg_change_log_{kind}_{op}\n"
+        f"    AFTER {event} ON {table}{when}\n"
+        f"    BEGIN\n"
+        f"        INSERT INTO Change_Log (kind, op, data) VALUES ('{kind}', '{op}', {payload.format(ref=ref)});\n"
+        f"    END"
+    )
+
+
+# Writes the API shows but the panel is not sent (tenant and agent profiles,
+# conversation fields other than status) only move a counter, so that
+# content_version() still changes with them.
+_QUIET = {
+    "Client": ("INSERT", "UPDATE", "DELETE"),
+    "Client_Profile": ("INSERT", "UPDATE", "DELETE"),
+    "Agent": ("INSERT", "UPDATE", "DELETE"),
+    "Conversation": ("UPDATE",),
+}
+
+
+def _quiet_trigger(table: str, event: str) -> str:
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS trg_change_log_quiet_{table.lower()}_{event.lower()}\n"
+        f"    AFTER {event} ON {table}\n"
+        f"    BEGIN\n"
+        f"        UPDATE Change_Count SET quiet = quiet + 1;\n"
+        f"    END"
+    )
+
+
+_TRIGGERS = {
+    f"trg_change_log_{kind}_{op}": _trigger(kind, op) for kind in _PAYLOADS for op in ("insert", "update", "delete")
+}
+_TRIGGERS.update({
+    f"trg_change_log_quiet_{table.lower()}_{event.lower()}": _quiet_trigger(table, event)
+    for table, events in _QUIET.items()
+    for event in events
+})
+
+CHANGE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS Change_Log (
+        change_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind       TEXT NOT NULL,
+        op         TEXT NOT NULL,
+        data       TEXT NOT NULL,
+        changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+    )""",
+    # epoch: random per database, so two databases (or one regenerated in
+    # place) never share a version for different data.
+    """CREATE TABLE IF NOT EXISTS Change_Count (
+        id    INTEGER PRIMARY KEY CHECK (id = 1),
+        epoch TEXT NOT NULL DEFAULT (lower(hex(randomblob(4)))),
+        quiet INTEGER NOT NULL DEFAULT 0
+    )""",
+    "INSERT OR IGNORE INTO Change_Count (id) VALUES (1)",
+] + list(_TRIGGERS.values())
+
+
+# ----------------------------
+# Schema
+# ----------------------------
+def install_change_log(conn: sqlite3.Connection) -> None:
+    """
+    Create the log and its triggers. Changes are recorded from here on; there
+    is no backfill. Triggers an older version created with another payload are
+    replaced.
+    """
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for name, sql in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_change_log_%'"
+        ).fetchall():
+            # SQLite keeps the statement without its IF NOT EXISTS.
+            if sql != _TRIGGERS.get(name, "").replace("IF NOT EXISTS ", "", 1):
+                conn.execute(f"DROP TRIGGER {name}")
+        for statement in CHANGE_SCHEMA:
+            conn.execute(statement)
+
+
+def prune_changes(conn: sqlite3.Connection, keep: int = CHANGE_LOG_KEEP) -> int:
+    """Drop all but the newest `keep` changes. Returns how many were dropped."""
+    with conn:
+        return conn.execute(
+            "DELETE FROM Change_Log WHERE change_id <= (SELECT MAX(change_id) FROM Change_Log) - ?", (keep,)
+        ).rowcount
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def latest_change(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COALESCE(MAX(change_id), 0) FROM Change_Log").fetchone()[0]
+
+
+def content_version(conn: sqlite3.Connection) -> str:
+    """
+    Moves with every write the API shows, and reads the same in every process
+    (and replica copy) holding the same data, unlike PRAGMA data_version.
+    """
+    epoch, quiet, latest = conn.execute("""
+        SELECT epoch, quiet, (SELECT COALESCE(MAX(change_id), 0) FROM Change_Log) FROM Change_Count WHERE id = 1
+    """).fetchone()
+    return f"{epoch}.{latest}.{quiet}"
+
+
+def missed_changes(conn: sqlite3.Connection, since: int) -> bool:
+    """
+    True when changes after `since` are no longer all in the log (trimmed, or
+    the database was replaced), so the client has to reload instead.
+    """
+    oldest, latest = conn.execute("""
+        SELECT (SELECT MIN(change_id) FROM Change_Log), (SELECT COALESCE(MAX(change_id), 0) FROM Change_Log)
+    """).fetchone()
+    if since > latest:
+        return True
+    return oldest is not None and since < oldest - 1
+
+
+def read_changes(conn: sqlite3.Connection, since: int, limit: int) -> List[Dict]:
+    """Changes after `since`, oldest first."""
+    rows = conn.execute("""
+        SELECT change_id, kind, op, data, changed_at
+        FROM Change_Log
+        WHERE change_id > ?
+        ORDER BY change_id
+        LIMIT ?
+    """, (since, limit)).fetchall()
+    return [
+        {"changeId": row[0], "kind": row[1], "op": row[2], "changedAt": row[4], **json.loads(row[3])}
+        for row in rows
+    ]
+
+
+def sse(event: str, data: Dict, event_id: Optional[int] = None) -> str:
+    """One Server-Sent Events message."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
@@ -0,0 +1,252 @@
+"""
+Columnar output (Apache Arrow IPC stream or Parquet) for notebooks and BI pulls.
+
+Tables are flat, one row per conversation, message, emotion label or topic,
+and are built from SQLite cursors a batch at a time: rows go straight from
+fetchmany() into Arrow arrays and each batch is written out before the next is
+read, so no JSON is produced or parsed and memory stays bounded by the batch.
+
+pyarrow is optional. Without it the columnar formats are refused (406) and
+JSON keeps working.
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+ARROW = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+MEDIA_TYPES = {"arrow": ARROW, "parquet": PARQUET}
+_ACCEPTED = {ARROW: "arrow", PARQUET: "parquet", "application/x-parquet": "parquet"}
+
+BATCH_SIZE = 50_000  # rows per record batch; one Parquet row group each
+PARQUET_COMPRESSION = "zstd"
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def negotiate(accept: str, fmt: Optional[str]) -> Optional[str]:
+    """
+    'arrow', 'parquet' or None for JSON. `?format=` wins over the Accept
+    header; an unknown format raises ValueError.
+    """
+    if fmt:
+        fmt = fmt.strip().lower()
+        if fmt == "json":
+            return None
+        if fmt not in MEDIA_TYPES:
+            raise ValueError(fmt)
+        return fmt
+    for part in accept.split(","):
+        media, _, params = part.partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue  # explicitly refused
+        chosen = _ACCEPTED.get(media.strip().lower())
+        if chosen:
+            return chosen
+    return None
+
+
+# ----------------------------
+# Conversation tables
+# ----------------------------
+# name -> (columns, SELECT). Each SELECT takes a `{where}` on conversation_id,
+# filled from the same dashboard filters as the JSON listing.
+CONVERSATION_TABLES: Dict[str, Tuple[List[Tuple[str, str]], str]] = {
+    "conversations": (
+        [("conversation_id", "int64"), ("tenant_id", "int64"), ("status", "string"),
+         ("sentiment", "string"), ("started_at", "timestamp"), ("last_updated", "timestamp"),
+         ("summary", "string")],
+        """
+        SELECT
+            d.conversation_id,
+            d.client_id,
+            CASE d.status WHEN 'in_progress' THEN 'In Progress' ELSE d.status END,
+            d.sentiment,
+            d.started_at,
+            d.last_updated,
+            cs.summary_text
+        FROM Conversation_Document d
+        LEFT JOIN Conversation_Summary cs ON cs.conversation_id = d.conversation_id
+        {where}
+        ORDER BY d.conversation_id
+        """,
+    ),
+    "messages": (
+        [("message_id", "int64"), ("conversation_id", "int64"), ("sender_id", "int64"),
+         ("sender_type", "string"), ("content", "string"), ("timestamp", "timestamp"),
+         ("sentiment", "string")],
+        """
+        SELECT
+            m.message_id,
+            m.conversation_id,
+            COALESCE(m.client_id, m.agent_id),
+            CASE
+                WHEN m.client_id IS NOT NULL THEN 'tenant'
+                WHEN m.agent_id IS NOT NULL THEN 'agent'
+                ELSE 'system'
+            END,
+            m.content,
+            m.timestamp,
+            sa.sentiment
+        FROM Message m
+        LEFT JOIN Sentiment_Analysis sa ON sa.message_id = m.message_id
+        {where}
+        ORDER BY m.conversation_id, m.timestamp
+        """,
+    ),
+    "emotions": (
+        [("message_id", "int64"), ("conversation_id", "int64"), ("timestamp", "timestamp"),
+         ("emotion", "string")],
+        """
+        SELECT m.message_id, m.conversation_id, m.timestamp, ea.emotion
+        FROM Message m
+        CROSS JOIN Emotion_Analysis ea ON ea.message_id = m.message_id
+        {where}
+        ORDER BY m.conversation_id, m.timestamp, ea.emotion
+        """,
+    ),
+    "topics": (
+        [("conversation_id", "int64"), ("topic", "string")],
+        """
+        SELECT ta.conversation_id, ta.topic
+        FROM Topic_Analysis ta
+        {where}
+        ORDER BY ta.conversation_id, ta.topic
+        """,
+    ),
+}
+_FILTER_COLUMN = {"conversations": "d", "messages": "m", "emotions": "m", "topics": "ta"}
+
+
+def conversation_table_query(table: str, clauses: List[str], params: List) -> Tuple[List[Tuple[str, str]], str, List]:
+    """Columns, SQL and parameters for one table, limited to conversations matching `clauses` (alias d)."""
+    columns, sql = CONVERSATION_TABLES[table]
+    where = ""
+    if clauses:
+        alias = _FILTER_COLUMN[table]
+        if alias == "d":
+            where = f"WHERE {' AND '.join(clauses)}"
+        else:
+            where = f"""WHERE {alias}.conversation_id IN (
+                SELECT d.conversation_id FROM Conversation_Document d WHERE {' AND '.join(clauses)})"""
+    return columns, sql.format(where=where), list(params)
+
+
+# ----------------------------
+# Arrow encoding
+# ----------------------------
+def _type(name: str):
+    if name == "timestamp":
+        return pa.timestamp("us", tz="UTC")
+    return {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string()}[name]
+
+
+def schema(columns: Sequence[Tuple[str, str]]):
+    return pa.schema([(name, _type(kind)) for name, kind in columns])
+
+
+def _timestamps(values: Sequence[Optional[str]]):
+    """
+    Stored naive-UTC timestamp text as an Arrow timestamp column. Arrow's own
+    ISO-8601 parser does the work; if any value is not ISO-8601, values are
+    parsed one by one and the unparseable ones become null.
+    """
+    text = pa.array([value or None for value in values], type=pa.string())
+    try:
+        naive = pc.cast(text, pa.timestamp("us"))
+    except pa.ArrowInvalid:
+        parsed = []
+        for value in text.to_pylist():
+            try:
+                moment = datetime.fromisoformat(value) if value else None
+            except ValueError:
+                moment = None
+            if moment is not None and moment.tzinfo is not None:
+                moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+            parsed.append(moment)
+        naive = pa.array(parsed, type=pa.timestamp("us"))
+    return naive.cast(pa.timestamp("us", tz="UTC"))
+
+
+def _batch(arrow_schema, rows: Sequence[Sequence]):
+    columns = list(zip(*rows)) if rows else [()] * len(arrow_schema)
+    return pa.record_batch(
+        [
+            _timestamps(values) if pa.types.is_timestamp(field.type) else pa.array(values, type=field.type)
+            for values, field in zip(columns, arrow_schema)
+        ],
+        schema=arrow_schema,
+    )
+
+
+def cursor_batches(cursor: sqlite3.Cursor, arrow_schema, batch_size: int = BATCH_SIZE) -> Iterator:
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield _batch(arrow_schema, rows)
+
+
+class _Sink:
+    """Write-only file that hands what the writer produced back to the caller."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def encode(fmt: str, arrow_schema, batches) -> Iterator[bytes]:
+    """Bytes of an Arrow IPC stream or Parquet file, yielded as each batch is written."""
+    sink = _Sink()
+    out = pa.PythonFile(sink, mode="w")
+    if fmt == "arrow":
+        writer = pa.ipc.new_stream(out, arrow_schema)
+    else:
+        writer = pq.ParquetWriter(out, arrow_schema, compression=PARQUET_COMPRESSION)
+    try:
+        for batch in batches:
+            writer.write_batch(batch)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def encode_rows(fmt: str, columns: Sequence[Tuple[str, str]], rows: Sequence[Dict]) -> bytes:
+    """A small result (list of dicts keyed by column name) as one Arrow or Parquet body."""
+    arrow_schema = schema(columns)
+    batch = _batch(arrow_schema, [tuple(row[name] for name, _ in columns) for row in rows])
+    return b"".join(encode(fmt, arrow_schema, [batch]))
@@ -0,0 +1,98 @@
+"""
+Shared fixtures: the API served from fresh databases.
+
+`serve(*paths)` points the app at the given database files (the live one
+first, as CHAT_DB_PATHS does) and returns a started TestClient, connecting
+from localhost; with `replica_dir` the live one is read from copies, as with
+CHAT_REPLICA_DIR. `seed(path)` writes a small migrated database to serve. The
+slow-query log, when a test turns it on, goes to the test's tmp_path.
+"""
+
+import sqlite3
+from typing import Iterator, Optional
+
+import pytest
+from fastapi.testclient import TestClient
+
+from migrations import migrate
+
+BASE = "/coliving-ai-os/chat-analysis"
+
+STATUSES = ("solved", "in_progress", "urgent")
+SENTIMENTS = ("negative", "positive", "neutral", "negative")
+EMOTIONS = ("anger", "joy", "sadness")
+TOPICS = ("noise", "billing", "maintenance")
+
+
+def seed(path: str, conversations: int = 12, first_id: int = 1, tenants=(1, 2, 3), agents=(7, 8)) -> None:
+    """
+    `conversations` conversations numbered from `first_id`, one a day from
+    2025-08-01, cycling through the tenants, agents, statuses and labels
+    above: a tenant message, an agent reply, and analyses of both.
+    """
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    for tenant in tenants:
+        conn.execute("INSERT OR IGNORE INTO Client (client_id, name) VALUES (?, ?)", (tenant, f"Tenant {tenant}"))
+    for agent in agents:
+        conn.execute("INSERT OR IGNORE INTO Agent (agent_id, name) VALUES (?, ?)", (agent, f"Agent {agent}"))
+    for i in range(conversations):
+        conversation_id = first_id + i
+        tenant, agent = tenants[i % len(tenants)], agents[i % len(agents)]
+        day = f"2025-08-{1 + i % 28:02d}"
+        conn.execute(
+            "INSERT INTO Conversation (conversation_id, client_id, started_at, status) VALUES (?, ?, ?, ?)",
+            (conversation_id, tenant, f"{day}T09:00:00", STATUSES[i % len(STATUSES)]),
+        )
+        asked = conn.execute(
+            "INSERT INTO Message (content, client_id, timestamp, conversation_id) VALUES (?, ?, ?, ?)",
+            (f"aircond leaking in room {conversation_id}", tenant, f"{day}T09:00:00", conversation_id),
+        ).lastrowid
+        replied = conn.execute(
+            "INSERT INTO Message (content, agent_id, timestamp, conversation_id) VALUES (?, ?, ?, ?)",
+            ("we check tomorrow", agent, f"{day}T09:05:00", conversation_id),
+        ).lastrowid
+        conn.execute(
+            "INSERT INTO Sentiment_Analysis (message_id, sentiment) VALUES (?, ?), (?, 'neutral')",
+            (asked, SENTIMENTS[i % len(SENTIMENTS)], replied),
+        )
+        conn.execute("INSERT INTO Emotion_Analysis (message_id, emotion) VALUES (?, ?)", (asked, EMOTIONS[i % 3]))
+        conn.execute("INSERT INTO Topic_Analysis (conversation_id, topic) VALUES (?, ?)", (conversation_id, TOPICS[i % 3]))
+        conn.execute(
+            "INSERT INTO Conversation_Summary (conversation_id, summary_text) VALUES (?, ?)",
+            (conversation_id, f"Aircond leak in room {conversation_id}."),
+        )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(autouse=True)
+def slow_query_log(tmp_path, monkeypatch) -> str:
+    import slow_queries
+
+    path = str(tmp_path / "slow_queries.jsonl")
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_LOG", path)
+    return path
+
+
+@pytest.fixture
+def serve(monkeypatch) -> Iterator:
+    import cache
+    import main
+    import warmup
+    from federation import Federation
+
+    clients = []
+
+    def start(*paths: str, replica_dir: Optional[str] = None) -> TestClient:
+        monkeypatch.setattr(main, "federation", Federation(list(paths), replica_dir=replica_dir))
+        monkeypatch.setattr(warmup, "WARMUP", False)
+        cache.clear()
+        client = TestClient(main.app, client=("127.0.0.1", 50000))
+        client.__enter__()  # runs the lifespan: installs, then serves
+        clients.append(client)
+        return client
+
+    yield start
+    for client in clients:
+        client.__exit__(None, None, None)
@@ -0,0 +1,651 @@
+"""
+Materialized conversation documents.
+
+`Conversation_Document` keeps the JSON that `/conversations` returns for each
+conversation, already built. Triggers on the source tables only flag the
+affected conversation as stale, so writers from the preprocess job and the
+Streamlit chatroom stay cheap; the server rebuilds just the stale documents on
+its next read.
+
+Backfill or repair with:
+
+    python conversation_store.py rebuild [--db database/test.db]
+"""
+
+import argparse
+import base64
+import json
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# ----------------------------
+# Document query
+# ----------------------------
+def iso_utc(expr: str) -> str:
+    """
+    SQL formatting a stored naive-UTC timestamp as ISO-8601 with a `Z` suffix
+    ('2025-08-11T21:49:00Z'). A non-zero fraction of a second is kept as
+    stored: the chatroom writes microseconds, which strftime('%f') would cut to
+    milliseconds. Empty values become NULL; text SQLite cannot parse is passed
+    through unchanged.
+    """
+    # The digits after 'YYYY-MM-DDTHH:MM:SS.', up to any offset or 'Z'.
+    tail = f"substr({expr}, 21)"
+    fraction = f"substr({expr}, 21, length({tail}) - length(ltrim({tail}, '0123456789')))"
+    return f"""CASE
+        WHEN {expr} IS NULL OR {expr} = '' THEN NULL
+        WHEN strftime('%f', {expr}) IS NULL THEN {expr}
+        WHEN substr({expr}, 20, 1) = '.' AND rtrim({fraction}, '0') <> ''
+            THEN strftime('%Y-%m-%dT%H:%M:%S', {expr}) || '.' || {fraction} || 'Z'
+        ELSE strftime('%Y-%m-%dT%H:%M:%SZ', {expr})
+    END"""
+
+
+# One row per conversation: (conversation_id, client_id, status, first_message_at,
+# last_message_at, document). The two timestamps are raw, for filtering and
+# cursors; the document carries them formatted. Callers append a WHERE on `c`.
+DOCUMENT_SELECT = f"""
+    SELECT
+        c.conversation_id,
+        c.client_id,
+        c.status,
+        (SELECT MIN(timestamp) FROM Message WHERE conversation_id = c.conversation_id) AS first_message_at,
+        (SELECT MAX(timestamp) FROM Message WHERE conversation_id = c.conversation_id) AS last_message_at,
+        json_object(
+            'id', 'CONV-' || c.conversation_id,
+            'tenantId', c.client_id,
+            'agentIds', (
+                SELECT json_group_array(DISTINCT m2.agent_id)
+                FROM Message m2
+                WHERE m2.conversation_id = c.conversation_id
+                  AND m2.agent_id IS NOT NULL
+            ),
+            'status', CASE c.status
+                        WHEN 'in_progress' THEN 'In Progress'
+                        ELSE c.status
+                      END,
+            'sentiment', (
+                SELECT CASE
+                    WHEN s.score > 1 THEN 'strong positive'
+                    WHEN s.score > 0 THEN 'moderate positive'
+                    WHEN s.score < -1 THEN 'strong negative'
+                    WHEN s.score < 0 THEN 'moderate negative'
+                    ELSE 'neutral'
+                END
+                FROM (
+                    SELECT AVG(CASE sa.sentiment
+                                WHEN 'positive' THEN 2
+                                WHEN 'negative' THEN -2
+                                WHEN 'neutral'  THEN 0
+                                ELSE 0 END) AS score
+                    FROM Message m3
+                    JOIN Sentiment_Analysis sa ON sa.message_id = m3.message_id
+                    WHERE m3.conversation_id = c.conversation_id
+                ) s
+            ),
+            'emotions', (
+                SELECT json_group_array(DISTINCT ea.emotion)
+                FROM Message m4
+                JOIN Emotion_Analysis ea ON ea.message_id = m4.message_id
+                WHERE m4.conversation_id = c.conversation_id
+            ),
+            'topics', (
+                SELECT json_group_array(DISTINCT ta.topic)
+                FROM Topic_Analysis ta
+                WHERE ta.conversation_id = c.conversation_id
+            ),
+            'summary', (
+                SELECT cs.summary_text
+                FROM Conversation_Summary cs
+                WHERE cs.conversation_id = c.conversation_id
+            ),
+            'messages', (
+                SELECT json_group_array(
+                    json_object(
+                        'id', m.message_id,
+                        'senderId', COALESCE(m.client_id, m.agent_id),
+                        'senderType', CASE
+                            WHEN m.client_id IS NOT NULL THEN 'tenant'
+                            WHEN m.agent_id IS NOT NULL THEN 'agent'
+                            ELSE 'system'
+                        END,
+                        'content', m.content,
+                        'timestamp', {iso_utc('m.timestamp')},
+                        'sentiment', (
+                            SELECT CASE sa.sentiment
+                                WHEN 'positive' THEN 1
+                                WHEN 'negative' THEN -2
+                                WHEN 'neutral'  THEN 0
+                                ELSE 0 END
+                            FROM Sentiment_Analysis sa
+                            WHERE sa.message_id = m.message_id
+                        ),
+                        'emotions', (
+                            SELECT json_group_array(DISTINCT ea.emotion)
+                            FROM Emotion_Analysis ea
+                            WHERE ea.message_id = m.message_id
+                        )
+                    )
+                )
+                FROM (
+                    SELECT *
+                    FROM Message
+                    WHERE conversation_id = c.conversation_id
+                    ORDER BY timestamp ASC
+                ) m
+            ),
+            'lastUpdated', (
+                SELECT {iso_utc('t')}
+                FROM (SELECT MAX(timestamp) AS t FROM Message WHERE conversation_id = c.conversation_id)
+            ),
+            'startedAt', (
+                SELECT {iso_utc('t')}
+                FROM (SELECT MIN(timestamp) AS t FROM Message WHERE conversation_id = c.conversation_id)
+            )
+        ) AS document
+    FROM Conversation c
+"""
+
+# ----------------------------
+# Schema
+# ----------------------------
+_MARK_CONVERSATION = """
+        INSERT INTO Conversation_Document (conversation_id) VALUES ({ref}.conversation_id)
+        ON CONFLICT(conversation_id) DO UPDATE SET is_stale = 1;"""
+
+_MARK_MESSAGE_CONVERSATION = """
+        INSERT INTO Conversation_Document (conversation_id)
+        SELECT conversation_id FROM Message
+        WHERE message_id = {ref}.message_id AND conversation_id IS NOT NULL
+        ON CONFLICT(conversation_id) DO UPDATE SET is_stale = 1;"""
+
+
+def _trigger(table: str, event: str, body: str, when: str = "") -> str:
+    name = f"trg_conversation_document_{table.lower()}_{event.lower()}"
+    when_clause = f"\n    WHEN {when}" if when else ""
+    return (
+        f"CREATE TRIGGER IF NOT EXISTS {name}\n"
+        f"    AFTER {event} ON {table}{when_clause}\n"
+        f"    BEGIN{body}\n    END;\n"
+    )
+
+
+def _document_triggers() -> List[str]:
+    triggers = [
+        _trigger("Conversation", "INSERT", _MARK_CONVERSATION.format(ref="NEW")),
+        _trigger("Conversation", "UPDATE", _MARK_CONVERSATION.format(ref="NEW")),
+        _trigger(
+            "Conversation", "DELETE",
+            "\n        DELETE FROM Conversation_Document WHERE conversation_id = OLD.conversation_id;",
+        ),
+    ]
+    # Tables keyed directly by conversation.
+    for table in ("Message", "Topic_Analysis", "Conversation_Summary"):
+        triggers += [
+            _trigger(table, "INSERT", _MARK_CONVERSATION.format(ref="NEW"),
+                     when="NEW.conversation_id IS NOT NULL"),
+            _trigger(table, "UPDATE",
+                     _MARK_CONVERSATION.format(ref="OLD") + _MARK_CONVERSATION.format(ref="NEW"),
+                     when="OLD.conversation_id IS NOT NULL AND NEW.conversation_id IS NOT NULL"),
+            _trigger(table, "DELETE", _MARK_CONVERSATION.format(ref="OLD"),
+                     when="OLD.conversation_id IS NOT NULL"),
+        ]
+    # Per-message analysis tables reach their conversation through Message.
+    for table in ("Sentiment_Analysis", "Emotion_Analysis"):
+        triggers += [
+            _trigger(table, "INSERT", _MARK_MESSAGE_CONVERSATION.format(ref="NEW")),
+            _trigger(table, "UPDATE",
+                     _MARK_MESSAGE_CONVERSATION.format(ref="OLD")
+                     + _MARK_MESSAGE_CONVERSATION.format(ref="NEW")),
+            _trigger(table, "DELETE", _MARK_MESSAGE_CONVERSATION.format(ref="OLD")),
+        ]
+    return triggers
+
+
+DOCUMENT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Conversation_Document (
+    conversation_id INTEGER PRIMARY KEY,
+    client_id       INTEGER,
+    status          TEXT,
+    last_updated    TEXT,
+    document        TEXT,
+    is_stale        INTEGER NOT NULL DEFAULT 1,
+    refreshed_at    TEXT,
+    sentiment       TEXT,
+    started_at      TEXT
+);
+
+-- Multi-valued filter fields (agent ids, emotions, topics) flattened out of the document.
+CREATE TABLE IF NOT EXISTS Conversation_Document_Tag (
+    kind            TEXT NOT NULL,
+    value           TEXT NOT NULL,
+    conversation_id INTEGER NOT NULL,
+    PRIMARY KEY (kind, value, conversation_id)
+) WITHOUT ROWID;
+
+-- Store-level settings, e.g. the document format the rows were built with.
+CREATE TABLE IF NOT EXISTS Conversation_Document_Meta (
+    key   TEXT PRIMARY KEY,
+    value
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_conversation_document_stale
+    ON Conversation_Document (conversation_id) WHERE is_stale = 1;
+CREATE INDEX IF NOT EXISTS idx_conversation_document_recent
+    ON Conversation_Document (last_updated, conversation_id);
+CREATE INDEX IF NOT EXISTS idx_conversation_document_status
+    ON Conversation_Document (status, last_updated, conversation_id);
+CREATE INDEX IF NOT EXISTS idx_conversation_document_client
+    ON Conversation_Document (client_id, last_updated, conversation_id);
+CREATE INDEX IF NOT EXISTS idx_conversation_document_sentiment
+    ON Conversation_Document (sentiment, last_updated, conversation_id);
+CREATE INDEX IF NOT EXISTS idx_conversation_document_tag_conversation
+    ON Conversation_Document_Tag (conversation_id);
+""" + "\n".join(_document_triggers())
+
+# Columns added after the first release of the store; older tables get them on install.
+_LATER_COLUMNS = {"sentiment": "TEXT", "started_at": "TEXT"}
+
+# Bumped whenever DOCUMENT_SELECT changes what a document looks like; stores
+# built with another format are rebuilt on install.
+# 2: timestamps formatted as ISO-8601 UTC ('...Z') inside SQLite.
+# 3: fractions of a second kept as stored (microseconds).
+DOCUMENT_FORMAT = 3
+
+# Document array fields mirrored into Conversation_Document_Tag.
+_TAG_FIELDS = {"agent": "$.agentIds", "emotion": "$.emotions", "topic": "$.topics"}
+
+
+# ----------------------------
+# Maintenance
+# ----------------------------
+def _add_missing_columns(conn: sqlite3.Connection) -> bool:
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(Conversation_Document)")}
+    if "conversation_id" not in existing:
+        return False
+    missing = [name for name in _LATER_COLUMNS if name not in existing]
+    for name in missing:
+        conn.execute(f"ALTER TABLE Conversation_Document ADD COLUMN {name} {_LATER_COLUMNS[name]}")
+    return bool(missing)
+
+
+def install_document_store(conn: sqlite3.Connection) -> None:
+    """Create the document table and triggers, then build any missing documents."""
+    with conn:
+        upgraded = _add_missing_columns(conn)
+    conn.executescript(DOCUMENT_SCHEMA)
+    with conn:
+        built_with = conn.execute(
+            "SELECT value FROM Conversation_Document_Meta WHERE key = 'format'"
+        ).fetchone()
+        if upgraded or built_with is None or built_with[0] != DOCUMENT_FORMAT:
+            conn.execute("UPDATE Conversation_Document SET is_stale = 1")
+            conn.execute(
+                "INSERT OR REPLACE INTO Conversation_Document_Meta (key, value) VALUES ('format', ?)",
+                (DOCUMENT_FORMAT,),
+            )
+        conn.execute("""
+            INSERT OR IGNORE INTO Conversation_Document (conversation_id)
+            SELECT conversation_id FROM Conversation
+        """)
+    refresh_stale_documents(conn)
+
+
+def documents_stale(conn: sqlite3.Connection) -> bool:
+    """Whether any document awaits a rebuild (a read; works on read-only connections)."""
+    return conn.execute(
+        "SELECT 1 FROM Conversation_Document WHERE is_stale = 1 LIMIT 1"
+    ).fetchone() is not None
+
+
+def refresh_stale_documents(conn: sqlite3.Connection) -> int:
+    """Rebuild only the documents flagged stale. Returns how many were rebuilt."""
+    if not documents_stale(conn):
+        return 0
+
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS stale_document (conversation_id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.stale_document")
+        conn.execute("""
+            INSERT INTO temp.stale_document
+            SELECT conversation_id FROM Conversation_Document WHERE is_stale = 1
+        """)
+        # Conversations deleted after their messages were touched leave orphans behind.
+        conn.execute("""
+            DELETE FROM Conversation_Document
+            WHERE conversation_id IN (SELECT conversation_id FROM temp.stale_document)
+              AND conversation_id NOT IN (SELECT conversation_id FROM Conversation)
+        """)
+        conn.execute("""
+            DELETE FROM Conversation_Document_Tag
+            WHERE conversation_id IN (SELECT conversation_id FROM temp.stale_document)
+        """)
+        cur = conn.execute(f"""
+            INSERT OR REPLACE INTO Conversation_Document
+                (conversation_id, client_id, status, sentiment, started_at, last_updated,
+                 document, is_stale, refreshed_at)
+            SELECT
+                d.conversation_id,
+                d.client_id,
+                d.status,
+                json_extract(d.document, '$.sentiment'),
+                COALESCE(d.first_message_at, d.started_at, ''),
+                COALESCE(d.last_message_at, d.started_at, ''),
+                d.document,
+                0,
+                datetime('now')
+            FROM (
+                SELECT x.*, c.started_at
+                FROM ({DOCUMENT_SELECT}
+                    WHERE c.conversation_id IN (SELECT conversation_id FROM temp.stale_document)
+                ) x
+                JOIN Conversation c ON c.conversation_id = x.conversation_id
+            ) d
+        """)
+        refreshed = cur.rowcount
+        for kind, path in _TAG_FIELDS.items():
+            conn.execute("""
+                INSERT OR IGNORE INTO Conversation_Document_Tag (kind, value, conversation_id)
+                SELECT ?, CAST(j.value AS TEXT), d.conversation_id
+                FROM Conversation_Document d, json_each(d.document, ?) j
+                WHERE d.conversation_id IN (SELECT conversation_id FROM temp.stale_document)
+                  AND j.value IS NOT NULL
+            """, (kind, path))
+    return refreshed
+
+
+def rebuild_all_documents(conn: sqlite3.Connection) -> int:
+    """Flag every conversation stale and rebuild the whole store (backfills, schema changes)."""
+    with conn:
+        conn.execute("UPDATE Conversation_Document SET is_stale = 1")
+        conn.execute("""
+            INSERT OR IGNORE INTO Conversation_Document (conversation_id)
+            SELECT conversation_id FROM Conversation
+        """)
+    return refresh_stale_documents(conn)
+
+
+# ----------------------------
+# Filtering and keyset pagination
+# ----------------------------
+def normalize_status(status: str) -> str:
+    """Accept both the stored value ('in_progress') and the display value ('In Progress')."""
+    return status.strip().lower().replace(" ", "_")
+
+
+def parse_date_bound(value: str, end: bool = False) -> str:
+    """
+    Turn a query-string date into a bound comparable with stored timestamps.
+
+    Stored timestamps are naive UTC ISO strings. A bare date used as an upper
+    bound covers that whole day.
+    """
+    value = value.strip()
+    if len(value) == 10:
+        day = date.fromisoformat(value)
+        if end:
+            day += timedelta(days=1)
+        return day.isoformat()
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.isoformat()
+
+
+def encode_cursor(last_updated: str, conversation_id: int) -> str:
+    raw = json.dumps([last_updated, conversation_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    last_updated, conversation_id = json.loads(base64.urlsafe_b64decode(padded))
+    return str(last_updated), int(conversation_id)
+
+
+def encode_offset(offset: int) -> str:
+    """Cursor for offset-paged listings (ranked search hits, sorted tenants)."""
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode()).decode().rstrip("=")
+
+
+def decode_offset(cursor: str) -> int:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    offset = json.loads(base64.urlsafe_b64decode(padded))["offset"]
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError(cursor)
+    return offset
+
+
+def build_document_filter(
+    status: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    emotions: Sequence[str] = (),
+    topics: Sequence[str] = (),
+    search: Optional[str] = None,
+) -> Tuple[List[str], List]:
+    """
+    WHERE conditions (on alias `d`) for the dashboard filters.
+
+    The date range keeps conversations that were active in it: last message on
+    or after `date_from`, first message before the end of `date_to`. Multiple
+    emotions or topics match any of them, like the dashboard does. `search`
+    matches text anywhere in the summary, a topic or an emotion, ignoring
+    case; it reads the documents the other filters leave.
+    """
+    clauses: List[str] = []
+    params: List = []
+    if status:
+        clauses.append("d.status = ?")
+        params.append(normalize_status(status))
+    if tenant_id:
+        clauses.append("d.client_id = ?")
+        params.append(tenant_id)
+    if sentiment:
+        clauses.append("d.sentiment = ?")
+        params.append(sentiment.strip().lower())
+    if date_from:
+        clauses.append("d.last_updated >= ?")
+        params.append(parse_date_bound(date_from))
+    if date_to:
+        clauses.append("d.started_at < ?")
+        params.append(parse_date_bound(date_to, end=True))
+    for kind, values in (("agent", [agent_id] if agent_id else []),
+                         ("emotion", emotions),
+                         ("topic", topics)):
+        if not values:
+            continue
+        marks = ", ".join("?" for _ in values)
+        clauses.append(f"""d.conversation_id IN (
+            SELECT conversation_id FROM Conversation_Document_Tag
+            WHERE kind = ? AND value IN ({marks}))""")
+        params += [kind, *values]
+    if search and search.strip():
+        pattern = "%" + search.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        clauses.append("""(json_extract(d.document, '$.summary') LIKE ? ESCAPE '\\'
+            OR d.conversation_id IN (
+                SELECT conversation_id FROM Conversation_Document_Tag
+                WHERE kind IN ('emotion', 'topic') AND value LIKE ? ESCAPE '\\'))""")
+        params += [pattern, pattern]
+    return clauses, params
+
+
+def select_documents(
+    conn: sqlite3.Connection,
+    clauses: List[str],
+    params: List,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_messages: bool = True,
+) -> Tuple[List[sqlite3.Row], Optional[str]]:
+    """
+    Fetch documents matching `clauses`.
+
+    Without `limit` every match is returned in conversation order, as before
+    pagination existed. With it, rows come newest first and the second value
+    is the cursor for the next page (None on the last page).
+    `include_messages=False` strips the message array inside SQLite, so list
+    views never pay for thread bodies.
+    """
+    clauses = list(clauses)
+    params = list(params)
+    document = "d.document" if include_messages else "json_remove(d.document, '$.messages') AS document"
+    if limit is None:
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = conn.execute(f"""
+            SELECT d.conversation_id, d.last_updated, {document}
+            FROM Conversation_Document d
+            {where}
+            ORDER BY d.conversation_id
+        """, params).fetchall()
+        return rows, None
+
+    if cursor:
+        clauses.append("(d.last_updated, d.conversation_id) < (?, ?)")
+        params += list(decode_cursor(cursor))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = conn.execute(f"""
+        SELECT d.conversation_id, d.last_updated, {document}
+        FROM Conversation_Document d
+        {where}
+        ORDER BY d.last_updated DESC, d.conversation_id DESC
+        LIMIT ?
+    """, params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["last_updated"], last["conversation_id"])
+    return rows, next_cursor
+
+
+def iter_documents(
+    conn: sqlite3.Connection,
+    clauses: List[str],
+    params: List,
+    include_messages: bool = True,
+    batch_size: int = 100,
+) -> Iterator[str]:
+    """
+    Every document matching `clauses`, in conversation order, one JSON text at
+    a time. Rows are pulled from the cursor in small batches, so memory stays
+    flat however many conversations match.
+    """
+    document = "d.document" if include_messages else "json_remove(d.document, '$.messages')"
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur = conn.execute(f"""
+        SELECT {document}
+        FROM Conversation_Document d
+        {where}
+        ORDER BY d.conversation_id
+    """, list(params))
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        for (text,) in rows:
+            yield text
+
+
+# ----------------------------
+# Single conversation
+# ----------------------------
+def parse_conversation_id(value: str) -> int:
+    """Accept both the API id ('CONV-12') and the bare row id ('12')."""
+    value = value.strip()
+    if value.upper().startswith("CONV-"):
+        value = value[5:]
+    return int(value)
+
+
+def select_document_header(conn: sqlite3.Connection, conversation_id: int) -> Optional[str]:
+    """The conversation document without its message array, or None if unknown."""
+    row = conn.execute("""
+        SELECT json_remove(document, '$.messages') AS document
+        FROM Conversation_Document
+        WHERE conversation_id = ?
+    """, (conversation_id,)).fetchone()
+    return row["document"] if row else None
+
+
+def select_messages(
+    conn: sqlite3.Connection,
+    conversation_id: int,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[str], Optional[str]]:
+    """
+    One page of a conversation's messages, oldest first, with sentiment and
+    emotions joined in a single query. Returns (messages, next_cursor), each
+    message already serialized to JSON by SQLite.
+    """
+    params: List = [conversation_id]
+    after = ""
+    if cursor:
+        after = "AND (COALESCE(m.timestamp, ''), m.message_id) > (?, ?)"
+        params += list(decode_cursor(cursor))
+    rows = conn.execute(f"""
+        SELECT
+            m.message_id,
+            m.timestamp,
+            json_object(
+                'id', m.message_id,
+                'senderId', COALESCE(m.client_id, m.agent_id),
+                'senderType', CASE
+                    WHEN m.client_id IS NOT NULL THEN 'tenant'
+                    WHEN m.agent_id IS NOT NULL THEN 'agent'
+                    ELSE 'system'
+                END,
+                'content', m.content,
+                'timestamp', {iso_utc('m.timestamp')},
+                'sentiment', CASE WHEN COUNT(sa.message_id) > 0 THEN
+                    CASE MAX(sa.sentiment)
+                        WHEN 'positive' THEN 1
+                        WHEN 'negative' THEN -2
+                        WHEN 'neutral'  THEN 0
+                        ELSE 0 END
+                    END,
+                'emotions', json(json_group_array(DISTINCT ea.emotion) FILTER (WHERE ea.emotion IS NOT NULL))
+            ) AS message
+        FROM Message m
+        LEFT JOIN Sentiment_Analysis sa ON sa.message_id = m.message_id
+        LEFT JOIN Emotion_Analysis ea ON ea.message_id = m.message_id
+        WHERE m.conversation_id = ? {after}
+        GROUP BY m.message_id
+        ORDER BY COALESCE(m.timestamp, ''), m.message_id
+        LIMIT ?
+    """, params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last["timestamp"] or "", last["message_id"])
+    return [row["message"] for row in rows], next_cursor
+
+
+def json_array(items: Sequence[str]) -> str:
+    """Join already-serialized JSON values into a JSON array without re-parsing them."""
+    return "[" + ",".join(items) + "]"
+
+
+if __name__ == "__main__":
+    from main import DB_FILE
+
+    parser = argparse.ArgumentParser(description="Maintain the materialized conversation documents.")
+    parser.add_argument("command", choices=["install", "rebuild"])
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file")
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.db) as conn:
+        if args.command == "install":
+            install_document_store(conn)
+            print(f"Conversation documents installed in {args.db}")
+        else:
+            print(f"Rebuilt {rebuild_all_documents(conn)} conversation documents in {args.db}")
@@ -0,0 +1,334 @@
+"""
+Period digests of the conversation summaries, behind /summary.
+
+A digest is a short list of representative sentences, each with the number of
+summary sentences it stands for. It is built map-reduce style and stored in
+Summary_Digest:
+
+    day    the summaries of the conversations started that day (UTC)
+    week   the digests of its days (weeks start on Monday)
+    month  the digests of its days
+    all    the digests of the months, plus conversations without a start time
+
+`condense` is both the map and the reduce step: it folds repeated sentences
+together, scores each by how common its words are among all the sentences
+(weighted by how many each stands for), keeps the best DIGEST_SENTENCES that
+say different things and hands every dropped sentence's count to the kept
+sentence most like it. A digest is therefore bounded whatever the period
+holds, and digests of different databases merge with the same step.
+
+Triggers record the days a summary write touched in Digest_Dirty;
+`refresh_digests` rebuilds those days and the weeks, months and overall
+digest above them, and nothing else.
+
+Backfill or repair with:
+
+    python digests.py rebuild [--db database/test.db]
+"""
+
+import argparse
+import json
+import math
+import re
+import sqlite3
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DIGEST_SENTENCES = 8
+DIGEST_SENTENCE_CHARS = 280
+PERIODS = ("day", "week", "month", "all")
+
+# What the summariser writes when it fails; not worth digesting.
+PLACEHOLDER_SUMMARIES = {"", "no summary"}
+
+DIGEST_SCHEMA = [
+    # sentences: JSON [[text, count], ...], most common first. The overall
+    # digest has start ''; so does the day of conversations without a start time.
+    """CREATE TABLE IF NOT EXISTS Summary_Digest (
+        period        TEXT NOT NULL,
+        start         TEXT NOT NULL,
+        conversations INTEGER NOT NULL DEFAULT 0,
+        sentences     TEXT NOT NULL DEFAULT '[]',
+        PRIMARY KEY (period, start)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS Digest_Dirty (
+        day TEXT PRIMARY KEY
+    ) WITHOUT ROWID""",
+]
+
+
+def _mark(conversation_id: str) -> str:
+    return (
+        "INSERT OR IGNORE INTO Digest_Dirty (day) SELECT COALESCE(date(started_at), '') "
+        f"FROM Conversation WHERE conversation_id = {conversation_id};"
+    )
+
+
+def _trigger(name: str, timing: str, body: str) -> str:
+    return f"CREATE TRIGGER IF NOT EXISTS trg_digest_{name} {timing} BEGIN {body} END"
+
+
+DIGEST_TRIGGERS = [
+    _trigger("summary_insert", "AFTER INSERT ON Conversation_Summary", _mark("NEW.conversation_id")),
+    _trigger("summary_update", "AFTER UPDATE OF summary_text, conversation_id ON Conversation_Summary",
+             _mark("OLD.conversation_id") + _mark("NEW.conversation_id")),
+    _trigger("summary_delete", "AFTER DELETE ON Conversation_Summary", _mark("OLD.conversation_id")),
+    _trigger("conversation_update", "AFTER UPDATE OF started_at ON Conversation",
+             "INSERT OR IGNORE INTO Digest_Dirty (day) VALUES (COALESCE(date(OLD.started_at), ''));"
+             " INSERT OR IGNORE INTO Digest_Dirty (day) VALUES (COALESCE(date(NEW.started_at), ''));"),
+    _trigger("conversation_delete", "AFTER DELETE ON Conversation",
+             "INSERT OR IGNORE INTO Digest_Dirty (day) VALUES (COALESCE(date(OLD.started_at), ''));"),
+]
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = {
+    "the", "and", "for", "was", "were", "has", "had", "have", "with", "that", "this", "from", "about",
+    "their", "they", "them", "his", "her", "she", "him", "its", "are", "but", "not", "any", "after",
+    "into", "then", "than", "also", "been", "will", "would", "could", "which", "who", "when",
+    "yang", "dan", "untuk", "dengan", "ini", "itu", "ada", "tak", "nak", "dah",
+}
+
+
+# ----------------------------
+# Map / reduce
+# ----------------------------
+def _words(sentence: str) -> frozenset:
+    return frozenset(
+        word for word in _WORD.findall(sentence.lower()) if len(word) > 2 and word not in _STOPWORDS
+    )
+
+
+def condense(sentences: Iterable[Tuple[str, int]], size: int = DIGEST_SENTENCES) -> List[Tuple[str, int]]:
+    """
+    At most `size` (sentence, count) pairs standing for all of `sentences`,
+    most common first. Texts of several sentences are split first.
+    """
+    pooled: Dict[frozenset, List] = {}  # words -> [text, count]
+    for text, count in sentences:
+        for sentence in _SENTENCE.split(" ".join(text.split())):
+            words = _words(sentence)
+            if not words:
+                continue
+            entry = pooled.setdefault(words, [sentence[:DIGEST_SENTENCE_CHARS], 0])
+            entry[1] += count
+    if not pooled:
+        return []
+
+    frequency: Dict[str, int] = {}
+    for words, (_, count) in pooled.items():
+        for word in words:
+            frequency[word] = frequency.get(word, 0) + count
+    total = sum(count for _, count in pooled.values())
+    # Words in (nearly) every sentence ("tenant", "agent") tell sentences apart by nothing.
+    information = {word: math.log(total / n) for word, n in frequency.items()}
+
+    def score(words: frozenset) -> float:
+        return sum(frequency[word] * information[word] for word in words) / len(words)
+
+    def similarity(a: frozenset, b: frozenset) -> float:
+        union = sum(information[word] for word in a | b)
+        return sum(information[word] for word in a & b) / union if union else 1.0
+
+    # Most typical first; ties by count, then text, so results are stable.
+    ranked = sorted(pooled, key=lambda w: (-score(w), -pooled[w][1], pooled[w][0]))
+    kept: List[frozenset] = []
+    for words in ranked:
+        if len(kept) == size:
+            break
+        if all(similarity(words, other) < 0.5 for other in kept):
+            kept.append(words)
+
+    counts = {words: 0 for words in kept}
+    for words, (_, count) in pooled.items():
+        target = words if words in counts else max(kept, key=lambda other: similarity(words, other))
+        if target is words or similarity(words, target) > 0:
+            counts[target] += count
+    return sorted(((pooled[w][0], counts[w]) for w in kept), key=lambda pair: (-pair[1], pair[0]))
+
+
+def merge_digests(digests: Iterable[Dict]) -> Dict:
+    """One digest from several (the same period in different databases)."""
+    digests = list(digests)
+    if len(digests) == 1:
+        return digests[0]
+    return {
+        "conversations": sum(d["conversations"] for d in digests),
+        "sentences": condense(pair for d in digests for pair in d["sentences"]),
+    }
+
+
+# ----------------------------
+# Periods
+# ----------------------------
+def period_start(period: str, day: str) -> str:
+    """The first day of the `period` holding `day` (ISO dates); '' for the overall digest."""
+    if period == "all":
+        return ""
+    when = date.fromisoformat(day)
+    if period == "week":
+        return (when - timedelta(days=when.weekday())).isoformat()
+    if period == "month":
+        return when.replace(day=1).isoformat()
+    return when.isoformat()
+
+
+def period_end(period: str, start: str) -> Optional[str]:
+    """The last day of the `period` starting on `start`."""
+    if period == "all" or not start:
+        return None
+    first = date.fromisoformat(start)
+    if period == "week":
+        return (first + timedelta(days=6)).isoformat()
+    if period == "month":
+        following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return (following - timedelta(days=1)).isoformat()
+    return start
+
+
+# ----------------------------
+# Building
+# ----------------------------
+def _day_digest(conn: sqlite3.Connection, day: str) -> Dict:
+    if day:
+        # A day either side for the index range; date() decides (offsets, 'Z').
+        when = date.fromisoformat(day)
+        rows = conn.execute("""
+            SELECT cs.summary_text
+            FROM Conversation c
+            JOIN Conversation_Summary cs ON cs.conversation_id = c.conversation_id
+            WHERE c.started_at >= ? AND c.started_at < ? AND date(c.started_at) = ?
+        """, ((when - timedelta(days=1)).isoformat(), (when + timedelta(days=2)).isoformat(), day)).fetchall()
+    else:
+        rows = conn.execute("""
+            SELECT cs.summary_text
+            FROM Conversation c
+            JOIN Conversation_Summary cs ON cs.conversation_id = c.conversation_id
+            WHERE c.started_at IS NULL
+        """).fetchall()
+    texts = [row[0] for row in rows if (row[0] or "").strip().lower() not in PLACEHOLDER_SUMMARIES]
+    return {"conversations": len(texts), "sentences": condense((text, 1) for text in texts)}
+
+
+def _stored(conn: sqlite3.Connection, query: str, params=()) -> Dict:
+    """The digests a Summary_Digest query returns, reduced to one."""
+    rows = conn.execute(query, params).fetchall()
+    return {
+        "conversations": sum(row[0] for row in rows),
+        "sentences": condense(pair for row in rows for pair in json.loads(row[1])),
+    }
+
+
+def _store(conn: sqlite3.Connection, period: str, start: str, digest: Dict) -> None:
+    if digest["conversations"]:
+        conn.execute(
+            "INSERT OR REPLACE INTO Summary_Digest (period, start, conversations, sentences) VALUES (?, ?, ?, ?)",
+            (period, start, digest["conversations"], json.dumps(digest["sentences"])),
+        )
+    else:
+        conn.execute("DELETE FROM Summary_Digest WHERE period = ? AND start = ?", (period, start))
+
+
+def _refresh(conn: sqlite3.Connection) -> bool:
+    """Rebuild the dirty days and every digest above them (inside the caller's transaction)."""
+    days = [row[0] for row in conn.execute("SELECT day FROM Digest_Dirty")]
+    if not days:
+        return False
+    for day in days:
+        _store(conn, "day", day, _day_digest(conn, day))
+    for period in ("week", "month"):
+        for start in sorted({period_start(period, day) for day in days if day}):
+            _store(conn, period, start, _stored(conn, """
+                SELECT conversations, sentences FROM Summary_Digest
+                WHERE period = 'day' AND start BETWEEN ? AND ?
+            """, (start, period_end(period, start))))
+    _store(conn, "all", "", _stored(conn, """
+        SELECT conversations, sentences FROM Summary_Digest
+        WHERE period = 'month' OR (period = 'day' AND start = '')
+    """))
+    conn.execute("DELETE FROM Digest_Dirty")
+    return True
+
+
+def _mark_all(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM Summary_Digest")
+    conn.execute("""
+        INSERT OR IGNORE INTO Digest_Dirty (day)
+        SELECT COALESCE(date(c.started_at), '')
+        FROM Conversation_Summary cs
+        JOIN Conversation c ON c.conversation_id = cs.conversation_id
+    """)
+
+
+def install_digests(conn: sqlite3.Connection) -> None:
+    """Create the digest tables and triggers; a new install is built in the same transaction."""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        existing = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Summary_Digest'"
+        ).fetchone()
+        for statement in DIGEST_SCHEMA + DIGEST_TRIGGERS:
+            conn.execute(statement)
+        if existing is None:
+            _mark_all(conn)
+            _refresh(conn)
+
+
+def digests_dirty(conn: sqlite3.Connection) -> bool:
+    """Whether a summary changed since the last refresh (a read; works on read-only connections)."""
+    return conn.execute("SELECT 1 FROM Digest_Dirty LIMIT 1").fetchone() is not None
+
+
+def refresh_digests(conn: sqlite3.Connection) -> bool:
+    """Rebuild the digests of the periods touched since the last refresh. Returns False if none were."""
+    if not digests_dirty(conn):
+        return False
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        return _refresh(conn)
+
+
+def rebuild_digests(conn: sqlite3.Connection) -> None:
+    """Rebuild every digest from the summaries (backfills, repairs)."""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for statement in DIGEST_SCHEMA + DIGEST_TRIGGERS:
+            conn.execute(statement)
+        _mark_all(conn)
+        _refresh(conn)
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def read_digest(conn: sqlite3.Connection, period: str, start: str) -> Dict:
+    row = conn.execute(
+        "SELECT conversations, sentences FROM Summary_Digest WHERE period = ? AND start = ?", (period, start)
+    ).fetchone()
+    if row is None:
+        return {"conversations": 0, "sentences": []}
+    return {"conversations": row[0], "sentences": [tuple(pair) for pair in json.loads(row[1])]}
+
+
+def latest_start(conn: sqlite3.Connection, period: str) -> Optional[str]:
+    """The start of the most recent `period` with a digest."""
+    row = conn.execute(
+        "SELECT start FROM Summary_Digest WHERE period = ? AND start > '' ORDER BY start DESC LIMIT 1", (period,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+if __name__ == "__main__":
+    from main import DB_FILE
+
+    parser = argparse.ArgumentParser(description="Maintain the /summary period digests.")
+    parser.add_argument("command", choices=["install", "rebuild"])
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file")
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.db) as conn:
+        if args.command == "install":
+            install_digests(conn)
+        else:
+            rebuild_digests(conn)
+    print(f"Digests {'installed' if args.command == 'install' else 'rebuilt'} in {args.db}")
@@ -0,0 +1,236 @@
+"""
+Serve several chat-analysis databases as one.
+
+Historical archives and the live database stay separate files; each endpoint
+runs its query against every database at once on a small thread pool and the
+per-database results are merged: counts are summed, averages re-weighted by
+the rows behind them, ordered lists merged. Archives hold conversations moved
+out of the live database, so a conversation id is in one file only; a tenant or
+agent id in several files is the same person, whose profile is taken from the
+first database listed. The merges rely on both: check_ids() finds databases
+that break them (e.g. two independently generated ones), and the server refuses
+to start on those.
+
+With a single database nothing is submitted to the pool and results pass
+through unchanged.
+"""
+
+import contextvars
+import heapq
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from cache import data_version
+from changes import content_version
+from pool import ConnectionPool
+from replica import Replica
+
+T = TypeVar("T")
+
+
+class Shard:
+    """
+    One database file with its read and write pools.
+
+    With a replica, reads go to its latest immutable copy once the first one
+    is taken (see replica.py); live_pool still reads the file itself.
+    """
+
+    def __init__(self, path: str, replica_dir: Optional[str] = None):
+        self.path = path
+        self.live_pool = ConnectionPool(path)
+        self.read_pool = self.live_pool
+        self.write_pool = ConnectionPool(path, read_only=False)
+        self.replica = Replica(path, replica_dir) if replica_dir else None
+        self._content: Tuple = (None, None)  # (version(), content_version() read at it)
+
+    def refresh_replica(self) -> None:
+        """Take a new copy and move reads onto it."""
+        path = self.replica.refresh(self.write_pool.connection())
+        if self.read_pool is self.live_pool:
+            self.read_pool = ConnectionPool(path, immutable=True)
+        else:
+            self.read_pool.repoint(path)
+
+    def version(self) -> int:
+        """Changes whenever what read_pool sees may have changed."""
+        if self.replica is not None:
+            return self.replica.generation
+        return data_version(self.path)
+
+    def content_version(self) -> str:
+        """changes.content_version() of what read_pool sees; re-read only when version() moves."""
+        version = self.version()
+        seen, content = self._content
+        if seen != version:
+            try:
+                content = content_version(self.read_pool.connection())
+            except sqlite3.OperationalError:
+                content = "-"  # no change log (schema not there yet)
+            self._content = (version, content)
+        return content
+
+    def stats(self) -> Dict:
+        stats = {"read": self.read_pool.stats(), "write": self.write_pool.stats()}
+        if self.replica is not None:
+            stats["live"] = self.live_pool.stats()
+            stats["replica"] = self.replica.stats()
+        return stats
+
+    def close(self) -> None:
+        self.write_pool.close_all()
+        self.live_pool.close_all()
+        if self.replica is not None:
+            self.read_pool.close_all()
+            self.replica.remove_all()
+
+
+class Federation:
+    def __init__(self, paths: Sequence[str], max_workers: Optional[int] = None, replica_dir: Optional[str] = None):
+        # Only the live database gets a replica: nothing writes to the archives.
+        self.shards = [Shard(path, replica_dir if i == 0 else None) for i, path in enumerate(paths)]
+        self._executor = None
+        if len(self.shards) > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers or min(32, 8 * (len(self.shards) - 1)),
+                thread_name_prefix="fanout",
+            )
+
+    @property
+    def primary(self) -> Shard:
+        """The live database: listed first, written by the preprocess job and the chatroom."""
+        return self.shards[0]
+
+    def map(self, fn: Callable[[Shard], T]) -> List[T]:
+        """fn(shard) for every database, concurrently; results in database order."""
+        if self._executor is None:
+            return [fn(self.shards[0])]
+        # The calling thread takes the first database rather than idling. Each
+        # task runs in a copy of the caller's context (request profiling).
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, fn, shard) for shard in self.shards[1:]
+        ]
+        first = fn(self.shards[0])
+        return [first] + [future.result() for future in futures]
+
+    def check_ids(self) -> List[str]:
+        """Ids the merges would mix up across databases; empty when there are none."""
+        problems = []
+        for i, shard in enumerate(self.shards):
+            for other in self.shards[i + 1:]:
+                problems += _shared_ids(shard, other)
+        return problems
+
+    def version(self) -> str:
+        """Changes whenever any of the databases is committed to."""
+        return ".".join(str(shard.version()) for shard in self.shards)
+
+    def content_version(self) -> str:
+        """The same in every process serving the same data; for ETags."""
+        return "_".join(shard.content_version() for shard in self.shards)
+
+    def close(self) -> None:
+        for shard in self.shards:
+            shard.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+# ----------------------------
+# Ids across databases
+# ----------------------------
+# (table, id column, column that must agree where an id is in both; None: the
+# id may not be in both at all)
+ID_CHECKS = (
+    ("Conversation", "conversation_id", None),
+    ("Client", "client_id", "name"),
+    ("Agent", "agent_id", "name"),
+)
+
+
+def _shared_ids(shard: Shard, other: Shard) -> List[str]:
+    problems = []
+    with closing(shard.live_pool.open()) as conn:
+        conn.execute("ATTACH DATABASE ? AS other", (Path(other.path).resolve().as_uri() + "?mode=ro",))
+        for table, id_column, same in ID_CHECKS:
+            condition = f"a.{same} IS NOT b.{same}" if same else "1"
+            try:
+                # Primary-key lookups into the other file for every row of this one.
+                count, example = conn.execute(f"""
+                    SELECT COUNT(*), MIN(a.{id_column})
+                    FROM main.{table} a
+                    JOIN other.{table} b ON b.{id_column} = a.{id_column}
+                    WHERE {condition}
+                """).fetchone()
+            except sqlite3.OperationalError:
+                continue  # not in one of them (schema not there yet)
+            if count:
+                problems.append(
+                    f"{count} {table} ids are in both {shard.path} and {other.path}"
+                    + (f" for different {same}s" if same else "")
+                    + f", e.g. {example}"
+                )
+    return problems
+
+
+# ----------------------------
+# Merging per-database results
+# ----------------------------
+def sum_fields(results: Sequence[Dict]) -> Dict:
+    """One dict of counters from several: every field summed."""
+    if len(results) == 1:
+        return results[0]
+    merged: Dict = {}
+    for result in results:
+        for field, value in result.items():
+            merged[field] = merged.get(field, 0) + (value or 0)
+    return merged
+
+
+def sum_rows(
+    results: Sequence[List[Dict]],
+    keys: Sequence[str],
+    sums: Sequence[str],
+    order: Optional[Callable[[Dict], Tuple]] = None,
+) -> List[Dict]:
+    """
+    Grouped rows from several databases as if grouped once: rows with equal
+    `keys` become one with their `sums` added, then sorted by `order`.
+    """
+    if len(results) == 1:
+        return results[0]
+    merged: Dict[Tuple, Dict] = {}
+    for rows in results:
+        for row in rows:
+            key = tuple(row[k] for k in keys)
+            if key not in merged:
+                merged[key] = dict(row)
+            else:
+                for field in sums:
+                    merged[key][field] = (merged[key][field] or 0) + (row[field] or 0)
+    rows = list(merged.values())
+    return sorted(rows, key=order) if order else rows
+
+
+def merge_sorted(results: Sequence[List[T]], key: Callable[[T], Tuple], reverse: bool = False) -> List[T]:
+    """Lists already sorted by `key` merged into one sorted list."""
+    if len(results) == 1:
+        return results[0]
+    return list(heapq.merge(*results, key=key, reverse=reverse))
+
+
+def first_by(results: Sequence[List[Dict]], key: str) -> List[Dict]:
+    """Concatenate, keeping only the first row seen for each `key`."""
+    if len(results) == 1:
+        return results[0]
+    seen = set()
+    rows = []
+    for result in results:
+        for row in result:
+            if row[key] not in seen:
+                seen.add(row[key])
+                rows.append(row)
+    return rows
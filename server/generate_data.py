@@ -0,0 +1,187 @@
+"""
+Synthetic chat-analysis data for load testing.
+
+Fills a fresh database, created through the migrations, with tenants, agents,
+conversations, messages and analysis rows shaped like what the preprocess job
+writes: tenant and agent turns alternate, only tenant messages are analysed,
+and topics and summaries hang off the conversation. Output is deterministic
+for a given seed.
+
+    python generate_data.py --messages 10k  --db bench/data/10k.db
+    python generate_data.py --messages 1M   --db bench/data/1m.db
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Iterator, Tuple
+
+from migrations import migrate
+
+STATUSES = ["solved"] * 6 + ["in_progress"] * 3 + ["urgent"]
+SENTIMENTS = ["negative"] * 4 + ["neutral"] * 3 + ["positive"] * 3
+EMOTIONS = ["joy", "anger", "sadness", "fear", "surprise", "disgust", "neutral"]
+TOPICS = [
+    "aircond", "water leak", "wifi", "electricity bill", "cleaning", "noise",
+    "parking", "key card", "rental payment", "deposit refund", "pest control",
+    "washing machine", "housemate", "move in", "move out", "lift",
+]
+TENANT_LINES = [
+    "Hi, the {topic} in my room got problem since yesterday lah",
+    "Can someone check the {topic}? Very urgent",
+    "Still not fixed leh, already wait 3 days for the {topic}",
+    "Ok thanks, the {topic} is working now",
+    "Boss, when can settle the {topic} issue?",
+    "I already pay but the {topic} still the same",
+]
+AGENT_LINES = [
+    "Hi, sorry for the inconvenience. We will check the {topic} today.",
+    "Noted, our technician will come between 2pm and 5pm.",
+    "Can you send a photo of the {topic}?",
+    "The {topic} issue has been fixed. Anything else we can help?",
+    "We will close the ticket now. Thank you!",
+]
+FIRST_NAMES = ["Aisyah", "Wei Jie", "Priya", "Hafiz", "Mei Ling", "Arjun", "Nurul", "Jason", "Siti", "Kumar"]
+LAST_NAMES = ["Tan", "Lim", "Abdullah", "Raj", "Wong", "Ismail", "Lee", "Chong", "Nair", "Ong"]
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def parse_size(value: str) -> int:
+    value = value.strip().lower()
+    if value in SIZES:
+        return SIZES[value]
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(value[-1], 1)
+    return int(float(value.rstrip("km")) * multiplier)
+
+
+def _name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _conversations(rng: random.Random, messages: int, tenants: int, agents: int, start: datetime) -> Iterator[Tuple]:
+    """(conversation row, [message rows], topics, summary) until `messages` messages exist."""
+    conversation_id = 0
+    message_id = 0
+    span = timedelta(days=180).total_seconds()
+    while message_id < messages:
+        conversation_id += 1
+        tenant = rng.randint(1, tenants)
+        agent = rng.randint(1, agents)
+        topics = rng.sample(TOPICS, rng.randint(1, 3))
+        t = start + timedelta(seconds=rng.uniform(0, span))
+        started = t
+        rows = []
+        for turn in range(min(rng.randint(2, 18), messages - message_id)):
+            message_id += 1
+            tenant_turn = turn % 2 == 0
+            lines = TENANT_LINES if tenant_turn else AGENT_LINES
+            content = rng.choice(lines).format(topic=rng.choice(topics))
+            rows.append((
+                message_id,
+                content,
+                "en",
+                tenant if tenant_turn else None,
+                None if tenant_turn else agent,
+                t.isoformat(timespec="seconds"),
+                conversation_id,
+            ))
+            t += timedelta(seconds=rng.expovariate(1 / 900))
+        conversation = (conversation_id, tenant, started.isoformat(timespec="seconds"),
+                        t.isoformat(timespec="seconds"), rng.choice(STATUSES))
+        summary = f"Tenant reported {', '.join(topics)}; agent followed up."
+        yield conversation, rows, topics, summary
+
+
+def generate(path: str, messages: int, seed: int = 42, batch_size: int = 20_000) -> dict:
+    """Create `path` and fill it with about `messages` messages. Returns row counts."""
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} exists; pick another path or delete it first")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    rng = random.Random(seed)
+    tenants = max(10, messages // 200)
+    agents = max(3, messages // 5_000)
+    start = datetime(2025, 1, 1)
+
+    with closing(sqlite3.connect(path)) as conn:
+        migrate(conn)
+        # Bulk load: nothing else has the file open yet.
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        with conn:
+            conn.executemany(
+                "INSERT INTO Client (client_id, name, date_of_birth, email, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(i, _name(rng), f"{rng.randint(1970, 2004)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                  f"tenant{i}@example.com", start.isoformat()) for i in range(1, tenants + 1)],
+            )
+            conn.executemany(
+                "INSERT INTO Client_Profile VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(i, *(round(rng.random(), 2) for _ in range(5)), start.isoformat()) for i in range(1, tenants + 1)],
+            )
+            conn.executemany(
+                "INSERT INTO Agent (agent_id, name, email, created_at) VALUES (?, ?, ?, ?)",
+                [(i, _name(rng), f"agent{i}@example.com", start.isoformat()) for i in range(1, agents + 1)],
+            )
+            conn.executemany("INSERT INTO Emotion (emotion) VALUES (?)", [(e,) for e in EMOTIONS])
+            conn.executemany("INSERT INTO Topic (topic) VALUES (?)", [(t,) for t in TOPICS])
+
+        counts = {"conversations": 0, "messages": 0, "sentiments": 0, "emotions": 0, "topics": 0}
+        batch: dict = {"conversation": [], "message": [], "sentiment": [], "emotion": [], "topic": [], "summary": []}
+
+        def flush() -> None:
+            counts["sentiments"] += len(batch["sentiment"])
+            counts["emotions"] += len(batch["emotion"])
+            with conn:
+                conn.executemany("INSERT INTO Conversation VALUES (?, ?, ?, ?, ?)", batch["conversation"])
+                conn.executemany("INSERT INTO Message VALUES (?, ?, ?, ?, ?, ?, ?)", batch["message"])
+                conn.executemany(
+                    "INSERT INTO Sentiment_Analysis (message_id, sentiment, created_at) VALUES (?, ?, ?)",
+                    batch["sentiment"],
+                )
+                conn.executemany("INSERT INTO Emotion_Analysis VALUES (?, ?)", batch["emotion"])
+                conn.executemany("INSERT INTO Topic_Analysis VALUES (?, ?)", batch["topic"])
+                conn.executemany("INSERT INTO Conversation_Summary VALUES (?, ?)", batch["summary"])
+            for rows in batch.values():
+                rows.clear()
+
+        for conversation, rows, topics, summary in _conversations(rng, messages, tenants, agents, start):
+            batch["conversation"].append(conversation)
+            batch["message"].extend(rows)
+            batch["topic"].extend((conversation[0], t) for t in topics)
+            if conversation[4] == "solved":
+                batch["summary"].append((conversation[0], summary))
+            for row in rows:
+                if row[3] is None:
+                    continue  # only tenant messages are analysed
+                batch["sentiment"].append((row[0], rng.choice(SENTIMENTS), row[5]))
+                for emotion in rng.sample(EMOTIONS, rng.choice([1, 1, 2, 3])):
+                    batch["emotion"].append((row[0], emotion))
+            counts["conversations"] += 1
+            counts["messages"] += len(rows)
+            counts["topics"] += len(topics)
+            if len(batch["message"]) >= batch_size:
+                flush()
+        flush()
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("ANALYZE")
+    counts.update(tenants=tenants, agents=agents)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic chat-analysis database.")
+    parser.add_argument("--messages", default="10k", help="about how many messages: 10k, 100k, 1M or a number")
+    parser.add_argument("--db", help="output file (default bench/data/<size>.db)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    messages = parse_size(args.messages)
+    path = args.db or os.path.join("bench", "data", f"{args.messages.lower()}.db")
+    started = time.perf_counter()
+    counts = generate(path, messages, seed=args.seed)
+    print(f"Wrote {path} in {time.perf_counter() - started:.1f}s: {counts}")
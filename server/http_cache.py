@@ -0,0 +1,286 @@
+"""
+Conditional GETs and a cache of compressed response bodies.
+
+Every response gets a weak ETag built from the data's version, as the app's
+`version` callable reports it, plus the requested representation. A request
+whose If-None-Match still matches gets a 304 without running the endpoint.
+Otherwise a body produced at the current version is served from memory,
+compressed at most once per encoding, until the version moves on.
+
+The version has to read the same in every worker process serving the same
+data (main.py builds it from the change log, see changes.content_version), so
+a tag handed out by one worker is honoured by the others and survives
+restarts; a per-process counter such as PRAGMA data_version would not be.
+Answers that also depend on today's date (`dated`) add the server's local
+date to their tag, so they expire at midnight even when no data changed.
+"""
+
+import gzip
+import zlib
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # br is offered only when the package is installed
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # close to gzip -6 in speed, noticeably smaller on JSON
+
+# Bodies worth compressing; Parquet, for one, is compressed internally already.
+COMPRESSIBLE_TYPES = (b"application/json", b"application/x-ndjson", b"application/vnd.apache.arrow", b"text/")
+
+_counters = {"hits": 0, "misses": 0, "notModified": 0, "uncacheable": 0, "evictions": 0, "entries": 0, "bytes": 0}
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """The best encoding we can produce that the client accepts: br, gzip or identity."""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison, as If-None-Match requires."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+class _Entry:
+    __slots__ = ("etag", "status", "headers", "bodies")
+
+    def __init__(self, etag: str, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.etag = etag
+        self.status = status
+        self.headers = headers
+        self.bodies: Dict[str, bytes] = {"identity": body}
+
+    @property
+    def compressible(self) -> bool:
+        content_type = dict(self.headers).get(b"content-type", b"")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    @property
+    def size(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+
+class ConditionalCacheMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        version: Callable[[], str],
+        prefix: str = "/",
+        exclude: Iterable[str] = (),
+        stream: Optional[Callable[[Scope], bool]] = None,
+        skip: Optional[Callable[[Scope], bool]] = None,
+        dated: Optional[Callable[[Scope], bool]] = None,
+        max_bytes: int = 128 * 1024 * 1024,
+        max_entry_bytes: int = 32 * 1024 * 1024,
+        min_compress_bytes: int = 1024,
+    ):
+        self.app = app
+        self.version = version
+        self.prefix = prefix
+        self.exclude = tuple(exclude)
+        # Streamed responses still get ETags and 304s, but are never buffered.
+        self.stream = stream
+        # Requests left alone entirely: never answered from or stored in the cache.
+        self.skip = skip
+        # Requests whose answer changes with the local date, e.g. ages.
+        self.dated = dated
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.min_compress_bytes = min_compress_bytes
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._size = 0
+
+    def _applies(self, scope: Scope) -> bool:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            return False
+        path = scope["path"]
+        if not path.startswith(self.prefix) or any(part in path for part in self.exclude):
+            return False
+        return not (self.skip and self.skip(scope))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._applies(scope):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        accept = headers.get(b"accept", b"").decode("latin-1")
+        # Read before the endpoint runs: a commit racing with it can only make
+        # the next request miss, never tag old data with a new version.
+        version = self.version()
+        if self.dated and self.dated(scope):
+            version += f"-{date.today().isoformat()}"
+        etag = f'W/"{version}-{zlib.crc32(accept.encode()):08x}"'
+
+        if etag_matches(headers.get(b"if-none-match", b"").decode("latin-1"), etag):
+            _counters["notModified"] += 1
+            await send({"type": "http.response.start", "status": 304, "headers": self._validators(etag)})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if self.stream and self.stream(scope):
+            await self.app(scope, receive, self._tagging(send, etag))
+            return
+
+        key = (
+            scope["path"],
+            urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))),
+            accept,
+        )
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        entry = self._entries.get(key)
+        if entry is not None and entry.etag == etag:
+            _counters["hits"] += 1
+            self._entries.move_to_end(key)
+            await self._serve(key, entry, encoding, send)
+            return
+
+        _counters["misses"] += 1
+        entry = await self._capture(scope, receive, send, etag)
+        if entry is None:
+            return  # already passed through
+        self._store(key, entry)
+        await self._serve(key, entry, encoding, send)
+
+    @staticmethod
+    def _validators(etag: str) -> List[Tuple[bytes, bytes]]:
+        # no-cache: clients may keep the body but must revalidate before reuse.
+        return [
+            (b"etag", etag.encode("latin-1")),
+            (b"vary", b"Accept, Accept-Encoding"),
+            (b"cache-control", b"no-cache"),
+        ]
+
+    def _tagging(self, send: Send, etag: str) -> Send:
+        async def tagged(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                message = {**message, "headers": list(message.get("headers", [])) + self._validators(etag)}
+            await send(message)
+
+        return tagged
+
+    async def _capture(self, scope: Scope, receive: Receive, send: Send, etag: str) -> Optional[_Entry]:
+        """
+        Run the endpoint and buffer a cacheable response. Anything else (errors,
+        already-encoded or oversized bodies) is passed straight through and None
+        is returned.
+        """
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+        passing = False
+        done = False
+
+        async def capture(message: Message) -> None:
+            nonlocal start, size, passing, done
+            if passing:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                names = {name.lower() for name, _ in message.get("headers", [])}
+                if message["status"] != 200 or b"content-encoding" in names:
+                    passing = True
+                    _counters["uncacheable"] += 1
+                    await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > self.max_entry_bytes:
+                # Too big to keep: send what we have and stream the rest.
+                passing = True
+                _counters["uncacheable"] += 1
+                await send({**start, "headers": list(start.get("headers", [])) + self._validators(etag)})
+                await send({"type": "http.response.body", "body": b"".join(chunks), "more_body": True})
+                chunks.clear()
+                if not message.get("more_body", False):
+                    await send({"type": "http.response.body", "body": b""})
+            elif not message.get("more_body", False):
+                done = True
+
+        await self.app(scope, receive, capture)
+        if passing or not done:
+            return None
+        headers = [
+            (name, value) for name, value in start.get("headers", [])
+            if name.lower() not in (b"content-length", b"etag", b"vary", b"cache-control")
+        ]
+        return _Entry(etag, start["status"], headers, b"".join(chunks))
+
+    def _store(self, key: Tuple, entry: _Entry) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= old.size
+        self._entries[key] = entry
+        self._size += entry.size
+        self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            self._size -= old.size
+            _counters["evictions"] += 1
+        _counters.update(entries=len(self._entries), bytes=self._size)
+
+    async def _serve(self, key: Tuple, entry: _Entry, encoding: str, send: Send) -> None:
+        identity = entry.bodies["identity"]
+        if len(identity) < self.min_compress_bytes or not entry.compressible:
+            encoding = "identity"
+        body = entry.bodies.get(encoding)
+        if body is None:
+            body = await run_in_threadpool(_compress, identity, encoding)
+            # Another request may have compressed it meanwhile, or the entry
+            # may have been replaced or evicted; only count what is kept.
+            if encoding not in entry.bodies and self._entries.get(key) is entry:
+                entry.bodies[encoding] = body
+                self._size += len(body)
+                self._evict()
+        headers = list(entry.headers) + self._validators(entry.etag)
+        headers.append((b"content-length", str(len(body)).encode()))
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode()))
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def stats() -> Dict:
+    """Hit, miss and 304 counters and the cache's current size."""
+    return dict(_counters)
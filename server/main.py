@@ -1,13 +1,61 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-import os
-import uvicorn
+from fastapi.responses import Response, StreamingResponse
+import asyncio
 import json
+import os
+import time
+import logging
 
-from typing import List, Dict
+from typing import List, Dict, Optional
 import sqlite3
 from collections import defaultdict
-from datetime import datetime, date
+from contextlib import asynccontextmanager, closing
+from datetime import date
+from urllib.parse import parse_qsl
+from zoneinfo import ZoneInfoNotFoundError
+
+import analytics
+from cache import cached, data_version
+from changes import install_change_log, latest_change, missed_changes, prune_changes, read_changes, sse
+import columnar
+from columnar import conversation_table_query, cursor_batches, encode, encode_rows
+import digests
+from conversation_store import (
+    build_document_filter,
+    decode_offset,
+    documents_stale,
+    encode_cursor,
+    encode_offset,
+    install_document_store,
+    iso_utc,
+    iter_documents,
+    json_array,
+    parse_conversation_id,
+    refresh_stale_documents,
+    select_document_header,
+    select_documents,
+    select_messages,
+)
+from federation import Federation, Shard, first_by, merge_sorted, sum_fields, sum_rows
+from http_cache import ConditionalCacheMiddleware
+from http_cache import stats as response_cache_stats
+from metrics import MetricsMiddleware, record_query
+import metrics
+from migrations import migrate
+from pool import enable_wal
+import profiling
+from profiling import ProfilingMiddleware
+from responses import ORJSONResponse, RawJSONResponse
+from replica import REPLICA_DIR, ReplicaRefresher
+from rollups import install_rollups, refresh_rollups, rollups_dirty
+import search
+from singleflight import SingleFlightMiddleware
+from singleflight import stats as single_flight_stats
+import slow_queries
+from starlette.concurrency import run_in_threadpool
+from trends import emotion_trend, merge_series, sentiment_trend
+import warmup
 
 DB_PATH = [
     "database/chat_analysis_history_data.db",
@@ -15,29 +63,335 @@ DB_PATH = [
     "database/analysis.db",
     "database/test.db"
 ]
+# The database the API serves; CHAT_DB_PATH (as in the chatroom) points it elsewhere.
+DB_FILE = os.environ.get("CHAT_DB_PATH", DB_PATH[3])
+# CHAT_DB_PATHS (os.pathsep-separated) serves several at once, e.g. the live
+# database followed by history archives. The first one is the live database.
+DATABASES = [path for path in os.environ.get("CHAT_DB_PATHS", "").split(os.pathsep) if path] or [DB_FILE]
+DB_FILE = DATABASES[0]
 
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Conversation Analytics API", version="1.0")
 
+def prepare_databases() -> None:
+    """WAL, migrations and every derived table, in every database, then the id check across them. Safe to repeat."""
+    for shard in federation.shards:
+        try:
+            enable_wal(shard.path)
+            with get_write_connection(shard) as conn:
+                applied = migrate(conn)
+                if applied:
+                    logger.info(f"Applied schema migrations {applied} to {shard.path}")
+                install_document_store(conn)
+                install_rollups(conn)
+                digests.install_digests(conn)
+                install_change_log(conn)
+                prune_changes(conn)
+        except sqlite3.OperationalError as e:
+            # Schema not there yet (fresh checkout); installed on first use once it is.
+            logger.warning(f"Conversation document store / rollups not installed in {shard.path}: {e}")
+            continue
+        try:
+            with get_write_connection(shard) as conn:
+                search.install_search(conn)
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5; /search answers 503.
+            logger.warning(f"Message search not installed in {shard.path}: {e}")
+    # Merged answers would mix up conversations or people that share an id.
+    problems = federation.check_ids()
+    if problems:
+        raise RuntimeError("CHAT_DB_PATHS cannot be served together: " + "; ".join(problems))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Under serve.py the supervisor has done this already; then it only checks.
+    prepare_databases()
+    replicated = [shard for shard in federation.shards if shard.replica is not None]
+    for shard in replicated:
+        # Before the first request, so no read ever lands on the live file.
+        started = time.perf_counter()
+        shard.refresh_replica()
+        logger.info(f"Serving {shard.path} from replica {shard.replica.path} ({time.perf_counter() - started:.1f}s)")
+    refresher = ReplicaRefresher(replicated)
+    if replicated:
+        refresher.start()
+    analytics_refresher = None
+    if analytics.enabled():
+        analytics_refresher = analytics.AnalyticsRefresher(federation.shards)
+        if warmup.WARMUP:
+            await run_in_threadpool(analytics_refresher.export_due)
+        analytics_refresher.start()
+    elif analytics.ANALYTICS_ENGINE == "duckdb":
+        logger.warning("ANALYTICS_ENGINE=duckdb needs duckdb and pyarrow; trends stay on SQLite")
+    if warmup.WARMUP:
+        # uvicorn accepts connections only once this returns.
+        await warmup.warm(app, f"/{BASE_URL}", warmup.WARMUP_PATHS)
+        metrics.reset()  # latency figures are for real traffic
+    yield
+    if analytics_refresher is not None:
+        analytics_refresher.stop()
+    if replicated:
+        refresher.stop()
+    federation.close()
+
+
+app = FastAPI(
+    title="Conversation Analytics API",
+    version="1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+BASE_URL = "coliving-ai-os/chat-analysis"
+# Part of every ETag: bump it when a release changes what an endpoint returns
+# for the same data, so clients do not keep bodies from the previous release.
+RESPONSE_FORMAT = 1
+
+NDJSON = "application/x-ndjson"
+
+def wants_stream(accept: str, stream: Optional[str]) -> bool:
+    """Streaming is asked for with `Accept: application/x-ndjson` or `?stream=1`."""
+    return NDJSON in accept or stream in ("1", "true")
+
+def _is_stream_request(scope) -> bool:
+    headers = dict(scope.get("headers") or [])
+    query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+    return wants_stream(headers.get(b"accept", b"").decode("latin-1"), query.get("stream"))
+
+def _is_profiled_request(scope) -> bool:
+    return profiling.requested(scope) is not None
+
+# Added before CORS so it sits inside it: shared responses get per-request CORS headers.
+# Streams are left alone: buffering them would hold back the first bytes, and
+# the never-ending event stream is kept out of both entirely.
+app.add_middleware(
+    SingleFlightMiddleware,
+    prefix=f"/{BASE_URL}/",
+    exclude=["/debug/", "/events"],
+    skip=lambda scope: _is_stream_request(scope) or _is_profiled_request(scope),
+)
+# Outside single flight, so 304s and cache hits never reach it.
+app.add_middleware(
+    ConditionalCacheMiddleware,
+    # Shared by every worker; trends may come from a DuckDB copy older than the database.
+    version=lambda: f"{RESPONSE_FORMAT}-{federation.content_version()}-{analytics.content_version()}",
+    prefix=f"/{BASE_URL}/",
+    exclude=["/debug/", "/events"],
+    stream=_is_stream_request,
+    skip=_is_profiled_request,  # a profile has to run the endpoint
+    dated=lambda scope: "/tenants" in scope["path"],  # ages count from today
+)
+# Outside the caches, so a profiled request always reaches the endpoint; inside
+# CORS, so the profile gets CORS headers like any response.
+app.add_middleware(ProfilingMiddleware, exclude=["/events"])
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+# Outermost, so latencies include the response cache and CORS.
+app.add_middleware(MetricsMiddleware, exclude=["/metrics"])
 
-BASE_URL = "coliving-ai-os/chat-analysis"
+MAX_PAGE_SIZE = 500
+MESSAGE_PAGE_SIZE = 200
+STREAM_CHUNK_SIZE = 100  # NDJSON lines per chunk written to the socket
+KPI_CACHE_TTL = 10  # seconds; new data invalidates earlier via PRAGMA data_version
+CHANGE_BATCH = 500  # change-log rows read per query
+CHANGE_POLL_INTERVAL = 0.5  # seconds between PRAGMA data_version checks on an event stream
+CHANGE_HEARTBEAT = 15  # seconds of quiet before an event stream sends a keep-alive comment
+CHANGE_PRUNE_INTERVAL = 3600  # seconds between trims of the change log
 
 # ----------------------------
 # DB helper
 # ----------------------------
-def query_db(query: str, params=()) -> List[Dict]:
-    with sqlite3.connect(DB_PATH[3]) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        cur.execute(query, params)
-        return [dict(row) for row in cur.fetchall()]
+# Every helper takes the database (shard) to run on; endpoints run them on all
+# of them with federation.map() and merge the results.
+# CHAT_REPLICA_DIR moves the live database's reads onto refreshed copies (replica.py).
+federation = Federation(DATABASES, replica_dir=REPLICA_DIR or None)
+
+def get_connection(shard: Shard) -> sqlite3.Connection:
+    """This worker thread's pooled read-only connection."""
+    return shard.read_pool.connection()
+
+def get_live_connection(shard: Shard) -> sqlite3.Connection:
+    """This worker thread's read-only connection on the live file, even in replica mode."""
+    return shard.live_pool.connection()
+
+def get_write_connection(shard: Shard) -> sqlite3.Connection:
+    """This worker thread's pooled writable connection (store/rollup maintenance only)."""
+    return shard.write_pool.connection()
+
+def query_db(shard: Shard, query: str, params=()) -> List[Dict]:
+    started = time.perf_counter()
+    conn = get_connection(shard)
+    checked_out = time.perf_counter()
+    rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+    record_query(query, time.perf_counter() - checked_out, len(rows), checked_out - started)
+    return rows
+
+def query_all(query: str, params=()) -> List[List[Dict]]:
+    """query_db on every database at once, one result list per database."""
+    return federation.map(lambda shard: query_db(shard, query, params))
+
+def query_rollups(shard: Shard, query: str, params=()) -> List[Dict]:
+    """query_db for the rollup tables, recomputing the partitions touched since the last read."""
+    try:
+        dirty = rollups_dirty(get_connection(shard))
+    except sqlite3.OperationalError:
+        # Rollups not installed yet (schema appeared after startup).
+        with get_write_connection(shard) as conn:
+            install_rollups(conn)
+        dirty = False
+    if dirty:
+        refresh_rollups(get_write_connection(shard))
+    return query_db(shard, query, params)
+
+def query_all_rollups(query: str, params=()) -> List[List[Dict]]:
+    return federation.map(lambda shard: query_rollups(shard, query, params))
+
+def _day_range(date_from: Optional[str], date_to: Optional[str]):
+    """WHERE clause on a rollup's `day` column for an optional inclusive date range."""
+    clauses, params = [], []
+    try:
+        if date_from:
+            clauses.append("day >= ?")
+            params.append(date.fromisoformat(date_from[:10]).isoformat())
+        if date_to:
+            clauses.append("day <= ?")
+            params.append(date.fromisoformat(date_to[:10]).isoformat())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date filter: {e}")
+    return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+def refresh_documents(shard: Shard) -> None:
+    """Bring every conversation document up to date before it is read."""
+    try:
+        stale = documents_stale(get_connection(shard))
+    except sqlite3.OperationalError:
+        # Store not installed yet (schema appeared after startup).
+        install_document_store(get_write_connection(shard))
+        stale = False
+    if stale:
+        refresh_stale_documents(get_write_connection(shard))
+
+def fresh_document_connection(shard: Shard) -> sqlite3.Connection:
+    """A read connection on which every conversation document is up to date."""
+    refresh_documents(shard)
+    return get_connection(shard)
+
+def fresh_digest_connection(shard: Shard) -> sqlite3.Connection:
+    """A read connection on which every /summary period digest is up to date."""
+    try:
+        dirty = digests.digests_dirty(get_connection(shard))
+    except sqlite3.OperationalError:
+        # Digests not installed yet (schema appeared after startup).
+        digests.install_digests(get_write_connection(shard))
+        dirty = False
+    if dirty:
+        digests.refresh_digests(get_write_connection(shard))
+    return get_connection(shard)
+
+def load_conversation_documents(
+    clauses: List[str] = (),
+    params: List = (),
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_messages: bool = True,
+):
+    """
+    Read the materialized conversation documents, rebuilding stale ones first.
+
+    Returns (body, next_cursor): body is the JSON array text, assembled from
+    the stored documents without parsing them; next_cursor is only set when paging.
+    """
+    def select(shard: Shard):
+        with fresh_document_connection(shard) as conn:
+            return select_documents(
+                conn, clauses, params, limit=limit, cursor=cursor, include_messages=include_messages
+            )
+
+    results = federation.map(select)
+    if len(results) == 1:
+        rows, next_cursor = results[0]
+    elif limit is None:
+        rows, next_cursor = merge_sorted([rows for rows, _ in results], key=lambda r: r["conversation_id"]), None
+    else:
+        # Each database returned its newest `limit`, so the page is among them.
+        rows = merge_sorted(
+            [rows for rows, _ in results], key=lambda r: (r["last_updated"], r["conversation_id"]), reverse=True
+        )
+        more = len(rows) > limit or any(next_cursor for _, next_cursor in results)
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["last_updated"], rows[-1]["conversation_id"]) if more else None
+    return json_array([row["document"] for row in rows]), next_cursor
+
+def stream_conversation_documents(clauses: List[str], params: List, include_messages: bool):
+    """
+    NDJSON lines, one conversation each, straight off a cursor, one database
+    after the other. Each runs on its own connection so the open cursor never
+    pins a pooled connection's snapshot.
+    """
+    for shard in federation.shards:
+        refresh_documents(shard)
+        conn = shard.read_pool.open()
+        try:
+            # Starlette moves to a worker thread for every chunk of a sync
+            # iterator, so send lines in batches rather than one at a time.
+            chunk: List[str] = []
+            for text in iter_documents(conn, clauses, params, include_messages=include_messages):
+                chunk.append(text)
+                if len(chunk) == STREAM_CHUNK_SIZE:
+                    yield "\n".join(chunk) + "\n"
+                    chunk = []
+            if chunk:
+                yield "\n".join(chunk) + "\n"
+        finally:
+            conn.close()
+
+def columnar_format(request: Request, fmt: Optional[str]) -> Optional[str]:
+    """'arrow' or 'parquet' when the client asked for a columnar body, else None (JSON)."""
+    try:
+        chosen = columnar.negotiate(request.headers.get("accept", ""), fmt)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{fmt}'; use json, arrow or parquet")
+    if chosen and not columnar.available():
+        raise HTTPException(status_code=406, detail="Arrow/Parquet output needs pyarrow on the server")
+    return chosen
+
+def stream_conversation_table(fmt: str, table: str, clauses: List[str], params: List):
+    """One flat table as Arrow/Parquet, encoded batch by batch off a cursor on its own connection."""
+    columns, sql, params = conversation_table_query(table, clauses, params)
+    arrow_schema = columnar.schema(columns)
+
+    def batches():
+        for shard in federation.shards:
+            refresh_documents(shard)
+            conn = shard.read_pool.open()
+            conn.row_factory = None  # plain tuples transpose straight into columns
+            try:
+                yield from cursor_batches(conn.execute(sql, params), arrow_schema)
+            finally:
+                conn.close()
+
+    yield from encode(fmt, arrow_schema, batches())
+
+def rows_response(fmt: Optional[str], columns, rows: List[Dict]):
+    """Small aggregate results: the rows as JSON, or as a one-batch columnar body."""
+    if fmt is None:
+        return rows
+    return Response(encode_rows(fmt, columns, rows), media_type=columnar.MEDIA_TYPES[fmt])
+
+def _by_count(label: str):
+    """Sort key matching `ORDER BY count DESC, <label>` (NULL labels first among ties)."""
+    return lambda row: (-row["count"], row[label] is not None, row[label] or "")
+
+def _by_label(label: str):
+    """Sort key matching `ORDER BY <label>`."""
+    return lambda row: (row[label] is not None, row[label] or "")
 
 # ----------------------------
 # Routes
@@ -45,764 +399,491 @@ def query_db(query: str, params=()) -> List[Dict]:
 
 @app.get(f"/{BASE_URL}/kpis")
 def get_kpis():
-    total = query_db("SELECT COUNT(*) as count FROM Conversation")[0]["count"]
-    in_progress = query_db("SELECT COUNT(*) as count FROM Conversation WHERE status = 'in_progress'")[0]["count"]
-    solved = query_db("SELECT COUNT(*) as count FROM Conversation WHERE status = 'solved'")[0]["count"]
-    negative = query_db("""
-        SELECT COUNT(*) as count 
-        FROM Sentiment_Analysis sa
-        JOIN Message m ON sa.message_id = m.message_id
-        WHERE sentiment = 'negative'
-    """)[0]["count"]
-    urgent = query_db("SELECT COUNT(*) as count FROM Conversation WHERE status = 'urgent'")[0]["count"]
+    return sum_fields(federation.map(
+        lambda shard: cached(("kpis", shard.path), shard.version(), KPI_CACHE_TTL, lambda: compute_kpis(shard))
+    ))
 
-    return {
-        "total": total,
-        "inProgress": in_progress,
-        "solved": solved,
-        "negative": negative,
-        "urgent": urgent
-    }
+def compute_kpis(shard: Shard) -> Dict:
+    """Every KPI counter in one conditional-aggregation pass over the rollups."""
+    return query_rollups(shard, """
+        SELECT
+            COALESCE(SUM(count), 0) AS total,
+            COALESCE(SUM(CASE WHEN status = 'in_progress' THEN count END), 0) AS inProgress,
+            COALESCE(SUM(CASE WHEN status = 'solved' THEN count END), 0) AS solved,
+            (
+                SELECT COALESCE(SUM(count), 0)
+                FROM Rollup_Sentiment_Daily
+                WHERE sentiment = 'negative'
+            ) AS negative,
+            COALESCE(SUM(CASE WHEN status = 'urgent' THEN count END), 0) AS urgent
+        FROM Rollup_Conversation_Daily
+    """)[0]
 
 @app.get(f"/{BASE_URL}/conversations")
-def get_conversations():
-    rows = query_db("""
-        SELECT json_object(
-            'id', 'CONV-' || c.conversation_id,
-            'tenantId', c.client_id,
-            'agentIds', (
-                SELECT json_group_array(DISTINCT m2.agent_id)
-                FROM Message m2
-                WHERE m2.conversation_id = c.conversation_id
-                  AND m2.agent_id IS NOT NULL
-            ),
-            'status', CASE c.status
-                        WHEN 'in_progress' THEN 'In Progress'
-                        ELSE c.status
-                      END,
-            'sentiment', (
-                SELECT CASE
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) > 1
-                         THEN 'strong positive'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) > 0
-                         THEN 'moderate positive'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) < -1
-                         THEN 'strong negative'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) < 0
-                         THEN 'moderate negative'
-                    ELSE 'neutral'
-                END
-                FROM Message m3
-                JOIN Sentiment_Analysis sa ON sa.message_id = m3.message_id
-                WHERE m3.conversation_id = c.conversation_id
-            ),
-            'emotions', (
-                SELECT json_group_array(DISTINCT ea.emotion)
-                FROM Message m4
-                JOIN Emotion_Analysis ea ON ea.message_id = m4.message_id
-                WHERE m4.conversation_id = c.conversation_id
-            ),
-            'topics', (
-                SELECT json_group_array(DISTINCT ta.topic)
-                FROM Topic_Analysis ta
-                WHERE ta.conversation_id = c.conversation_id
-            ),
-            'summary', (
-                SELECT cs.summary_text
-                FROM Conversation_Summary cs
-                WHERE cs.conversation_id = c.conversation_id
-            ),
-            'messages', (
-                SELECT json_group_array(
-                    json_object(
-                        'id', m.message_id,
-                        'senderId', COALESCE(m.client_id, m.agent_id),
-                        'senderType', CASE
-                            WHEN m.client_id IS NOT NULL THEN 'tenant'
-                            WHEN m.agent_id IS NOT NULL THEN 'agent'
-                            ELSE 'system'
-                        END,
-                        'content', m.content,
-                        'timestamp', m.timestamp,
-                        'sentiment', (
-                            SELECT CASE sa.sentiment
-                                WHEN 'positive' THEN 1
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END
-                            FROM Sentiment_Analysis sa
-                            WHERE sa.message_id = m.message_id
-                        ),
-                        'emotions', (
-                            SELECT json_group_array(DISTINCT ea.emotion)
-                            FROM Emotion_Analysis ea
-                            WHERE ea.message_id = m.message_id
-                        )
-                    )
-                )
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-                ORDER BY m.timestamp ASC
-            ),
-            'lastUpdated', (
-                SELECT MAX(m.timestamp)
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            ),
-            'startedAt', (
-                SELECT MIN(m.timestamp)
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            )
-        ) AS conversation
-        FROM Conversation c;
-    """)
-
-    conversations = [json.loads(row["conversation"]) for row in rows]
+def get_conversations(
+    request: Request,
+    status: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    sentiment: Optional[str] = None,
+    emotion: List[str] = Query(default=[]),
+    topic: List[str] = Query(default=[]),
+    search: Optional[str] = Query(default=None, max_length=200),
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_messages: bool = True,
+    stream: Optional[str] = None,
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    table: str = "conversations",
+):
+    """
+    Conversations matching the dashboard filters; `search` finds text in the
+    summary, topics or emotions.
 
-    # Convert all timestamps to ISO 8601 (UTC) for TypeScript compatibility
-    def to_iso(dt_str: str | None) -> str | None:
-        if not dt_str:
-            return None
-        try:
-            # parse whatever SQLite gave you
-            dt = datetime.fromisoformat(dt_str)
-            return dt.isoformat() + "Z"
-        except Exception:
-            return dt_str  # fallback if format is already okay
-
-    for conv in conversations:
-        conv["startedAt"] = to_iso(conv.get("startedAt"))
-        conv["lastUpdated"] = to_iso(conv.get("lastUpdated"))
-        for msg in conv.get("messages", []):
-            msg["timestamp"] = to_iso(msg.get("timestamp"))
+    Without `limit`/`cursor` every match is returned, as the panel expects today.
+    With them, results are paged newest first and the next page's cursor is
+    sent back in the `X-Next-Cursor` header. `include_messages=false` gives the
+    slim list projection; threads come from `/conversations/{id}`.
 
-    return conversations
+    `Accept: application/x-ndjson` or `?stream=1` streams every match as
+    newline-delimited JSON instead, for exports: memory stays constant and the
+    first lines go out before the query has finished.
+    `?format=arrow|parquet` (or the matching Accept type) returns one flat
+    table of the matches instead: `table=conversations|messages|emotions|topics`.
+    """
+    try:
+        clauses, params = build_document_filter(
+            status=status,
+            tenant_id=tenant_id,
+            agent_id=agent_id,
+            date_from=date_from,
+            date_to=date_to,
+            sentiment=sentiment,
+            emotions=emotion,
+            topics=topic,
+            search=search,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date filter: {e}")
 
-@app.get(f"/{BASE_URL}/sentiment-distribution")
-def get_conversations_for_sentiment_distribution():
-    rows = query_db("""
-        SELECT json_object(
-            'id', 'CONV-' || c.conversation_id,
-            'tenantId', c.client_id,
-            'agentIds', (
-                SELECT json_group_array(DISTINCT m2.agent_id)
-                FROM Message m2
-                WHERE m2.conversation_id = c.conversation_id
-                  AND m2.agent_id IS NOT NULL
-            ),
-            'status', CASE c.status
-                        WHEN 'in_progress' THEN 'In Progress'
-                        ELSE c.status
-                      END,
-            'sentiment', (
-                SELECT CASE
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) > 1
-                         THEN 'strong positive'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) > 0
-                         THEN 'moderate positive'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) < -1
-                         THEN 'strong negative'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) < 0
-                         THEN 'moderate negative'
-                    ELSE 'neutral'
-                END
-                FROM Message m3
-                JOIN Sentiment_Analysis sa ON sa.message_id = m3.message_id
-                WHERE m3.conversation_id = c.conversation_id
-            ),
-            'emotions', (
-                SELECT json_group_array(DISTINCT ea.emotion)
-                FROM Message m4
-                JOIN Emotion_Analysis ea ON ea.message_id = m4.message_id
-                WHERE m4.conversation_id = c.conversation_id
-            ),
-            'topics', (
-                SELECT json_group_array(DISTINCT ta.topic)
-                FROM Topic_Analysis ta
-                WHERE ta.conversation_id = c.conversation_id
-            ),
-            'summary', (
-                SELECT cs.summary_text
-                FROM Conversation_Summary cs
-                WHERE cs.conversation_id = c.conversation_id
-            ),
-            'messages', (
-                SELECT json_group_array(
-                    json_object(
-                        'id', m.message_id,
-                        'senderId', COALESCE(m.client_id, m.agent_id),
-                        'senderType', CASE
-                            WHEN m.client_id IS NOT NULL THEN 'tenant'
-                            WHEN m.agent_id IS NOT NULL THEN 'agent'
-                            ELSE 'system'
-                        END,
-                        'content', m.content,
-                        'timestamp', m.timestamp,
-                        'sentiment', (
-                            SELECT CASE sa.sentiment
-                                WHEN 'positive' THEN 1
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END
-                            FROM Sentiment_Analysis sa
-                            WHERE sa.message_id = m.message_id
-                        ),
-                        'emotions', (
-                            SELECT json_group_array(DISTINCT ea.emotion)
-                            FROM Emotion_Analysis ea
-                            WHERE ea.message_id = m.message_id
-                        )
-                    )
-                )
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            ),
-            'lastUpdated', (
-                SELECT MAX(m.timestamp)
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            ),
-            'startedAt', (
-                SELECT MIN(m.timestamp)
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
+    output = columnar_format(request, fmt)
+    if output:
+        if limit is not None or cursor is not None:
+            raise HTTPException(status_code=400, detail="Columnar output returns every match; drop limit/cursor")
+        if table not in columnar.CONVERSATION_TABLES:
+            raise HTTPException(
+                status_code=400, detail=f"Unknown table '{table}'; use {', '.join(columnar.CONVERSATION_TABLES)}"
             )
-        ) AS conversation
-        FROM Conversation c;
-    """)
+        extension = "arrows" if output == "arrow" else "parquet"
+        return StreamingResponse(
+            stream_conversation_table(output, table, clauses, params),
+            media_type=columnar.MEDIA_TYPES[output],
+            headers={"Content-Disposition": f'attachment; filename="{table}.{extension}"'},
+        )
+    if wants_stream(request.headers.get("accept", ""), stream):
+        if limit is not None or cursor is not None:
+            raise HTTPException(status_code=400, detail="Streaming returns every match; drop limit/cursor")
+        return StreamingResponse(
+            stream_conversation_documents(clauses, params, include_messages), media_type=NDJSON
+        )
 
-    conversations = [json.loads(row["conversation"]) for row in rows]
+    if cursor is not None and limit is None:
+        limit = 100
+    try:
+        body, next_cursor = load_conversation_documents(
+            clauses, params, limit=limit, cursor=cursor, include_messages=include_messages
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    # Convert all timestamps to ISO 8601 (UTC) for TypeScript compatibility
-    def to_iso(dt_str: str | None) -> str | None:
-        if not dt_str:
-            return None
-        try:
-            # parse whatever SQLite gave you
-            dt = datetime.fromisoformat(dt_str)
-            return dt.isoformat() + "Z"
-        except Exception:
-            return dt_str  # fallback if format is already okay
+    return RawJSONResponse(body, headers=_cursor_header(next_cursor))
 
-    for conv in conversations:
-        conv["startedAt"] = to_iso(conv.get("startedAt"))
-        conv["lastUpdated"] = to_iso(conv.get("lastUpdated"))
-        for msg in conv.get("messages", []):
-            msg["timestamp"] = to_iso(msg.get("timestamp"))
+def _cursor_header(next_cursor: Optional[str]) -> Dict[str, str]:
+    return {"X-Next-Cursor": next_cursor} if next_cursor else {}
 
-    return conversations
+def _conversation_id_or_404(conversation_id: str) -> int:
+    try:
+        return parse_conversation_id(conversation_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Conversation not found")
 
-@app.get(f"/{BASE_URL}/emotion-distribution")
-def get_conversations_for_emotion_distribution():
-    rows = query_db("""
-        SELECT json_object(
-            'id', 'CONV-' || c.conversation_id,
-            'tenantId', c.client_id,
-            'agentIds', (
-                SELECT json_group_array(DISTINCT m2.agent_id)
-                FROM Message m2
-                WHERE m2.conversation_id = c.conversation_id
-                  AND m2.agent_id IS NOT NULL
-            ),
-            'status', CASE c.status
-                        WHEN 'in_progress' THEN 'In Progress'
-                        ELSE c.status
-                      END,
-            'sentiment', (
-                SELECT CASE
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) > 1
-                         THEN 'strong positive'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) > 0
-                         THEN 'moderate positive'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) < -1
-                         THEN 'strong negative'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) < 0
-                         THEN 'moderate negative'
-                    ELSE 'neutral'
-                END
-                FROM Message m3
-                JOIN Sentiment_Analysis sa ON sa.message_id = m3.message_id
-                WHERE m3.conversation_id = c.conversation_id
-            ),
-            'emotions', (
-                SELECT json_group_array(DISTINCT ea.emotion)
-                FROM Message m4
-                JOIN Emotion_Analysis ea ON ea.message_id = m4.message_id
-                WHERE m4.conversation_id = c.conversation_id
-            ),
-            'topics', (
-                SELECT json_group_array(DISTINCT ta.topic)
-                FROM Topic_Analysis ta
-                WHERE ta.conversation_id = c.conversation_id
-            ),
-            'summary', (
-                SELECT cs.summary_text
-                FROM Conversation_Summary cs
-                WHERE cs.conversation_id = c.conversation_id
-            ),
-            'messages', (
-                SELECT json_group_array(
-                    json_object(
-                        'id', m.message_id,
-                        'senderId', COALESCE(m.client_id, m.agent_id),
-                        'senderType', CASE
-                            WHEN m.client_id IS NOT NULL THEN 'tenant'
-                            WHEN m.agent_id IS NOT NULL THEN 'agent'
-                            ELSE 'system'
-                        END,
-                        'content', m.content,
-                        'timestamp', m.timestamp,
-                        'sentiment', (
-                            SELECT CASE sa.sentiment
-                                WHEN 'positive' THEN 1
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END
-                            FROM Sentiment_Analysis sa
-                            WHERE sa.message_id = m.message_id
-                        ),
-                        'emotions', (
-                            SELECT json_group_array(DISTINCT ea.emotion)
-                            FROM Emotion_Analysis ea
-                            WHERE ea.message_id = m.message_id
-                        )
-                    )
-                )
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            ),
-            'lastUpdated', (
-                SELECT MAX(m.timestamp)
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            ),
-            'startedAt', (
-                SELECT MIN(m.timestamp)
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            )
-        ) AS conversation
-        FROM Conversation c;
-    """)
+def _first_found(results: List):
+    """The conversation from the database that has it; 404 if none does."""
+    for result in results:
+        if result is not None:
+            return result
+    raise HTTPException(status_code=404, detail="Conversation not found")
 
-    conversations = [json.loads(row["conversation"]) for row in rows]
+def _load_messages(conn: sqlite3.Connection, conversation_id: int, limit: int, cursor: Optional[str]):
+    try:
+        messages, next_cursor = select_messages(conn, conversation_id, limit, cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return messages, next_cursor
 
-    # Convert all timestamps to ISO 8601 (UTC) for TypeScript compatibility
-    def to_iso(dt_str: str | None) -> str | None:
-        if not dt_str:
-            return None
-        try:
-            # parse whatever SQLite gave you
-            dt = datetime.fromisoformat(dt_str)
-            return dt.isoformat() + "Z"
-        except Exception:
-            return dt_str  # fallback if format is already okay
+@app.get(f"/{BASE_URL}/conversations/{{conversation_id}}")
+def get_conversation(
+    conversation_id: str,
+    message_limit: int = Query(default=MESSAGE_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    One conversation with the first page of its thread. Further pages come
+    from `/conversations/{id}/messages?cursor=<X-Next-Cursor>`.
+    """
+    conv_id = _conversation_id_or_404(conversation_id)
 
-    for conv in conversations:
-        conv["startedAt"] = to_iso(conv.get("startedAt"))
-        conv["lastUpdated"] = to_iso(conv.get("lastUpdated"))
-        for msg in conv.get("messages", []):
-            msg["timestamp"] = to_iso(msg.get("timestamp"))
+    def find(shard: Shard):
+        with fresh_document_connection(shard) as conn:
+            document = select_document_header(conn, conv_id)
+            if document is None:
+                return None
+            messages, next_cursor = _load_messages(conn, conv_id, message_limit, None)
+            body = conn.execute(
+                "SELECT json_set(?, '$.messages', json(?))", (document, json_array(messages))
+            ).fetchone()[0]
+        return body, next_cursor
 
-    return conversations
+    body, next_cursor = _first_found(federation.map(find))
+    return RawJSONResponse(body, headers=_cursor_header(next_cursor))
 
-@app.get(f"/{BASE_URL}/sentiment-trend")
-def get_conversations_for_emotion_distribution():
-    rows = query_db("""
-        SELECT json_object(
-            'id', 'CONV-' || c.conversation_id,
-            'tenantId', c.client_id,
-            'agentIds', (
-                SELECT json_group_array(DISTINCT m2.agent_id)
-                FROM Message m2
-                WHERE m2.conversation_id = c.conversation_id
-                  AND m2.agent_id IS NOT NULL
-            ),
-            'status', CASE c.status
-                        WHEN 'in_progress' THEN 'In Progress'
-                        ELSE c.status
-                      END,
-            'sentiment', (
-                SELECT CASE
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) > 1
-                         THEN 'strong positive'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) > 0
-                         THEN 'moderate positive'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) < -1
-                         THEN 'strong negative'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) < 0
-                         THEN 'moderate negative'
-                    ELSE 'neutral'
-                END
-                FROM Message m3
-                JOIN Sentiment_Analysis sa ON sa.message_id = m3.message_id
-                WHERE m3.conversation_id = c.conversation_id
-            ),
-            'emotions', (
-                SELECT json_group_array(DISTINCT ea.emotion)
-                FROM Message m4
-                JOIN Emotion_Analysis ea ON ea.message_id = m4.message_id
-                WHERE m4.conversation_id = c.conversation_id
-            ),
-            'topics', (
-                SELECT json_group_array(DISTINCT ta.topic)
-                FROM Topic_Analysis ta
-                WHERE ta.conversation_id = c.conversation_id
-            ),
-            'summary', (
-                SELECT cs.summary_text
-                FROM Conversation_Summary cs
-                WHERE cs.conversation_id = c.conversation_id
-            ),
-            'messages', (
-                SELECT json_group_array(
-                    json_object(
-                        'id', m.message_id,
-                        'senderId', COALESCE(m.client_id, m.agent_id),
-                        'senderType', CASE
-                            WHEN m.client_id IS NOT NULL THEN 'tenant'
-                            WHEN m.agent_id IS NOT NULL THEN 'agent'
-                            ELSE 'system'
-                        END,
-                        'content', m.content,
-                        'timestamp', m.timestamp,
-                        'sentiment', (
-                            SELECT CASE sa.sentiment
-                                WHEN 'positive' THEN 1
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END
-                            FROM Sentiment_Analysis sa
-                            WHERE sa.message_id = m.message_id
-                        ),
-                        'emotions', (
-                            SELECT json_group_array(DISTINCT ea.emotion)
-                            FROM Emotion_Analysis ea
-                            WHERE ea.message_id = m.message_id
-                        )
-                    )
-                )
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            ),
-            'lastUpdated', (
-                SELECT MAX(m.timestamp)
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            ),
-            'startedAt', (
-                SELECT MIN(m.timestamp)
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            )
-        ) AS conversation
-        FROM Conversation c;
-    """)
+@app.get(f"/{BASE_URL}/conversations/{{conversation_id}}/messages")
+def get_conversation_messages(
+    conversation_id: str,
+    limit: int = Query(default=MESSAGE_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    conv_id = _conversation_id_or_404(conversation_id)
 
-    conversations = [json.loads(row["conversation"]) for row in rows]
+    def find(shard: Shard):
+        with get_connection(shard) as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM Conversation WHERE conversation_id = ?", (conv_id,)
+            ).fetchone()
+            if exists is None:
+                return None
+            return _load_messages(conn, conv_id, limit, cursor)
 
-    # Convert all timestamps to ISO 8601 (UTC) for TypeScript compatibility
-    def to_iso(dt_str: str | None) -> str | None:
-        if not dt_str:
-            return None
-        try:
-            # parse whatever SQLite gave you
-            dt = datetime.fromisoformat(dt_str)
-            return dt.isoformat() + "Z"
-        except Exception:
-            return dt_str  # fallback if format is already okay
+    messages, next_cursor = _first_found(federation.map(find))
+    return RawJSONResponse(json_array(messages), headers=_cursor_header(next_cursor))
 
-    for conv in conversations:
-        conv["startedAt"] = to_iso(conv.get("startedAt"))
-        conv["lastUpdated"] = to_iso(conv.get("lastUpdated"))
-        for msg in conv.get("messages", []):
-            msg["timestamp"] = to_iso(msg.get("timestamp"))
-
-    return conversations
+@app.get(f"/{BASE_URL}/sentiment-distribution")
+def get_sentiment_distribution(
+    request: Request,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fmt: Optional[str] = Query(default=None, alias="format"),
+):
+    """Analysed messages per sentiment label, optionally limited to a range of (UTC) days."""
+    output = columnar_format(request, fmt)
+    where, params = _day_range(date_from, date_to)
+    rows = sum_rows(query_all_rollups(f"""
+        SELECT NULLIF(sentiment, '') AS sentiment, SUM(count) AS count
+        FROM Rollup_Sentiment_Daily
+        {where}
+        GROUP BY sentiment
+        HAVING SUM(count) > 0
+        ORDER BY count DESC, sentiment
+    """, params), ["sentiment"], ["count"], order=_by_count("sentiment"))
+    return rows_response(output, [("sentiment", "string"), ("count", "int64")], rows)
 
-@app.get(f"/{BASE_URL}/emotion-trend")
-def get_conversations_for_emotion_distribution():
-    rows = query_db("""
-        SELECT json_object(
-            'id', 'CONV-' || c.conversation_id,
-            'tenantId', c.client_id,
-            'agentIds', (
-                SELECT json_group_array(DISTINCT m2.agent_id)
-                FROM Message m2
-                WHERE m2.conversation_id = c.conversation_id
-                  AND m2.agent_id IS NOT NULL
-            ),
-            'status', CASE c.status
-                        WHEN 'in_progress' THEN 'In Progress'
-                        ELSE c.status
-                      END,
-            'sentiment', (
-                SELECT CASE
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) > 1
-                         THEN 'strong positive'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) > 0
-                         THEN 'moderate positive'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) < -1
-                         THEN 'strong negative'
-                    WHEN AVG(CASE sa.sentiment
-                                WHEN 'positive' THEN 2
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END) < 0
-                         THEN 'moderate negative'
-                    ELSE 'neutral'
-                END
-                FROM Message m3
-                JOIN Sentiment_Analysis sa ON sa.message_id = m3.message_id
-                WHERE m3.conversation_id = c.conversation_id
-            ),
-            'emotions', (
-                SELECT json_group_array(DISTINCT ea.emotion)
-                FROM Message m4
-                JOIN Emotion_Analysis ea ON ea.message_id = m4.message_id
-                WHERE m4.conversation_id = c.conversation_id
-            ),
-            'topics', (
-                SELECT json_group_array(DISTINCT ta.topic)
-                FROM Topic_Analysis ta
-                WHERE ta.conversation_id = c.conversation_id
-            ),
-            'summary', (
-                SELECT cs.summary_text
-                FROM Conversation_Summary cs
-                WHERE cs.conversation_id = c.conversation_id
-            ),
-            'messages', (
-                SELECT json_group_array(
-                    json_object(
-                        'id', m.message_id,
-                        'senderId', COALESCE(m.client_id, m.agent_id),
-                        'senderType', CASE
-                            WHEN m.client_id IS NOT NULL THEN 'tenant'
-                            WHEN m.agent_id IS NOT NULL THEN 'agent'
-                            ELSE 'system'
-                        END,
-                        'content', m.content,
-                        'timestamp', m.timestamp,
-                        'sentiment', (
-                            SELECT CASE sa.sentiment
-                                WHEN 'positive' THEN 1
-                                WHEN 'negative' THEN -2
-                                WHEN 'neutral'  THEN 0
-                                ELSE 0 END
-                            FROM Sentiment_Analysis sa
-                            WHERE sa.message_id = m.message_id
-                        ),
-                        'emotions', (
-                            SELECT json_group_array(DISTINCT ea.emotion)
-                            FROM Emotion_Analysis ea
-                            WHERE ea.message_id = m.message_id
-                        )
-                    )
-                )
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            ),
-            'lastUpdated', (
-                SELECT MAX(m.timestamp)
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            ),
-            'startedAt', (
-                SELECT MIN(m.timestamp)
-                FROM Message m
-                WHERE m.conversation_id = c.conversation_id
-            )
-        ) AS conversation
-        FROM Conversation c;
-    """)
+@app.get(f"/{BASE_URL}/emotion-distribution")
+def get_emotion_distribution(
+    request: Request,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    fmt: Optional[str] = Query(default=None, alias="format"),
+):
+    """Emotion occurrences on analysed messages, optionally limited to a range of (UTC) days."""
+    output = columnar_format(request, fmt)
+    where, params = _day_range(date_from, date_to)
+    rows = sum_rows(query_all_rollups(f"""
+        SELECT NULLIF(emotion, '') AS emotion, SUM(count) AS count
+        FROM Rollup_Emotion_Daily
+        {where}
+        GROUP BY emotion
+        HAVING SUM(count) > 0
+        ORDER BY count DESC, emotion
+    """, params), ["emotion"], ["count"], order=_by_count("emotion"))
+    return rows_response(output, [("emotion", "string"), ("count", "int64")], rows)
 
-    conversations = [json.loads(row["conversation"]) for row in rows]
+def _trend(series_fn, columnar_fn, granularity: str, tz: str, date_from: Optional[str], date_to: Optional[str]):
+    """series_fn on SQLite, or columnar_fn on the database's DuckDB copy when there is one."""
+    def series_on(shard: Shard):
+        duck = analytics.cursor(shard)
+        if duck is not None:
+            with closing(duck):
+                return columnar_fn(duck, granularity, tz, date_from, date_to)
+        with get_connection(shard) as conn:
+            return series_fn(conn, granularity, tz, date_from, date_to)
 
-    # Convert all timestamps to ISO 8601 (UTC) for TypeScript compatibility
-    def to_iso(dt_str: str | None) -> str | None:
-        if not dt_str:
-            return None
-        try:
-            # parse whatever SQLite gave you
-            dt = datetime.fromisoformat(dt_str)
-            return dt.isoformat() + "Z"
-        except Exception:
-            return dt_str  # fallback if format is already okay
+    try:
+        series = merge_series(federation.map(series_on))
+    except ZoneInfoNotFoundError:
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {tz}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"granularity": granularity, "timezone": tz, "series": series}
 
-    for conv in conversations:
-        conv["startedAt"] = to_iso(conv.get("startedAt"))
-        conv["lastUpdated"] = to_iso(conv.get("lastUpdated"))
-        for msg in conv.get("messages", []):
-            msg["timestamp"] = to_iso(msg.get("timestamp"))
+@app.get(f"/{BASE_URL}/sentiment-trend")
+def get_sentiment_trend(
+    granularity: str = Query(default="day", pattern="^(hour|day|week|month)$"),
+    tz: str = "UTC",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    """Positive / neutral / negative message counts per time bucket."""
+    return _trend(sentiment_trend, analytics.sentiment_trend, granularity, tz, date_from, date_to)
 
-    return conversations
+@app.get(f"/{BASE_URL}/emotion-trend")
+def get_emotion_trend(
+    granularity: str = Query(default="day", pattern="^(hour|day|week|month)$"),
+    tz: str = "UTC",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    """Per time bucket, the number of analysed messages and how many carried each emotion."""
+    return _trend(emotion_trend, analytics.emotion_trend, granularity, tz, date_from, date_to)
 
 @app.get(f"/{BASE_URL}/sentiment-by-service")
 def get_sentiment_by_service():
-    return query_db("""
-        SELECT 'General' as serviceArea, sa.sentiment, COUNT(*) as count
-        FROM Sentiment_Analysis sa
-        JOIN Message m ON m.message_id = sa.message_id
-        GROUP BY sa.sentiment
-    """)
+    return sum_rows(query_all_rollups("""
+        SELECT 'General' as serviceArea, NULLIF(sentiment, '') AS sentiment, SUM(count) as count
+        FROM Rollup_Sentiment_Daily
+        GROUP BY sentiment
+        HAVING SUM(count) > 0
+        ORDER BY sentiment
+    """), ["serviceArea", "sentiment"], ["count"], order=_by_label("sentiment"))
 
 @app.get(f"/{BASE_URL}/emotion-by-service")
 def get_emotion_by_service():
-    return query_db("""
-        SELECT 'General' as serviceArea, ea.emotion, COUNT(*) as count
-        FROM Emotion_Analysis ea
-        JOIN Message m ON m.message_id = ea.message_id
-        GROUP BY ea.emotion
-    """)
+    return sum_rows(query_all_rollups("""
+        SELECT 'General' as serviceArea, NULLIF(emotion, '') AS emotion, SUM(count) as count
+        FROM Rollup_Emotion_Daily
+        GROUP BY emotion
+        HAVING SUM(count) > 0
+        ORDER BY emotion
+    """), ["serviceArea", "emotion"], ["count"], order=_by_label("emotion"))
 
 @app.get(f"/{BASE_URL}/trending-topics")
 def get_trending_topics():
-    return query_db("""
-        SELECT topic, COUNT(*) as count
-        FROM Topic_Analysis
-        GROUP BY topic
-        ORDER BY count DESC
-    """)
+    return sum_rows(query_all_rollups("""
+        SELECT NULLIF(topic, '') AS topic, count
+        FROM Rollup_Topic
+        WHERE count > 0
+        ORDER BY count DESC, topic
+    """), ["topic"], ["count"], order=_by_count("topic"))
 
 @app.get(f"/{BASE_URL}/summary")
-def get_summary():
-    rows = query_db("SELECT summary_text FROM Conversation_Summary")
-    return {"summary": " ".join(r["summary_text"] for r in rows if r["summary_text"])}
+def get_summary(
+    period: str = "all",
+    day: Optional[str] = Query(default=None, alias="date"),
+):
+    """
+    A digest of the conversation summaries: the sentences that best stand for
+    them, with how many summary sentences each stands for. `period` is day,
+    week, month or all; `date` picks the period holding that date, by default
+    the latest one with summaries.
+    """
+    if period not in digests.PERIODS:
+        raise HTTPException(status_code=400, detail=f"Unknown period '{period}'; use one of {', '.join(digests.PERIODS)}")
+    if period == "all":
+        start: Optional[str] = ""
+    elif day:
+        try:
+            start = digests.period_start(period, day[:10])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid date: {e}")
+    else:
+        starts = federation.map(lambda shard: digests.latest_start(fresh_digest_connection(shard), period))
+        start = max((s for s in starts if s), default=None)
+
+    if start is None:
+        digest = {"conversations": 0, "sentences": []}
+    else:
+        digest = digests.merge_digests(
+            federation.map(lambda shard: digests.read_digest(fresh_digest_connection(shard), period, start))
+        )
+    return {
+        "summary": " ".join(text for text, _ in digest["sentences"]),
+        "period": period,
+        "start": start or None,
+        "end": digests.period_end(period, start) if start else None,
+        "conversations": digest["conversations"],
+        "highlights": [{"text": text, "count": count} for text, count in digest["sentences"]],
+    }
+
+# Profile and Rollup_Tenant aggregates per tenant. Ages are worked out in
+# SQLite against the server's local date.
+TENANT_SELECT = f"""
+    SELECT
+        c.client_id AS id,
+        c.name,
+        CASE WHEN date(c.date_of_birth) IS NOT NULL THEN
+            CAST(strftime('%Y', 'now', 'localtime') AS INTEGER) - CAST(strftime('%Y', c.date_of_birth) AS INTEGER)
+            - (strftime('%m-%d', 'now', 'localtime') < strftime('%m-%d', c.date_of_birth))
+        END AS age,
+        cp.openness,
+        cp.conscientiousness,
+        cp.extraversion,
+        cp.agreeableness,
+        cp.neuroticism,
+        COALESCE(rt.conversations, 0) AS conversations,
+        COALESCE(rt.open, 0) AS open,
+        COALESCE(rt.messages, 0) AS messages,
+        COALESCE(rt.sentiment_sum, 0) AS sentiment_sum,
+        COALESCE(rt.sentiment_count, 0) AS sentiment_count,
+        COALESCE(rt.emotions, '{{}}') AS emotions,
+        rt.last_contact,
+        {iso_utc('rt.last_contact')} AS last_contact_at
+    FROM Client c
+    LEFT JOIN Client_Profile cp ON cp.client_id = c.client_id
+    LEFT JOIN Rollup_Tenant rt ON rt.client_id = c.client_id
+"""
+
+# ?sort= value -> (SQL expression, row key) for ordering tenants.
+TENANT_SORTS = {
+    "id": ("c.client_id", lambda row: row["id"]),
+    "name": ("c.name", lambda row: row["name"]),
+    "age": ("age", lambda row: row["age"]),
+    "conversations": ("conversations", lambda row: row["conversations"]),
+    "open": ("open", lambda row: row["open"]),
+    "messages": ("messages", lambda row: row["messages"]),
+    "sentiment": (
+        "sentiment_sum * 1.0 / NULLIF(sentiment_count, 0)",
+        lambda row: row["sentiment_sum"] / row["sentiment_count"] if row["sentiment_count"] else None,
+    ),
+    "lastContact": ("rt.last_contact", lambda row: row["last_contact"]),
+}
+DOMINANT_EMOTIONS = 3
+
+def _tenant_sort(sort: str):
+    """(SQL ORDER BY, descending, row key) for `sort`: a TENANT_SORTS name, '-' first for descending."""
+    descending = sort.startswith("-")
+    name = sort.lstrip("-")
+    if name not in TENANT_SORTS:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown sort '{name}'; use one of {', '.join(TENANT_SORTS)}"
+        )
+    expr, key = TENANT_SORTS[name]
+    # NULLs last either way; ties in id order, so pages never overlap.
+    return f"ORDER BY {expr} {'DESC' if descending else 'ASC'} NULLS LAST, c.client_id", descending, key
+
+def _sort_tenant_rows(rows: List[Dict], descending: bool, key) -> List[Dict]:
+    """The ORDER BY of _tenant_sort, for rows merged from several databases."""
+    rows = sorted(rows, key=lambda row: row["id"])
+    present = [row for row in rows if key(row) is not None]
+    # Stable sorts: equal values stay in id order, also when reversed.
+    return sorted(present, key=key, reverse=descending) + [row for row in rows if key(row) is None]
+
+def _merge_tenant_rows(results: List[List[Dict]]) -> List[Dict]:
+    """One row per tenant: the profile from the first database that has it, aggregates added up."""
+    if len(results) == 1:
+        return results[0]
+    merged: Dict = {}
+    for rows in results:
+        for row in rows:
+            tenant = merged.get(row["id"])
+            if tenant is None:
+                merged[row["id"]] = dict(row)
+                continue
+            for field in ("conversations", "open", "messages", "sentiment_sum", "sentiment_count"):
+                tenant[field] += row[field]
+            emotions = json.loads(tenant["emotions"])
+            for emotion, count in json.loads(row["emotions"]).items():
+                emotions[emotion] = emotions.get(emotion, 0) + count
+            tenant["emotions"] = json.dumps(emotions)
+            if (row["last_contact"] or "") > (tenant["last_contact"] or ""):
+                tenant["last_contact"], tenant["last_contact_at"] = row["last_contact"], row["last_contact_at"]
+    return list(merged.values())
+
+def _tenant(row: Dict) -> Dict:
+    emotions = json.loads(row["emotions"])
+    return {
+        "id": str(row["id"]),
+        "name": row["name"],
+        "age": row["age"],
+        "gender": None,  # not in schema
+        "property": "Malaysia",  # default
+        "bigFivePersonality": {
+            "openness": row["openness"],
+            "conscientiousness": row["conscientiousness"],
+            "extraversion": row["extraversion"],
+            "agreeableness": row["agreeableness"],
+            "neuroticism": row["neuroticism"]
+        },
+        "stats": {
+            "conversationCount": row["conversations"],
+            "openCount": row["open"],
+            "messageCount": row["messages"],
+            "avgSentimentScore": (
+                round(row["sentiment_sum"] / row["sentiment_count"], 4) if row["sentiment_count"] else None
+            ),
+            "dominantEmotions": sorted(emotions, key=lambda e: (-emotions[e], e))[:DOMINANT_EMOTIONS],
+            "lastContact": row["last_contact_at"],
+        },
+    }
 
 @app.get(f"/{BASE_URL}/tenants")
-def get_tenants():
-    rows = query_db("""
-        SELECT 
-            c.client_id AS id,
-            c.name,
-            c.date_of_birth,
-            c.email,
-            cp.openness,
-            cp.conscientiousness,
-            cp.extraversion,
-            cp.agreeableness,
-            cp.neuroticism
-        FROM Client c
-        LEFT JOIN Client_Profile cp ON cp.client_id = c.client_id;
-    """)
-
-    def calculate_age(dob_str: str | None) -> int | None:
-        if not dob_str:
-            return None
-        try:
-            dob = datetime.fromisoformat(dob_str).date()
-        except ValueError:
-            return None
-        today = date.today()
-        return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+def get_tenants(
+    sort: str = "id",
+    limit: Optional[int] = Query(default=None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    """
+    Every tenant with their profile and conversation stats, as an array.
+    `sort` is id, name, age, conversations, open, messages, sentiment or
+    lastContact, with a leading '-' for descending. With `limit`, one page;
+    the next is `cursor=<X-Next-Cursor>`.
+    """
+    order_by, descending, key = _tenant_sort(sort)
+    try:
+        offset = decode_offset(cursor) if cursor else 0
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
-    tenants = []
-    for row in rows:
-        tenants.append({
-            "id": str(row["id"]),
-            "name": row["name"],
-            "age": calculate_age(row["date_of_birth"]),
-            "gender": None,  # not in schema
-            "property": "Malaysia",  # default
-            "bigFivePersonality": {
-                "openness": row["openness"],
-                "conscientiousness": row["conscientiousness"],
-                "extraversion": row["extraversion"],
-                "agreeableness": row["agreeableness"],
-                "neuroticism": row["neuroticism"]
-            }
-        })
-    return tenants
+    if len(federation.shards) == 1:
+        page = ""
+        params: List = []
+        if limit is not None:
+            page = "LIMIT ? OFFSET ?"
+            params = [limit + 1, offset]
+        rows = query_rollups(federation.primary, f"{TENANT_SELECT} {order_by} {page}", params)
+        more = limit is not None and len(rows) > limit
+    else:
+        # Aggregates add up across databases, so sort and page once merged.
+        rows = _sort_tenant_rows(_merge_tenant_rows(query_all_rollups(TENANT_SELECT)), descending, key)
+        if limit is not None:
+            rows = rows[offset:offset + limit + 1]
+        more = limit is not None and len(rows) > limit
+    if limit is not None:
+        rows = rows[:limit]
+    next_cursor = encode_offset(offset + limit) if more else None
+    return ORJSONResponse([_tenant(row) for row in rows], headers=_cursor_header(next_cursor))
+
+@app.get(f"/{BASE_URL}/tenants/{{tenant_id}}")
+def get_tenant(tenant_id: str):
+    try:
+        client_id = int(tenant_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    rows = _merge_tenant_rows(query_all_rollups(f"{TENANT_SELECT} WHERE c.client_id = ?", (client_id,)))
+    if not rows:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    return _tenant(rows[0])
 
 
 @app.get(f"/{BASE_URL}/agents")
 def get_agents():
-    rows = query_db("""
+    rows = first_by(query_all("""
         SELECT 
             a.agent_id AS id,
             a.name,
             a.date_of_birth,
             a.email
         FROM Agent a;
-    """)
+    """), "id")
 
     agents = []
     for row in rows:
@@ -813,10 +894,310 @@ def get_agents():
         })
     return agents
 
+# Rollup_Agent sums per agent; means and rates are worked out once databases are merged.
+AGENT_PERFORMANCE_SELECT = """
+    SELECT
+        a.agent_id AS id,
+        a.name,
+        COALESCE(ra.tickets, 0) AS tickets,
+        COALESCE(ra.solved, 0) AS solved,
+        COALESCE(ra.first_response_sum, 0) AS first_response_sum,
+        COALESCE(ra.first_responses, 0) AS first_responses,
+        COALESCE(ra.response_sum, 0) AS response_sum,
+        COALESCE(ra.responses, 0) AS responses,
+        COALESCE(ra.sentiment_sum, 0) AS sentiment_sum,
+        COALESCE(ra.sentiment_count, 0) AS sentiment_count,
+        COALESCE(ra.sentiments, '{}') AS sentiments,
+        COALESCE(ra.emotions, '{}') AS emotions
+    FROM Agent a
+    LEFT JOIN Rollup_Agent ra ON ra.agent_id = a.agent_id
+"""
+AGENT_SUMS = (
+    "tickets", "solved", "first_response_sum", "first_responses",
+    "response_sum", "responses", "sentiment_sum", "sentiment_count",
+)
+POSITIVE_EMOTIONS = ("joy", "enjoyment")
+NEGATIVE_EMOTIONS = ("anger", "disgust", "fear", "sadness")
+
+def _merge_agent_rows(results: List[List[Dict]]) -> List[Dict]:
+    """One row per agent: the name from the first database that has it, everything else added up."""
+    merged: Dict = {}
+    for rows in results:
+        for row in rows:
+            agent = merged.get(row["id"])
+            breakdowns = {field: json.loads(row[field]) for field in ("sentiments", "emotions")}
+            if agent is None:
+                merged[row["id"]] = {**row, **breakdowns}
+                continue
+            for field in AGENT_SUMS:
+                agent[field] += row[field]
+            for field, counts in breakdowns.items():
+                for label, count in counts.items():
+                    agent[field][label] = agent[field].get(label, 0) + count
+    return list(merged.values())
+
+def _agent_performance(row: Dict) -> Dict:
+    emotions = row["emotions"]
+    resolution_rate = round(row["solved"] * 100 / row["tickets"], 1) if row["tickets"] else 0
+    avg_sentiment = round(row["sentiment_sum"] / row["sentiment_count"], 2) if row["sentiment_count"] else 0
+    return {
+        "agentId": str(row["id"]),
+        "agentName": row["name"],
+        "totalTickets": row["tickets"],
+        "solvedTickets": row["solved"],
+        "resolutionRate": resolution_rate,
+        "avgSentiment": avg_sentiment,
+        "sentimentBreakdown": row["sentiments"],
+        "emotionBreakdown": emotions,
+        "positiveEmotions": sum(emotions.get(e, 0) for e in POSITIVE_EMOTIONS),
+        "negativeEmotions": sum(emotions.get(e, 0) for e in NEGATIVE_EMOTIONS),
+        "firstResponseSeconds": (
+            round(row["first_response_sum"] / row["first_responses"]) if row["first_responses"] else None
+        ),
+        "avgResponseSeconds": round(row["response_sum"] / row["responses"]) if row["responses"] else None,
+        # The panel's overall score.
+        "score": round(resolution_rate * 0.6 + avg_sentiment * 40, 2),
+    }
+
+@app.get(f"/{BASE_URL}/agents-performance")
+def get_agents_performance():
+    """
+    Every agent's tickets, resolution rate, the sentiment and emotions of the
+    tenants they served, and reply times in seconds (to the tenant's first
+    message, and on average to a tenant message), ranked by overall score.
+    """
+    agents = [_agent_performance(row) for row in _merge_agent_rows(query_all_rollups(AGENT_PERFORMANCE_SELECT))]
+    agents.sort(key=lambda agent: (-agent["score"], int(agent["agentId"])))
+    for rank, agent in enumerate(agents, 1):
+        agent["rank"] = rank
+    return ORJSONResponse(agents)
+
+@app.get(f"/{BASE_URL}/search")
+def get_search(
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    sender: Optional[str] = Query(default=None, pattern="^(tenant|agent)$"),
+    context: int = Query(default=1, ge=0, le=5),
+):
+    """
+    Messages matching `q`, best first, each with a highlighted snippet, its
+    conversation and `context` messages either side. Words match as prefixes
+    and common short forms ("tlg", "dah", "aircon") match their full spellings;
+    "quoted words" match as a phrase. Next page: `cursor=<X-Next-Cursor>`.
+    """
+    try:
+        match = search.build_match(q)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Nothing to search for")
+    try:
+        offset = decode_offset(cursor) if cursor else 0
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # One database pages with LIMIT/OFFSET; several each return their best
+    # offset+limit hits, merged into one ranking before the page is cut.
+    federated = len(federation.shards) > 1
+
+    def find(shard: Shard):
+        def run():
+            return search.search_messages(
+                get_connection(shard), match,
+                offset + limit + 1 if federated else limit + 1, 0 if federated else offset,
+                tenant_id=tenant_id, sender=sender,
+            )
+        try:
+            hits = run()
+        except sqlite3.OperationalError:
+            # Index not installed yet (schema appeared after startup).
+            try:
+                with get_write_connection(shard) as conn:
+                    search.install_search(conn)
+            except sqlite3.OperationalError:
+                raise HTTPException(status_code=503, detail="Full-text search is not available")
+            hits = run()
+        return [dict(hit, shard=shard) for hit in hits]
+
+    hits = search.merge_hits(federation.map(find))
+    if federated:
+        hits = hits[offset:]
+    page = hits[:limit]
+    next_cursor = encode_offset(offset + limit) if len(hits) > limit else None
+    return ORJSONResponse(
+        [search.with_context(get_connection(hit["shard"]), hit, context) for hit in page],
+        headers=_cursor_header(next_cursor),
+    )
+
+# ----------------------------
+# Live changes
+# ----------------------------
+# The feed is the live database's; archives are not written to. It reads the
+# live file even in replica mode, so events are never behind.
+_last_prune = time.monotonic()
+
+def change_log_connection() -> sqlite3.Connection:
+    """A read connection on the live database, installing the change log if it is missing."""
+    global _last_prune
+    primary = federation.primary
+    try:
+        latest_change(get_live_connection(primary))
+    except sqlite3.OperationalError:
+        # Log not installed yet (schema appeared after startup).
+        with get_write_connection(primary) as conn:
+            install_change_log(conn)
+    if time.monotonic() - _last_prune > CHANGE_PRUNE_INTERVAL:
+        _last_prune = time.monotonic()
+        prune_changes(get_write_connection(primary))
+    return get_live_connection(primary)
+
+def read_change_feed(since: int, limit: int):
+    """(missed, changes, latest): `missed` when the log no longer reaches back to `since`."""
+    conn = change_log_connection()
+    if missed_changes(conn, since):
+        return True, [], latest_change(conn)
+    changes = read_changes(conn, since, limit)
+    return False, changes, changes[-1]["changeId"] if changes else since
+
+@app.get(f"/{BASE_URL}/changes")
+def get_changes(
+    since: int = Query(ge=0),
+    limit: int = Query(default=CHANGE_BATCH, ge=1, le=5000),
+):
+    """
+    Changes after change id `since`, oldest first, for clients that poll
+    rather than hold `/events` open. Continue from `latest`; 410 means the
+    changes are gone and the client should reload its data.
+    """
+    missed, changes, latest = read_change_feed(since, limit)
+    if missed:
+        raise HTTPException(status_code=410, detail=f"Changes after {since} are no longer available; reload")
+    return {"changes": changes, "latest": latest}
+
+async def change_events(request: Request, since: Optional[int]):
+    primary = federation.primary
+    if since is None:
+        since = await run_in_threadpool(lambda: latest_change(change_log_connection()))
+    # Start from the current counters; every event carries the cursor to resume from.
+    yield sse("kpis", await run_in_threadpool(get_kpis), since)
+    version = None
+    quiet = 0.0
+    while not await request.is_disconnected():
+        current = data_version(primary.path)
+        if current != version:
+            version = current
+            missed, changes, latest = await run_in_threadpool(read_change_feed, since, CHANGE_BATCH)
+            if missed:
+                yield sse("reset", {"since": since, "latest": latest}, latest)
+                since = latest
+                continue
+            for change in changes:
+                yield sse(change["kind"], change, change["changeId"])
+            if changes:
+                since = latest
+                yield sse("kpis", await run_in_threadpool(get_kpis), since)
+                quiet = 0.0
+                if len(changes) == CHANGE_BATCH:
+                    version = None  # more waiting; read on without sleeping
+                    continue
+        if quiet >= CHANGE_HEARTBEAT:
+            yield ": keep-alive\n\n"
+            quiet = 0.0
+        await asyncio.sleep(CHANGE_POLL_INTERVAL)
+        quiet += CHANGE_POLL_INTERVAL
+
+@app.get(f"/{BASE_URL}/events")
+async def get_events(request: Request, since: Optional[int] = Query(default=None, ge=0)):
+    """
+    Server-Sent Events of what changes in the live database: `message`,
+    `conversation` (opened, status changed, removed), `sentiment`, `emotion`,
+    `topic` and `summary` deltas (`op` is insert, update or delete), then the
+    updated `kpis`. Without `since` the stream starts at the current state.
+    Reconnecting browsers resume from their Last-Event-ID; a `reset` event
+    means the changes were trimmed and the client should reload.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        try:
+            since = max(0, int(last_event_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+    return StreamingResponse(
+        change_events(request, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _replica_values(read):
+    """(labels, value) of every replica for a metrics gauge; None values are left out."""
+    values = []
+    for shard in federation.shards:
+        if shard.replica is not None:
+            value = read(shard)
+            if value is not None:
+                values.append(({"database": shard.path}, value))
+    return values
+
+metrics.add_gauge(
+    "sqlite_replica_lag_seconds", "How long the oldest commit missing from the replica has been waiting.",
+    lambda: _replica_values(lambda shard: round(shard.replica.lag(), 3)),
+)
+metrics.add_gauge(
+    "sqlite_replica_changes_behind", "Change-log entries committed to the live database but not in the replica.",
+    lambda: _replica_values(lambda shard: shard.replica.changes_behind(get_live_connection(shard))),
+)
+metrics.add_gauge(
+    "sqlite_replica_generation", "Copies taken since startup.",
+    lambda: _replica_values(lambda shard: shard.replica.generation),
+)
+metrics.add_gauge(
+    "sqlite_replica_refresh_seconds", "Time the last copy took, maintenance included.",
+    lambda: _replica_values(lambda shard: shard.replica.refresh_seconds),
+)
+
+metrics.add_gauge(
+    "analytics_copy_age_seconds", "Age of each database's DuckDB copy used for the trends.",
+    lambda: [({"database": path}, copy["ageSeconds"]) for path, copy in analytics.stats().items()
+             if copy["ageSeconds"] is not None],
+)
+
+def debug_access(request: Request) -> None:
+    """The debug endpoints answer the networks allowed to profile (PROFILE_ALLOW) only."""
+    if not profiling.allowed(request.scope):
+        raise HTTPException(status_code=403, detail="Not available from this address")
+
+@app.get(f"/{BASE_URL}/debug/pool", dependencies=[Depends(debug_access)])
+def get_pool_stats():
+    """Connection pool, request coalescing and response cache counters, for checking reuse under load."""
+    return {
+        "databases": {shard.path: shard.stats() for shard in federation.shards},
+        "analytics": analytics.stats(),
+        "singleFlight": single_flight_stats(),
+        "responseCache": response_cache_stats(),
+    }
+
+@app.get(f"/{BASE_URL}/debug/perf", dependencies=[Depends(debug_access)])
+def get_perf():
+    """Latency, size and status per route and timing per query_db statement fingerprint, slowest total first."""
+    return metrics.summary()
+
+@app.get(f"/{BASE_URL}/debug/slow-queries", dependencies=[Depends(debug_access)])
+def get_slow_queries(limit: int = Query(default=50, ge=1, le=1000)):
+    """The newest entries of the slow-query log, with their parameter types and EXPLAIN QUERY PLAN."""
+    return {
+        "thresholdMs": slow_queries.SLOW_QUERY_MS,
+        "log": slow_queries.SLOW_QUERY_LOG or None,
+        "entries": slow_queries.tail(limit),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """The same figures for Prometheus to scrape."""
+    return Response(metrics.prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 if __name__ == "__main__":
-    # Read port from environment variable or fallback to 8000
-    port = int(os.environ.get("PORT", 4000))
-    host = os.environ.get("HOST", f"127.0.0.1")
+    # One way to start the server: serve.py's (`--reload` for development).
+    import serve
 
-    uvicorn.run("main:app", host=host, port=port, reload=True)
\ No newline at end of file
+    serve.main()
\ No newline at end of file
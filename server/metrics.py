@@ -0,0 +1,315 @@
+"""
+Request and SQL timing metrics, for /metrics (Prometheus text format) and
+/debug/perf (JSON).
+
+MetricsMiddleware records, per route template (`/conversations/{conversation_id}`,
+not the raw path, so label sets stay bounded) and method: a latency histogram,
+a response size histogram and the status classes; and how many requests are in
+flight overall. `record_query` records, per statement fingerprint (the SQL with
+literals and IN-lists folded, so `... IN (?, ?, ?)` and `... IN (?)` count as
+one), a duration histogram, rows returned and the time spent waiting for a
+pooled connection.
+
+Histograms use fixed buckets, so recording is O(buckets) with no samples kept;
+percentiles in /debug/perf are interpolated from the buckets the way
+Prometheus' histogram_quantile() does.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_lock = threading.Lock()
+_started = time.time()
+
+
+class Histogram:
+    """Cumulative-bucket histogram; callers hold _lock."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        out = []
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            out.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return out
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return min(lower + (bound - lower) * (rank - seen) / count, self.max)
+            seen += count
+            lower = bound
+        return self.max  # in the +Inf bucket
+
+
+class _Route:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.statuses: Dict[str, int] = {}
+
+
+class _Query:
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.duration = Histogram(QUERY_BUCKETS)
+        self.wait = Histogram(QUERY_BUCKETS)
+        self.rows = 0
+
+
+_routes: Dict[Tuple[str, str], _Route] = {}
+_queries: Dict[str, _Query] = {}
+_in_flight = 0  # the route is only known once routing ran, so this one is not per route
+# name -> (help, read): values owned elsewhere, read when scraped
+_gauges: Dict[str, Tuple[str, Callable[[], Iterable[Tuple[Dict[str, str], float]]]]] = {}
+
+
+# ----------------------------
+# SQL
+# ----------------------------
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)+\s*\)", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    """`sql` with whitespace collapsed and literals and placeholder lists folded."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = " ".join(sql.split())
+    return _IN_LIST.sub("IN (?, ...)", sql)
+
+
+def fingerprint(sql: str) -> Tuple[str, str]:
+    """(short id, normalized SQL) for a statement."""
+    normalized = normalize_sql(sql)
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized
+
+
+_fingerprints: Dict[str, Tuple[str, str]] = {}  # raw SQL -> fingerprint, for the statements seen first
+FINGERPRINT_CACHE_SIZE = 1024
+
+
+def record_query(sql: str, seconds: float, rows: int, wait: float) -> None:
+    key = _fingerprints.get(sql)
+    if key is None:
+        key = fingerprint(sql)
+        if len(_fingerprints) < FINGERPRINT_CACHE_SIZE:
+            _fingerprints[sql] = key
+    query_id, normalized = key
+    with _lock:
+        query = _queries.get(query_id)
+        if query is None:
+            query = _queries[query_id] = _Query(normalized)
+        query.duration.observe(seconds)
+        query.wait.observe(wait)
+        query.rows += rows
+
+
+# ----------------------------
+# Requests
+# ----------------------------
+def _route_of(scope: Scope) -> str:
+    route = scope.get("route")
+    if route is None and "app" in scope:
+        # Answered before routing (response cache, 304): match it here.
+        for candidate in scope["app"].router.routes:
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request, from the first byte received to the last byte sent."""
+
+    def __init__(self, app: ASGIApp, exclude: Iterable[str] = ()):
+        self.app = app
+        self.exclude = tuple(exclude)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        global _in_flight
+        started = time.perf_counter()
+        status = [0]
+        size = [0]
+        with _lock:
+            _in_flight += 1
+
+        async def measure(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                size[0] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, measure)
+        finally:
+            elapsed = time.perf_counter() - started
+            with _lock:
+                _in_flight -= 1
+                route = _routes.setdefault((scope["method"], _route_of(scope)), _Route())
+                route.latency.observe(elapsed)
+                route.size.observe(size[0])
+                status_class = f"{status[0] // 100}xx" if status[0] else "aborted"
+                route.statuses[status_class] = route.statuses.get(status_class, 0) + 1
+
+
+# ----------------------------
+# Gauges
+# ----------------------------
+def add_gauge(name: str, help: str, read: Callable[[], Iterable[Tuple[Dict[str, str], float]]]) -> None:
+    """Expose a value kept elsewhere: read() gives its current (labels, value) pairs at every scrape."""
+    _gauges[name] = (help, read)
+
+
+# ----------------------------
+# Exposition
+# ----------------------------
+def _labels(**labels: str) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram(lines: List[str], name: str, histogram: Histogram, labels: str) -> None:
+    for bound, count in histogram.cumulative():
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+def prometheus() -> str:
+    """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines: List[str] = []
+    with _lock:
+        routes = sorted(_routes.items())
+
+        lines += ["# HELP http_request_duration_seconds Request latency by route template.",
+                  "# TYPE http_request_duration_seconds histogram"]
+        for (method, path), route in routes:
+            _histogram(lines, "http_request_duration_seconds", route.latency, _labels(method=method, route=path))
+        lines += ["# HELP http_response_size_bytes Response body size by route template.",
+                  "# TYPE http_response_size_bytes histogram"]
+        for (method, path), route in routes:
+            _histogram(lines, "http_response_size_bytes", route.size, _labels(method=method, route=path))
+        lines += ["# HELP http_requests_total Requests by route template and status class.",
+                  "# TYPE http_requests_total counter"]
+        for (method, path), route in routes:
+            for status, count in sorted(route.statuses.items()):
+                lines.append(f"http_requests_total{{{_labels(method=method, route=path, status=status)}}} {count}")
+        lines += ["# HELP http_requests_in_flight Requests being served.",
+                  "# TYPE http_requests_in_flight gauge",
+                  f"http_requests_in_flight {_in_flight}"]
+
+        queries = sorted(_queries.items())
+        lines += ["# HELP sqlite_query_duration_seconds query_db statement time (execute and fetch) by fingerprint.",
+                  "# TYPE sqlite_query_duration_seconds histogram"]
+        for query_id, query in queries:
+            _histogram(lines, "sqlite_query_duration_seconds", query.duration, _labels(query=query_id))
+        lines += ["# HELP sqlite_query_rows_total Rows returned by fingerprint.",
+                  "# TYPE sqlite_query_rows_total counter"]
+        for query_id, query in queries:
+            lines.append(f"sqlite_query_rows_total{{{_labels(query=query_id)}}} {query.rows}")
+        lines += ["# HELP sqlite_connection_wait_seconds Time to check a pooled connection out, by fingerprint.",
+                  "# TYPE sqlite_connection_wait_seconds histogram"]
+        for query_id, query in queries:
+            _histogram(lines, "sqlite_connection_wait_seconds", query.wait, _labels(query=query_id))
+    for name, (help, read) in sorted(_gauges.items()):
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+        for labels, value in read():
+            lines.append(f"{name}{{{_labels(**labels)}}} {value}")
+    lines += ["# HELP process_uptime_seconds Seconds since the metrics were started.",
+              "# TYPE process_uptime_seconds gauge",
+              f"process_uptime_seconds {time.time() - _started:.3f}"]
+    return "\n".join(lines) + "\n"
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def summary() -> Dict:
+    """Per-route and per-query figures in milliseconds, slowest total first."""
+    with _lock:
+        routes = [
+            {
+                "method": method,
+                "route": path,
+                "requests": route.latency.count,
+                "statuses": dict(route.statuses),
+                "avgMs": _ms(route.latency.sum / route.latency.count) if route.latency.count else None,
+                "p50Ms": _ms(route.latency.quantile(0.5)),
+                "p95Ms": _ms(route.latency.quantile(0.95)),
+                "p99Ms": _ms(route.latency.quantile(0.99)),
+                "maxMs": _ms(route.latency.max),
+                "totalMs": _ms(route.latency.sum),
+                "avgBytes": round(route.size.sum / route.size.count) if route.size.count else None,
+                "maxBytes": int(route.size.max),
+            }
+            for (method, path), route in _routes.items()
+        ]
+        queries = [
+            {
+                "fingerprint": query_id,
+                "sql": query.sql,
+                "calls": query.duration.count,
+                "avgMs": _ms(query.duration.sum / query.duration.count),
+                "p95Ms": _ms(query.duration.quantile(0.95)),
+                "maxMs": _ms(query.duration.max),
+                "totalMs": _ms(query.duration.sum),
+                "rows": query.rows,
+                "avgRows": round(query.rows / query.duration.count, 1),
+                "avgWaitMs": _ms(query.wait.sum / query.wait.count),
+                "maxWaitMs": _ms(query.wait.max),
+            }
+            for query_id, query in _queries.items()
+        ]
+        in_flight = _in_flight
+    return {
+        "uptimeSeconds": round(time.time() - _started, 1),
+        "inFlight": in_flight,
+        "routes": sorted(routes, key=lambda r: -(r["totalMs"] or 0)),
+        "queries": sorted(queries, key=lambda q: -(q["totalMs"] or 0)),
+    }
+
+
+def reset() -> None:
+    with _lock:
+        _routes.clear()
+        _queries.clear()
@@ -0,0 +1,183 @@
+"""
+Versioned migrations for the shared chat-analysis schema.
+
+The same SQLite file is written by `preprocess/message_analyse_v2.5.py` and
+`streamlit-chatroom/chat_analysis.py` and read by this server. Neither writer
+migrates: the tables below are what they expect to find, and the server (or
+`python migrations.py up`) brings a file to that shape before they use it.
+Each migration runs once, in order, inside its own transaction, and is
+recorded in `Schema_Migration`. Add new steps to the end of MIGRATIONS; never
+edit one that has shipped. A step is SQL, or a function of the connection for
+changes SQLite cannot guard itself, such as adding a column.
+
+    python migrations.py status [--db database/test.db]
+    python migrations.py up [--db database/test.db]
+
+The server applies pending migrations at startup.
+"""
+
+import argparse
+import sqlite3
+from typing import Callable, List, Tuple, Union
+
+Step = Union[str, Callable[[sqlite3.Connection], None]]
+
+
+def add_column(table: str, column: str, declaration: str) -> Callable[[sqlite3.Connection], None]:
+    """A step adding a column unless the table has it already."""
+    def step(conn: sqlite3.Connection) -> None:
+        if column not in {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+    return step
+
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "baseline shared tables", [
+        # What the preprocess job and the chatroom expect. IF NOT EXISTS keeps this
+        # a no-op on databases created before migrations existed.
+        """CREATE TABLE IF NOT EXISTS Client (
+            client_id     INTEGER PRIMARY KEY,
+            name          TEXT,
+            date_of_birth TEXT,
+            email         TEXT,
+            created_at    TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS Client_Profile (
+            client_id         INTEGER PRIMARY KEY REFERENCES Client(client_id),
+            openness          REAL,
+            conscientiousness REAL,
+            extraversion      REAL,
+            agreeableness     REAL,
+            neuroticism       REAL,
+            last_updated_at   TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS Agent (
+            agent_id      INTEGER PRIMARY KEY,
+            name          TEXT,
+            date_of_birth TEXT,
+            email         TEXT,
+            created_at    TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS Conversation (
+            conversation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            client_id       INTEGER REFERENCES Client(client_id),
+            started_at      TEXT,
+            ended_at        TEXT,
+            status          TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS Message (
+            message_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            content         TEXT,
+            language        TEXT,
+            client_id       INTEGER,
+            agent_id        INTEGER,
+            timestamp       TEXT,
+            conversation_id INTEGER REFERENCES Conversation(conversation_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS Sentiment_Analysis (
+            sentiment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message_id   INTEGER UNIQUE REFERENCES Message(message_id),
+            sentiment    TEXT,
+            created_at   TEXT
+        )""",
+        "CREATE TABLE IF NOT EXISTS Emotion (emotion TEXT PRIMARY KEY)",
+        """CREATE TABLE IF NOT EXISTS Emotion_Analysis (
+            message_id INTEGER REFERENCES Message(message_id),
+            emotion    TEXT REFERENCES Emotion(emotion),
+            UNIQUE (message_id, emotion)
+        )""",
+        "CREATE TABLE IF NOT EXISTS Topic (topic TEXT PRIMARY KEY)",
+        """CREATE TABLE IF NOT EXISTS Topic_Analysis (
+            conversation_id INTEGER REFERENCES Conversation(conversation_id),
+            topic           TEXT REFERENCES Topic(topic),
+            UNIQUE (conversation_id, topic)
+        )""",
+        """CREATE TABLE IF NOT EXISTS Conversation_Summary (
+            conversation_id INTEGER PRIMARY KEY REFERENCES Conversation(conversation_id),
+            summary_text    TEXT,
+            created_at      TEXT
+        )""",
+    ]),
+    (2, "covering indexes for dashboard queries", [
+        # Threads in order, first/last message per conversation.
+        "CREATE INDEX IF NOT EXISTS idx_message_conversation_timestamp ON Message (conversation_id, timestamp)",
+        # Trend buckets and rollup day recomputes range over time.
+        "CREATE INDEX IF NOT EXISTS idx_message_timestamp ON Message (timestamp)",
+        # Joins from a message to its analysis read only the index.
+        "CREATE INDEX IF NOT EXISTS idx_sentiment_analysis_message ON Sentiment_Analysis (message_id, sentiment)",
+        "CREATE INDEX IF NOT EXISTS idx_emotion_analysis_message ON Emotion_Analysis (message_id, emotion)",
+        "CREATE INDEX IF NOT EXISTS idx_topic_analysis_conversation ON Topic_Analysis (conversation_id, topic)",
+        "CREATE INDEX IF NOT EXISTS idx_topic_analysis_topic ON Topic_Analysis (topic, conversation_id)",
+        "CREATE INDEX IF NOT EXISTS idx_conversation_started ON Conversation (started_at, status)",
+        "CREATE INDEX IF NOT EXISTS idx_conversation_client ON Conversation (client_id)",
+    ]),
+    (3, "per-tenant message index", [
+        # Tenant rollup recomputes: a tenant's messages and their latest timestamp.
+        "CREATE INDEX IF NOT EXISTS idx_message_client ON Message (client_id, timestamp)",
+    ]),
+    (4, "summary timestamps", [
+        # The chatroom writes created_at; files made by version 1 before it listed the column lack it.
+        add_column("Conversation_Summary", "created_at", "TEXT"),
+    ]),
+]
+
+MIGRATION_TABLE = """
+    CREATE TABLE IF NOT EXISTS Schema_Migration (
+        version    INTEGER PRIMARY KEY,
+        name       TEXT NOT NULL,
+        applied_at TEXT NOT NULL
+    )
+"""
+
+
+def applied_versions(conn: sqlite3.Connection) -> List[int]:
+    conn.execute(MIGRATION_TABLE)
+    return [row[0] for row in conn.execute("SELECT version FROM Schema_Migration ORDER BY version")]
+
+
+def pending_migrations(conn: sqlite3.Connection) -> List[Tuple[int, str, List[Step]]]:
+    done = set(applied_versions(conn))
+    return [migration for migration in MIGRATIONS if migration[0] not in done]
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """Apply every pending migration in order. Returns the versions applied."""
+    applied = []
+    for version, name, steps in pending_migrations(conn):
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Another process may have applied it while we waited for the lock.
+            if conn.execute("SELECT 1 FROM Schema_Migration WHERE version = ?", (version,)).fetchone():
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(
+                "INSERT INTO Schema_Migration (version, name, applied_at) VALUES (?, ?, datetime('now'))",
+                (version, name),
+            )
+        applied.append(version)
+    if applied:
+        # Refresh planner statistics so the new indexes are used.
+        conn.execute("PRAGMA optimize")
+    return applied
+
+
+if __name__ == "__main__":
+    from main import DB_FILE
+
+    parser = argparse.ArgumentParser(description="Migrate the shared chat-analysis schema.")
+    parser.add_argument("command", choices=["status", "up"])
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file")
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.db) as conn:
+        if args.command == "up":
+            applied = migrate(conn)
+            print(f"Applied {applied or 'nothing'} to {args.db}")
+        else:
+            done = set(applied_versions(conn))
+            for version, name, _ in MIGRATIONS:
+                print(f"{version:>4}  {'applied' if version in done else 'pending':8} {name}")
@@ -0,0 +1,133 @@
+"""
+Per-thread pool of long-lived, tuned SQLite connections.
+
+FastAPI runs sync endpoints on a fixed set of worker threads, so giving each
+thread its own connection means a request never pays for connect(), schema
+parsing or a cold page cache, and never shares a connection across threads.
+Read pools open the file with mode=ro; writes go through a separate pool.
+A read pool can be repointed at another file (replica.py swaps in fresh
+copies this way): each thread moves to the new file at its next checkout.
+"""
+
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from slow_queries import TimedConnection
+
+# Applied to every pooled connection. journal_mode is a property of the file and
+# needs a writable connection, see enable_wal().
+TUNING = {
+    "mmap_size": 256 * 1024 * 1024,   # map up to 256 MiB of the file instead of read() copies
+    "cache_size": -64 * 1024,         # 64 MiB page cache per connection (negative = KiB)
+    "temp_store": "MEMORY",           # sorts / GROUP BY temp b-trees stay off disk
+    "busy_timeout": 5000,             # ms to wait for a writer instead of failing at once
+}
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionPool:
+    def __init__(
+        self, db_path: str, read_only: bool = True, tuning: Optional[Dict] = None, immutable: bool = False
+    ):
+        self.db_path = db_path
+        self.read_only = read_only
+        # For files nothing writes to any more: SQLite skips locking and change checks.
+        self.immutable = immutable
+        self.tuning = dict(TUNING if tuning is None else tuning)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: Dict[int, Tuple[threading.Thread, sqlite3.Connection]] = {}
+        self._opened = 0
+        self._checkouts = 0
+        self._closed_dead = 0
+        self._generation = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = Path(self.db_path).resolve().as_uri()
+        if self.read_only:
+            uri += "?mode=ro&immutable=1" if self.immutable else "?mode=ro"
+        # check_same_thread=False only so close_all() may run elsewhere; each
+        # connection is otherwise used by the thread that opened it.
+        conn = sqlite3.connect(
+            uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE,
+            factory=TimedConnection,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma, value in self.tuning.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+        return conn
+
+    def open(self) -> sqlite3.Connection:
+        """A new connection with the pool's settings that the caller owns and closes.
+
+        For long-lived cursors (streamed exports) that would otherwise pin a
+        read snapshot on a shared connection.
+        """
+        return self._connect()
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation != self._generation:
+            # Repointed: forget the old connection rather than close it, a
+            # caller up the stack may still be using it; it closes once unused.
+            with self._lock:
+                self._connections.pop(threading.get_ident(), None)
+            conn = None
+        if conn is None:
+            self._local.generation = self._generation
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._prune()
+                self._connections[threading.get_ident()] = (threading.current_thread(), conn)
+                self._opened += 1
+        with self._lock:
+            self._checkouts += 1
+        return conn
+
+    def _prune(self) -> None:
+        """Close connections whose thread has exited (caller holds the lock)."""
+        for ident, (thread, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                conn.close()
+                del self._connections[ident]
+                self._closed_dead += 1
+
+    def repoint(self, db_path: str) -> None:
+        """Serve connections on `db_path` from now on."""
+        with self._lock:
+            self.db_path = db_path
+            self._generation += 1
+
+    def close_all(self) -> None:
+        with self._lock:
+            for _, conn in self._connections.values():
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "dbPath": self.db_path,
+                "readOnly": self.read_only,
+                "immutable": self.immutable,
+                "generation": self._generation,
+                "open": len(self._connections),
+                "opened": self._opened,
+                "closedDeadThreads": self._closed_dead,
+                "checkouts": self._checkouts,
+                "reuseRatio": round(1 - self._opened / self._checkouts, 4) if self._checkouts else None,
+                "statementCacheSize": STATEMENT_CACHE_SIZE,
+                "tuning": self.tuning,
+            }
+
+
+def enable_wal(db_path: str) -> str:
+    """Switch the database file to WAL so readers never block on the writer. Returns the mode."""
+    with closing(sqlite3.connect(db_path)) as conn:
+        return conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
@@ -0,0 +1,252 @@
+"""
+On-demand profiling of single requests.
+
+A request with `X-Profile: 1` (or `?profile=1`) from an address in
+PROFILE_ALLOW is run with a stack sampler attached, bypassing the response
+cache and request coalescing, and answered with the profile instead of its
+response:
+
+    durationMs, status    of the request that was profiled
+    samples, intervalMs   how many stacks were taken, how often
+    top                   functions by samples spent in them (self) and under them (total)
+    queries               every SQL statement executed, by fingerprint
+    folded                stacks in the folded format of flamegraph.pl / speedscope
+
+`X-Profile: folded` (or `?profile=folded`) returns just the folded stacks as
+text, e.g. `curl -H 'X-Profile: folded' ... | flamegraph.pl > profile.svg`.
+
+Samples come from the threads working for the request: the one running its
+endpoint function, and every thread that executed SQL for it (the request's
+context reaches the federation fan-out threads too). Other requests running
+the same endpoint at the same moment can add samples.
+
+    PROFILE_ALLOW=127.0.0.1/32,::1/128     networks allowed to ask for a profile
+    PROFILE_INTERVAL_MS=5                  sampling interval
+"""
+
+import contextvars
+import ipaddress
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qsl
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import metrics
+
+PROFILE_ALLOW = [
+    ipaddress.ip_network(network.strip(), strict=False)
+    for network in os.environ.get("PROFILE_ALLOW", "127.0.0.1/32,::1/128").split(",")
+    if network.strip()
+]
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000
+PROFILE_MAX_SAMPLES = 100_000
+TOP_FUNCTIONS = 25
+
+_session: contextvars.ContextVar[Optional["Session"]] = contextvars.ContextVar("profile_session", default=None)
+
+
+def requested(scope: Scope) -> Optional[str]:
+    """The profile format a request asks for ('json' or 'folded'), or None."""
+    headers = dict(scope.get("headers") or [])
+    value = headers.get(b"x-profile", b"").decode("latin-1")
+    if not value:
+        value = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"))).get("profile", "")
+    value = value.strip().lower()
+    if value in ("", "0", "false", "no"):
+        return None
+    return "folded" if value == "folded" else "json"
+
+
+def allowed(scope: Scope) -> bool:
+    client = scope.get("client")
+    if not client:
+        return False
+    try:
+        address = ipaddress.ip_address(client[0])
+    except ValueError:
+        return False
+    return any(address in network for network in PROFILE_ALLOW)
+
+
+def note_statement(sql: str, seconds: float) -> None:
+    """Called for every pooled-connection statement; cheap when nothing is being profiled."""
+    session = _session.get()
+    if session is not None:
+        session.note_statement(sql, seconds)
+
+
+def current_route() -> Optional[str]:
+    """Route template of the request being profiled on this thread, if any."""
+    session = _session.get()
+    return session.route if session is not None else None
+
+
+def _frame_name(code) -> str:
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+def _nested_codes(code) -> Set:
+    codes = {code}
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            codes |= _nested_codes(const)
+    return codes
+
+
+class Session:
+    """Sampler for one request."""
+
+    def __init__(self, scope: Scope, interval: float = PROFILE_INTERVAL):
+        self.scope = scope
+        self.interval = interval
+        self.threads: Set[int] = set()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.statements: Dict[str, List] = {}  # fingerprint -> [sql, calls, seconds, max]
+        self._endpoint_codes: Optional[Set] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    @property
+    def route(self) -> Optional[str]:
+        return getattr(self.scope.get("route"), "path", None)
+
+    def note_statement(self, sql: str, seconds: float) -> None:
+        query_id, normalized = metrics.fingerprint(sql)
+        with self._lock:
+            self.threads.add(threading.get_ident())
+            entry = self.statements.setdefault(query_id, [normalized, 0, 0.0, 0.0])
+            entry[1] += 1
+            entry[2] += seconds
+            entry[3] = max(entry[3], seconds)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _in_endpoint(self, frame) -> bool:
+        if self._endpoint_codes is None:
+            endpoint = self.scope.get("endpoint")
+            if endpoint is None or not hasattr(endpoint, "__code__"):
+                return False  # not routed yet
+            self._endpoint_codes = _nested_codes(endpoint.__code__)
+        while frame is not None:
+            if frame.f_code in self._endpoint_codes:
+                return True
+            frame = frame.f_back
+        return False
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval) and self.samples < PROFILE_MAX_SAMPLES:
+            with self._lock:
+                threads = set(self.threads)
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (ident not in threads and not self._in_endpoint(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def report(self, status: int, seconds: float) -> Dict:
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return {
+            "route": self.route,
+            "status": status,
+            "durationMs": round(seconds * 1000, 3),
+            "intervalMs": self.interval * 1000,
+            "samples": self.samples,
+            "top": [
+                {"function": name, "self": own[name], "total": count}
+                for name, count in sorted(total.items(), key=lambda item: (-own[item[0]], -item[1]))[:TOP_FUNCTIONS]
+            ],
+            "queries": sorted(
+                (
+                    {
+                        "fingerprint": query_id,
+                        "sql": sql,
+                        "calls": calls,
+                        "totalMs": round(spent * 1000, 3),
+                        "maxMs": round(longest * 1000, 3),
+                    }
+                    for query_id, (sql, calls, spent, longest) in self.statements.items()
+                ),
+                key=lambda query: -query["totalMs"],
+            ),
+            "folded": self.folded(),
+        }
+
+
+class ProfilingMiddleware:
+    """Answers profiled requests with their profile; everything else passes straight through."""
+
+    def __init__(self, app: ASGIApp, exclude: Iterable[str] = ()):
+        self.app = app
+        self.exclude = tuple(exclude)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        fmt = requested(scope) if scope["type"] == "http" else None
+        if fmt is None or any(part in scope["path"] for part in self.exclude):
+            await self.app(scope, receive, send)
+            return
+        if not allowed(scope):
+            await _respond(send, 403, b'{"detail":"Profiling is not allowed from this address"}', b"application/json")
+            return
+
+        session = Session(scope)
+        status = [0]
+
+        async def discard(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+
+        token = _session.set(session)
+        started = time.perf_counter()
+        session.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            session.stop()
+            _session.reset(token)
+        elapsed = time.perf_counter() - started
+        if fmt == "folded":
+            await _respond(send, 200, session.folded().encode(), b"text/plain; charset=utf-8")
+        else:
+            body = json.dumps(session.report(status[0], elapsed)).encode()
+            await _respond(send, 200, body, b"application/json")
+
+
+async def _respond(send: Send, status: int, body: bytes, content_type: bytes) -> None:
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", content_type),
+            (b"content-length", str(len(body)).encode()),
+            (b"cache-control", b"no-store"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,218 @@
+"""
+Read replicas: the server reads immutable copies of the live database.
+
+The preprocess job and the chatroom write the live file. In replica mode
+(CHAT_REPLICA_DIR set), dashboard reads go to a private copy instead, so long
+scans never hold a read snapshot on the live file and never wait for its
+writers. A copy is taken:
+
+    - every REPLICA_INTERVAL seconds while the live file has commits the copy lacks, or
+    - as soon as REPLICA_MAX_CHANGES changes (Change_Log rows) are missing from it.
+
+Each refresh brings the live file's documents, rollups and digests up to date
+(short incremental transactions, the only writes the server still makes
+there), copies it with the online backup API in a single step (one read
+transaction: a consistent snapshot that does not block WAL writers), finishes
+the same maintenance on the copy for commits that landed in between, and
+switches the copy out of WAL mode. The shard's read pool is then repointed at
+it: requests already running finish on the copy they started with, and each
+worker thread moves to the new one at its next checkout. The copy is opened
+immutable=1, so readers take no locks at all.
+
+Copies are <dir>/<database>.<pid>.<generation>.db. Older generations are
+removed once a newer one has been in use for a refresh.
+
+Freshness lag is how long the oldest commit missing from the copy has been
+waiting (0 when the copy is current); it is on /metrics as
+sqlite_replica_lag_seconds and on /debug/pool.
+"""
+
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, List, Optional
+
+import digests
+from cache import data_version
+from changes import latest_change
+from conversation_store import refresh_stale_documents
+from rollups import refresh_rollups
+
+REPLICA_DIR = os.environ.get("CHAT_REPLICA_DIR", "")
+REPLICA_INTERVAL = float(os.environ.get("REPLICA_INTERVAL", 30))
+REPLICA_MAX_CHANGES = int(os.environ.get("REPLICA_MAX_CHANGES", 1000))
+REPLICA_POLL = 1.0  # seconds between checks for new commits
+
+logger = logging.getLogger(__name__)
+
+
+def _maintain(conn: sqlite3.Connection) -> None:
+    """Bring every lazily maintained table up to date, as the request path would."""
+    for refresh in (refresh_stale_documents, refresh_rollups, digests.refresh_digests):
+        try:
+            refresh(conn)
+        except sqlite3.OperationalError as e:
+            # Not installed in this database (e.g. an archive without a change log).
+            logger.debug(f"Replica maintenance skipped {refresh.__name__}: {e}")
+
+
+def _latest_change(conn: sqlite3.Connection) -> Optional[int]:
+    try:
+        return latest_change(conn)
+    except sqlite3.OperationalError:
+        return None
+
+
+class Replica:
+    """Successive immutable copies of one live database."""
+
+    def __init__(self, live_path: str, directory: str):
+        self.live_path = live_path
+        self.directory = directory
+        self.stem = os.path.splitext(os.path.basename(live_path))[0]
+        self.generation = 0
+        self.path: Optional[str] = None
+        self.snapshot_at: Optional[float] = None  # wall time the current copy was taken
+        self.refresh_seconds: Optional[float] = None
+        self.refreshes = 0
+        self.failures = 0
+        self._pending_since: Optional[float] = None  # monotonic time a missing commit was first seen
+        self._seen_version: Optional[int] = None
+        self._copied_change: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._remove_orphans()
+
+    def _file(self, generation: int) -> str:
+        return os.path.join(self.directory, f"{self.stem}.{os.getpid()}.{generation}.db")
+
+    def _remove_orphans(self) -> None:
+        """Copies left by processes that are gone."""
+        for path in glob.glob(os.path.join(self.directory, f"{self.stem}.*.*.db*")):
+            try:
+                pid = int(os.path.basename(path)[len(self.stem) + 1:].split(".")[0])
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                os.remove(path)
+            except (ValueError, OSError):
+                continue
+
+    # ----------------------------
+    # Freshness
+    # ----------------------------
+    def observe(self) -> None:
+        """Note whether the live file has commits the copy lacks."""
+        version = data_version(self.live_path)
+        if version != self._seen_version:
+            self._seen_version = version
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+
+    def lag(self) -> float:
+        """Seconds the oldest commit missing from the copy has been waiting."""
+        self.observe()
+        pending = self._pending_since
+        return 0.0 if pending is None else time.monotonic() - pending
+
+    def changes_behind(self, live: sqlite3.Connection) -> Optional[int]:
+        latest = _latest_change(live)
+        if latest is None or self._copied_change is None:
+            return None
+        return latest - self._copied_change
+
+    def due(self, live: sqlite3.Connection) -> bool:
+        lag = self.lag()
+        if self._pending_since is None:
+            return False
+        if lag >= REPLICA_INTERVAL:
+            return True
+        behind = self.changes_behind(live)
+        return behind is not None and behind >= REPLICA_MAX_CHANGES
+
+    # ----------------------------
+    # Copying
+    # ----------------------------
+    def refresh(self, live: sqlite3.Connection) -> str:
+        """Take a new copy through the writable `live` connection. Returns its path."""
+        with self._lock:
+            started = time.perf_counter()
+            _maintain(live)
+            # Anything committed after this read makes the next copy due.
+            self._seen_version = data_version(self.live_path)
+            self._pending_since = None
+            snapshot_at = time.time()
+            generation = self.generation + 1
+            path = self._file(generation)
+            try:
+                with closing(sqlite3.connect(path)) as copy:
+                    live.backup(copy)
+                    _maintain(copy)
+                    copy.execute("PRAGMA journal_mode = DELETE")
+                    copied_change = _latest_change(copy)
+            except BaseException:
+                self._pending_since = self._pending_since or time.monotonic()
+                for leftover in glob.glob(path + "*"):
+                    os.remove(leftover)
+                raise
+            previous = self.generation
+            self.generation, self.path, self.snapshot_at = generation, path, snapshot_at
+            self._copied_change = copied_change
+            self.refresh_seconds = time.perf_counter() - started
+            self.refreshes += 1
+            # The previous copy may still serve requests that started on it.
+            for old in range(max(previous - 1, 0), 0, -1):
+                for leftover in glob.glob(self._file(old) + "*"):
+                    try:
+                        os.remove(leftover)
+                    except OSError:
+                        pass
+            return path
+
+    def remove_all(self) -> None:
+        for leftover in glob.glob(os.path.join(self.directory, f"{self.stem}.{os.getpid()}.*.db*")):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "generation": self.generation,
+            "lagSeconds": round(self.lag(), 3),
+            "snapshotAgeSeconds": round(time.time() - self.snapshot_at, 3) if self.snapshot_at else None,
+            "lastRefreshSeconds": round(self.refresh_seconds, 3) if self.refresh_seconds is not None else None,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+        }
+
+
+class ReplicaRefresher:
+    """Background thread taking new copies of every replicated shard when they are due."""
+
+    def __init__(self, shards: List):
+        self.shards = shards
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="replica-refresher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(REPLICA_POLL):
+            for shard in self.shards:
+                try:
+                    live = shard.write_pool.connection()
+                    if shard.replica.due(live):
+                        shard.refresh_replica()
+                except Exception:
+                    shard.replica.failures += 1
+                    logger.exception(f"Replica refresh of {shard.path} failed; serving the previous copy")
@@ -0,0 +1,22 @@
+"""
+Response classes that keep JSON encoding out of the Python hot path.
+
+`RawJSONResponse` sends JSON text SQLite already produced, untouched.
+`ORJSONResponse` encodes everything else with orjson instead of the stdlib.
+"""
+
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RawJSONResponse(Response):
+    """`content` is JSON text (str or bytes) and is sent as is."""
+
+    media_type = "application/json"
@@ -0,0 +1,572 @@
+"""
+Incrementally maintained rollups behind the dashboard aggregates.
+
+Counts are kept per (day, key) for conversation status, message sentiment and
+message emotion, per topic, per tenant (Rollup_Tenant, behind /tenants) and per
+agent (Rollup_Agent, behind /agents-performance). Triggers on the source tables only record which
+partitions (a day, or a topic) a write touched; `refresh_rollups` recomputes
+just those partitions before the next read, which keeps the counts right
+whatever the writer does. An `INSERT OR REPLACE` deletes the row it replaces
+without firing delete triggers, so BEFORE INSERT triggers mark the partitions
+of the row about to be replaced as well.
+
+Sentiment and emotion counts follow the JOIN semantics of the original
+queries: an analysis row only counts while its message exists. NULL keys are
+stored as '' so they can take part in the primary key. Days are UTC dates of
+the ISO-8601 timestamps the writers store.
+
+Backfill or repair with:
+
+    python rollups.py rebuild [--db database/test.db]
+"""
+
+import argparse
+import sqlite3
+from typing import List
+
+ROLLUP_TABLES = [
+    """CREATE TABLE IF NOT EXISTS Rollup_Conversation_Daily (
+        day    TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count  INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, status)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS Rollup_Sentiment_Daily (
+        day       TEXT NOT NULL,
+        sentiment TEXT NOT NULL,
+        count     INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, sentiment)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS Rollup_Emotion_Daily (
+        day     TEXT NOT NULL,
+        emotion TEXT NOT NULL,
+        count   INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, emotion)
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS Rollup_Topic (
+        topic TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""",
+    # Per tenant: conversations (all, and not yet solved) and the tenant's own
+    # messages. Sentiment is a sum of message scores and the number scored, and
+    # emotions a JSON object of counts, so databases merge exactly.
+    """CREATE TABLE IF NOT EXISTS Rollup_Tenant (
+        client_id       INTEGER PRIMARY KEY,
+        conversations   INTEGER NOT NULL DEFAULT 0,
+        open            INTEGER NOT NULL DEFAULT 0,
+        messages        INTEGER NOT NULL DEFAULT 0,
+        sentiment_sum   INTEGER NOT NULL DEFAULT 0,
+        sentiment_count INTEGER NOT NULL DEFAULT 0,
+        emotions        TEXT NOT NULL DEFAULT '{}',
+        last_contact    TEXT
+    )""",
+    # Per (conversation, agent who wrote in it): the conversation's outcome and
+    # the tenant messages' sentiment and emotions, plus this agent's reply
+    # latencies in seconds. first_response is set for the agent who answered
+    # the tenant first.
+    """CREATE TABLE IF NOT EXISTS Rollup_Agent_Conversation (
+        conversation_id INTEGER NOT NULL,
+        agent_id        INTEGER NOT NULL,
+        solved          INTEGER NOT NULL DEFAULT 0,
+        first_response  REAL,
+        response_sum    REAL NOT NULL DEFAULT 0,
+        responses       INTEGER NOT NULL DEFAULT 0,
+        sentiment_sum   INTEGER NOT NULL DEFAULT 0,
+        sentiment_count INTEGER NOT NULL DEFAULT 0,
+        sentiments      TEXT NOT NULL DEFAULT '{}',
+        emotions        TEXT NOT NULL DEFAULT '{}',
+        PRIMARY KEY (conversation_id, agent_id)
+    ) WITHOUT ROWID""",
+    """CREATE INDEX IF NOT EXISTS idx_rollup_agent_conversation_agent
+        ON Rollup_Agent_Conversation (agent_id)""",
+    # Rollup_Agent_Conversation summed per agent; sums and counts, so databases merge.
+    """CREATE TABLE IF NOT EXISTS Rollup_Agent (
+        agent_id           INTEGER PRIMARY KEY,
+        tickets            INTEGER NOT NULL DEFAULT 0,
+        solved             INTEGER NOT NULL DEFAULT 0,
+        first_response_sum REAL NOT NULL DEFAULT 0,
+        first_responses    INTEGER NOT NULL DEFAULT 0,
+        response_sum       REAL NOT NULL DEFAULT 0,
+        responses          INTEGER NOT NULL DEFAULT 0,
+        sentiment_sum      INTEGER NOT NULL DEFAULT 0,
+        sentiment_count    INTEGER NOT NULL DEFAULT 0,
+        sentiments         TEXT NOT NULL DEFAULT '{}',
+        emotions           TEXT NOT NULL DEFAULT '{}'
+    )""",
+    # Partitions touched since the last refresh: (rollup table, day, topic, tenant,
+    # conversation or agent id).
+    """CREATE TABLE IF NOT EXISTS Rollup_Dirty (
+        rollup TEXT NOT NULL,
+        key    TEXT NOT NULL,
+        PRIMARY KEY (rollup, key)
+    ) WITHOUT ROWID""",
+]
+
+# Day-partitioned rollups: (rollup table, key column, source table, source alias,
+# day expression, row source). CROSS JOIN pins the join order to message first,
+# so time ranges and undated scans go through the Message timestamp index.
+_DAILY_ROLLUPS = [
+    ("Rollup_Conversation_Daily", "status", "Conversation", "c", "c.started_at", "Conversation c"),
+    ("Rollup_Sentiment_Daily", "sentiment", "Sentiment_Analysis", "sa", "m.timestamp",
+     "Message m CROSS JOIN Sentiment_Analysis sa ON sa.message_id = m.message_id"),
+    ("Rollup_Emotion_Daily", "emotion", "Emotion_Analysis", "ea", "m.timestamp",
+     "Message m CROSS JOIN Emotion_Analysis ea ON ea.message_id = m.message_id"),
+]
+
+def _trigger(name: str, timing: str, body: str) -> str:
+    return f"CREATE TRIGGER IF NOT EXISTS trg_rollup_{name}\n    {timing}\n    BEGIN{body}\n    END"
+
+
+def _mark(rollup: str, key_sql: str) -> str:
+    return f"""
+        INSERT INTO Rollup_Dirty (rollup, key) VALUES ('{rollup}', COALESCE({key_sql}, ''))
+        ON CONFLICT(rollup, key) DO NOTHING;"""
+
+
+def _mark_message_day(rollup: str, ref: str) -> str:
+    return f"""
+        INSERT INTO Rollup_Dirty (rollup, key)
+        SELECT '{rollup}', COALESCE(date(m.timestamp), '') FROM Message m
+        WHERE m.message_id = {ref}.message_id
+        ON CONFLICT(rollup, key) DO NOTHING;"""
+
+
+def _mark_message_tenant(ref: str) -> str:
+    return _mark("Rollup_Tenant", f"(SELECT client_id FROM Message WHERE message_id = {ref}.message_id)")
+
+
+def _tenant_triggers() -> List[str]:
+    tenant = "Rollup_Tenant"
+    triggers = []
+    for source, columns in (("Conversation", "client_id, status"), ("Message", "client_id, timestamp")):
+        name = f"tenant_{source.lower()}"
+        triggers += [
+            _trigger(f"{name}_insert", f"AFTER INSERT ON {source}", _mark(tenant, "NEW.client_id")),
+            _trigger(f"{name}_update", f"AFTER UPDATE OF {columns} ON {source}",
+                     _mark(tenant, "OLD.client_id") + _mark(tenant, "NEW.client_id")),
+            _trigger(f"{name}_delete", f"AFTER DELETE ON {source}", _mark(tenant, "OLD.client_id")),
+        ]
+    for source, key in (("Sentiment_Analysis", "sentiment"), ("Emotion_Analysis", "emotion")):
+        name = f"tenant_{source.lower()}"
+        triggers += [
+            _trigger(f"{name}_insert", f"AFTER INSERT ON {source}", _mark_message_tenant("NEW")),
+            _trigger(f"{name}_update", f"AFTER UPDATE OF {key}, message_id ON {source}",
+                     _mark_message_tenant("OLD") + _mark_message_tenant("NEW")),
+            _trigger(f"{name}_delete", f"AFTER DELETE ON {source}", _mark_message_tenant("OLD")),
+        ]
+    return triggers
+
+
+def _agent_triggers() -> List[str]:
+    # Partitioned by conversation; the agents whose rows change are marked during refresh.
+    rollup = "Rollup_Agent_Conversation"
+    of_message = "(SELECT conversation_id FROM Message WHERE message_id = {ref}.message_id)"
+    triggers = [
+        _trigger("agent_conversation_update", "AFTER UPDATE OF status ON Conversation",
+                 _mark(rollup, "NEW.conversation_id")),
+        _trigger("agent_conversation_delete", "AFTER DELETE ON Conversation",
+                 _mark(rollup, "OLD.conversation_id")),
+        _trigger("agent_message_insert", "AFTER INSERT ON Message", _mark(rollup, "NEW.conversation_id")),
+        _trigger("agent_message_update",
+                 "AFTER UPDATE OF conversation_id, agent_id, client_id, timestamp ON Message",
+                 _mark(rollup, "OLD.conversation_id") + _mark(rollup, "NEW.conversation_id")),
+        _trigger("agent_message_delete", "AFTER DELETE ON Message", _mark(rollup, "OLD.conversation_id")),
+    ]
+    for source, key in (("Sentiment_Analysis", "sentiment"), ("Emotion_Analysis", "emotion")):
+        name = f"agent_{source.lower()}"
+        triggers += [
+            _trigger(f"{name}_insert", f"AFTER INSERT ON {source}", _mark(rollup, of_message.format(ref="NEW"))),
+            _trigger(f"{name}_update", f"AFTER UPDATE OF {key}, message_id ON {source}",
+                     _mark(rollup, of_message.format(ref="OLD")) + _mark(rollup, of_message.format(ref="NEW"))),
+            _trigger(f"{name}_delete", f"AFTER DELETE ON {source}", _mark(rollup, of_message.format(ref="OLD"))),
+        ]
+    return triggers
+
+
+def _mark_existing(rollup: str, key_sql: str, rows: str) -> str:
+    return f"""
+        INSERT INTO Rollup_Dirty (rollup, key)
+        SELECT '{rollup}', COALESCE({key_sql}, '') FROM {rows}
+        ON CONFLICT(rollup, key) DO NOTHING;"""
+
+
+def _replace_triggers() -> List[str]:
+    # The row an INSERT OR REPLACE is about to delete, found by the key it
+    # conflicts on; the inserted row is marked by the AFTER INSERT triggers.
+    # Emotion and topic rows can only be replaced by one with the same key.
+    conversation = "Conversation WHERE conversation_id = NEW.conversation_id"
+    message = "Message WHERE message_id = NEW.message_id"
+    analysed = "Message WHERE message_id = (SELECT message_id FROM Sentiment_Analysis WHERE sentiment_id = NEW.sentiment_id)"
+    return [
+        _trigger("conversation_replace", "BEFORE INSERT ON Conversation",
+                 _mark_existing("Rollup_Conversation_Daily", "date(started_at)", conversation)
+                 + _mark_existing("Rollup_Tenant", "client_id", conversation)
+                 + _mark_existing("Rollup_Agent_Conversation", "conversation_id", conversation)),
+        _trigger("message_replace", "BEFORE INSERT ON Message",
+                 _mark_existing("Rollup_Sentiment_Daily", "date(timestamp)", message)
+                 + _mark_existing("Rollup_Emotion_Daily", "date(timestamp)", message)
+                 + _mark_existing("Rollup_Tenant", "client_id", message)
+                 + _mark_existing("Rollup_Agent_Conversation", "conversation_id", message)),
+        _trigger("sentiment_analysis_replace", "BEFORE INSERT ON Sentiment_Analysis",
+                 _mark_existing("Rollup_Sentiment_Daily", "date(timestamp)", analysed)
+                 + _mark_existing("Rollup_Tenant", "client_id", analysed)
+                 + _mark_existing("Rollup_Agent_Conversation", "conversation_id", analysed)),
+    ]
+
+
+def rollup_triggers() -> List[str]:
+    conv = "Rollup_Conversation_Daily"
+    triggers = [
+        _trigger("conversation_insert", "AFTER INSERT ON Conversation",
+                 _mark(conv, "date(NEW.started_at)")),
+        _trigger("conversation_update", "AFTER UPDATE OF status, started_at ON Conversation",
+                 _mark(conv, "date(OLD.started_at)") + _mark(conv, "date(NEW.started_at)")),
+        _trigger("conversation_delete", "AFTER DELETE ON Conversation",
+                 _mark(conv, "date(OLD.started_at)")),
+        _trigger("topic_analysis_insert", "AFTER INSERT ON Topic_Analysis",
+                 _mark("Rollup_Topic", "NEW.topic")),
+        _trigger("topic_analysis_update", "AFTER UPDATE OF topic ON Topic_Analysis",
+                 _mark("Rollup_Topic", "OLD.topic") + _mark("Rollup_Topic", "NEW.topic")),
+        _trigger("topic_analysis_delete", "AFTER DELETE ON Topic_Analysis",
+                 _mark("Rollup_Topic", "OLD.topic")),
+    ]
+    message_rollups = [r for r in _DAILY_ROLLUPS if r[2] != "Conversation"]
+    for rollup, key, source, _, _, _ in message_rollups:
+        name = source.lower()
+        triggers += [
+            _trigger(f"{name}_insert", f"AFTER INSERT ON {source}", _mark_message_day(rollup, "NEW")),
+            _trigger(f"{name}_update", f"AFTER UPDATE OF {key}, message_id ON {source}",
+                     _mark_message_day(rollup, "OLD") + _mark_message_day(rollup, "NEW")),
+            _trigger(f"{name}_delete", f"AFTER DELETE ON {source}", _mark_message_day(rollup, "OLD")),
+        ]
+    # A message moving or disappearing moves every analysis row attached to it.
+    on_message = {
+        "insert": ("AFTER INSERT ON Message", ["NEW"]),
+        "update": ("AFTER UPDATE OF timestamp, message_id ON Message", ["OLD", "NEW"]),
+        "delete": ("AFTER DELETE ON Message", ["OLD"]),
+    }
+    for event, (timing, refs) in on_message.items():
+        body = "".join(
+            _mark(rollup, f"date({ref}.timestamp)")
+            for ref in refs
+            for rollup, _, _, _, _, _ in message_rollups
+        )
+        triggers.append(_trigger(f"message_{event}", timing, body))
+    return triggers + _replace_triggers() + _tenant_triggers() + _agent_triggers()
+
+
+def _recompute_days(rollup: str, key: str, source: str, alias: str, day: str, rows: str) -> List[str]:
+    dirty = f"SELECT key FROM Rollup_Dirty WHERE rollup = '{rollup}'"
+    return [
+        f"DELETE FROM {rollup} WHERE day IN ({dirty})",
+        # Range on the raw timestamp so its index is used; date() keeps exact semantics.
+        f"""INSERT INTO {rollup} (day, {key}, count)
+            SELECT d.key, COALESCE({alias}.{key}, ''), COUNT(*)
+            FROM Rollup_Dirty d
+            CROSS JOIN {rows}
+            WHERE d.rollup = '{rollup}' AND d.key != ''
+              AND {day} >= d.key AND {day} < date(d.key, '+1 day')
+              AND date({day}) = d.key
+            GROUP BY 1, 2""",
+        # Rows without a usable date. Rare, and only recomputed when that bucket is dirty.
+        f"""INSERT INTO {rollup} (day, {key}, count)
+            SELECT '', COALESCE({alias}.{key}, ''), COUNT(*)
+            FROM {rows}
+            WHERE EXISTS (SELECT 1 FROM Rollup_Dirty WHERE rollup = '{rollup}' AND key = '')
+              AND date({day}) IS NULL
+            GROUP BY 1, 2""",
+    ]
+
+
+# A message's score, as in its `sentiment` in the conversation documents.
+_SENTIMENT_SCORE = "CASE sa.sentiment WHEN 'positive' THEN 1 WHEN 'negative' THEN -2 ELSE 0 END"
+
+
+def _tenant_rows(tenants: str) -> str:
+    """Recompute Rollup_Tenant for the tenant ids `tenants` (a SELECT of client_id) yields."""
+    return f"""INSERT INTO Rollup_Tenant
+            (client_id, conversations, open, messages, sentiment_sum, sentiment_count, emotions, last_contact)
+        SELECT
+            t.client_id,
+            (SELECT COUNT(*) FROM Conversation WHERE client_id = t.client_id),
+            (SELECT COUNT(*) FROM Conversation WHERE client_id = t.client_id AND COALESCE(status, '') != 'solved'),
+            (SELECT COUNT(*) FROM Message WHERE client_id = t.client_id),
+            (SELECT COALESCE(SUM({_SENTIMENT_SCORE}), 0)
+             FROM Message m CROSS JOIN Sentiment_Analysis sa ON sa.message_id = m.message_id
+             WHERE m.client_id = t.client_id),
+            (SELECT COUNT(*)
+             FROM Message m CROSS JOIN Sentiment_Analysis sa ON sa.message_id = m.message_id
+             WHERE m.client_id = t.client_id),
+            (SELECT json_group_object(emotion, n) FROM (
+                SELECT ea.emotion, COUNT(*) AS n
+                FROM Message m
+                CROSS JOIN Emotion_Analysis ea ON ea.message_id = m.message_id
+                WHERE m.client_id = t.client_id AND ea.emotion IS NOT NULL
+                GROUP BY ea.emotion
+            )),
+            (SELECT MAX(timestamp) FROM Message WHERE client_id = t.client_id)
+        FROM ({tenants}) t
+        WHERE t.client_id IS NOT NULL"""
+
+
+_DIRTY_TENANTS = "SELECT CAST(key AS INTEGER) AS client_id FROM Rollup_Dirty WHERE rollup = 'Rollup_Tenant' AND key != ''"
+
+_ALL_TENANTS = "SELECT client_id FROM Conversation UNION SELECT client_id FROM Message"
+# Dirty tenants with anything left to count; as in a rebuild, the others get no row.
+_ACTIVE_DIRTY_TENANTS = f"""SELECT client_id FROM ({_DIRTY_TENANTS}) d
+    WHERE EXISTS (SELECT 1 FROM Conversation WHERE client_id = d.client_id)
+       OR EXISTS (SELECT 1 FROM Message WHERE client_id = d.client_id)"""
+
+def _agent_conversation_rows(conversations: str) -> str:
+    """
+    Recompute Rollup_Agent_Conversation for the conversation ids `conversations`
+    (a SELECT) yields. Over each thread in time order: an agent message right
+    after a tenant message is a reply, timed from that message (LAG); the
+    first agent message after the tenant's first message (running MIN) is the
+    first response.
+    """
+    return f"""INSERT INTO Rollup_Agent_Conversation
+            (conversation_id, agent_id, solved, first_response, response_sum, responses,
+             sentiment_sum, sentiment_count, sentiments, emotions)
+        WITH thread AS (
+            SELECT
+                m.conversation_id,
+                m.message_id,
+                m.agent_id,
+                m.timestamp,
+                LAG(m.client_id) OVER w AS previous_client_id,
+                LAG(m.timestamp) OVER w AS previous_at,
+                MIN(CASE WHEN m.client_id IS NOT NULL THEN m.timestamp END)
+                    OVER (w ROWS UNBOUNDED PRECEDING) AS tenant_first_at
+            FROM Message m
+            WHERE m.conversation_id IN ({conversations}) AND julianday(m.timestamp) IS NOT NULL
+            WINDOW w AS (PARTITION BY m.conversation_id ORDER BY m.timestamp, m.message_id)
+        ),
+        replies AS (
+            SELECT
+                conversation_id,
+                agent_id,
+                CASE WHEN previous_client_id IS NOT NULL
+                    THEN (julianday(timestamp) - julianday(previous_at)) * 86400 END AS latency,
+                CASE WHEN ROW_NUMBER() OVER (PARTITION BY conversation_id ORDER BY timestamp, message_id) = 1
+                    THEN (julianday(timestamp) - julianday(tenant_first_at)) * 86400 END AS first_latency
+            FROM thread
+            WHERE agent_id IS NOT NULL AND tenant_first_at IS NOT NULL
+        ),
+        latency AS (
+            SELECT conversation_id, agent_id, MAX(first_latency) AS first_response,
+                   COALESCE(SUM(latency), 0) AS response_sum, COUNT(latency) AS responses
+            FROM replies
+            GROUP BY conversation_id, agent_id
+        ),
+        tenant_sentiment AS (
+            SELECT conversation_id, SUM(score) AS total, SUM(n) AS scored, json_group_object(sentiment, n) AS labels
+            FROM (
+                SELECT m.conversation_id, sa.sentiment, COUNT(*) AS n, SUM({_SENTIMENT_SCORE}) AS score
+                FROM Message m
+                CROSS JOIN Sentiment_Analysis sa ON sa.message_id = m.message_id
+                WHERE m.conversation_id IN ({conversations}) AND m.client_id IS NOT NULL AND sa.sentiment IS NOT NULL
+                GROUP BY m.conversation_id, sa.sentiment
+            )
+            GROUP BY conversation_id
+        ),
+        tenant_emotion AS (
+            SELECT conversation_id, json_group_object(emotion, n) AS labels
+            FROM (
+                SELECT m.conversation_id, ea.emotion, COUNT(*) AS n
+                FROM Message m
+                CROSS JOIN Emotion_Analysis ea ON ea.message_id = m.message_id
+                WHERE m.conversation_id IN ({conversations}) AND m.client_id IS NOT NULL AND ea.emotion IS NOT NULL
+                GROUP BY m.conversation_id, ea.emotion
+            )
+            GROUP BY conversation_id
+        )
+        SELECT
+            p.conversation_id,
+            p.agent_id,
+            COALESCE(c.status = 'solved', 0),
+            l.first_response,
+            COALESCE(l.response_sum, 0),
+            COALESCE(l.responses, 0),
+            COALESCE(ts.total, 0),
+            COALESCE(ts.scored, 0),
+            COALESCE(ts.labels, '{{}}'),
+            COALESCE(te.labels, '{{}}')
+        FROM (
+            SELECT DISTINCT conversation_id, agent_id
+            FROM Message
+            WHERE conversation_id IN ({conversations}) AND agent_id IS NOT NULL
+        ) p
+        LEFT JOIN Conversation c ON c.conversation_id = p.conversation_id
+        LEFT JOIN latency l ON l.conversation_id = p.conversation_id AND l.agent_id = p.agent_id
+        LEFT JOIN tenant_sentiment ts ON ts.conversation_id = p.conversation_id
+        LEFT JOIN tenant_emotion te ON te.conversation_id = p.conversation_id"""
+
+
+def _json_counts(column: str) -> str:
+    """SQL adding up a JSON object-of-counts column over an agent's Rollup_Agent_Conversation rows."""
+    return f"""(SELECT json_group_object(key, n) FROM (
+                SELECT je.key, SUM(je.value) AS n
+                FROM Rollup_Agent_Conversation r2, json_each(r2.{column}) je
+                WHERE r2.agent_id = r.agent_id
+                GROUP BY je.key
+            ))"""
+
+
+def _agent_rows(agents: str) -> str:
+    """Recompute Rollup_Agent for the agent ids `agents` (a SELECT) yields."""
+    return f"""INSERT INTO Rollup_Agent
+            (agent_id, tickets, solved, first_response_sum, first_responses, response_sum, responses,
+             sentiment_sum, sentiment_count, sentiments, emotions)
+        SELECT
+            r.agent_id,
+            COUNT(*),
+            SUM(r.solved),
+            COALESCE(SUM(r.first_response), 0),
+            COUNT(r.first_response),
+            SUM(r.response_sum),
+            SUM(r.responses),
+            SUM(r.sentiment_sum),
+            SUM(r.sentiment_count),
+            {_json_counts("sentiments")},
+            {_json_counts("emotions")}
+        FROM Rollup_Agent_Conversation r
+        WHERE r.agent_id IN ({agents})
+        GROUP BY r.agent_id"""
+
+
+_DIRTY_CONVERSATIONS = (
+    "SELECT CAST(key AS INTEGER) FROM Rollup_Dirty WHERE rollup = 'Rollup_Agent_Conversation' AND key != ''"
+)
+_DIRTY_AGENTS = "SELECT CAST(key AS INTEGER) FROM Rollup_Dirty WHERE rollup = 'Rollup_Agent'"
+
+# Agents are marked dirty from the rows about to go and the rows that replace them.
+_MARK_AGENTS = f"""INSERT OR IGNORE INTO Rollup_Dirty (rollup, key)
+    SELECT 'Rollup_Agent', agent_id FROM Rollup_Agent_Conversation WHERE conversation_id IN ({_DIRTY_CONVERSATIONS})"""
+
+AGENT_REFRESH = [
+    _MARK_AGENTS,
+    f"DELETE FROM Rollup_Agent_Conversation WHERE conversation_id IN ({_DIRTY_CONVERSATIONS})",
+    _agent_conversation_rows(_DIRTY_CONVERSATIONS),
+    _MARK_AGENTS,
+    f"DELETE FROM Rollup_Agent WHERE agent_id IN ({_DIRTY_AGENTS})",
+    _agent_rows(_DIRTY_AGENTS),
+]
+
+AGENT_REBUILD = [
+    "DELETE FROM Rollup_Agent_Conversation",
+    _agent_conversation_rows("SELECT conversation_id FROM Conversation"),
+    "DELETE FROM Rollup_Agent",
+    _agent_rows("SELECT agent_id FROM Rollup_Agent_Conversation"),
+]
+
+REFRESH = [
+    statement
+    for daily in _DAILY_ROLLUPS
+    for statement in _recompute_days(*daily)
+] + [
+    "DELETE FROM Rollup_Topic WHERE topic IN (SELECT key FROM Rollup_Dirty WHERE rollup = 'Rollup_Topic')",
+    # Driven from the dirty keys so each topic is an index lookup; NULL topics are stored as ''.
+    """INSERT INTO Rollup_Topic (topic, count)
+       SELECT d.key, COUNT(*)
+       FROM Rollup_Dirty d
+       JOIN Topic_Analysis ta ON ta.topic = d.key
+       WHERE d.rollup = 'Rollup_Topic' AND d.key != ''
+       GROUP BY d.key""",
+    """INSERT INTO Rollup_Topic (topic, count)
+       SELECT '', COUNT(*)
+       FROM Topic_Analysis
+       WHERE topic IS NULL
+         AND EXISTS (SELECT 1 FROM Rollup_Dirty WHERE rollup = 'Rollup_Topic' AND key = '')
+       HAVING COUNT(*) > 0""",
+    f"DELETE FROM Rollup_Tenant WHERE client_id IN ({_DIRTY_TENANTS})",
+    _tenant_rows(_ACTIVE_DIRTY_TENANTS),
+] + AGENT_REFRESH + [
+    "DELETE FROM Rollup_Dirty",
+]
+
+TENANT_REBUILD = ["DELETE FROM Rollup_Tenant", _tenant_rows(_ALL_TENANTS)]
+
+REBUILD = ["DELETE FROM Rollup_Dirty"] + [
+    statement
+    for rollup, key, _, alias, day, rows in _DAILY_ROLLUPS
+    for statement in (
+        f"DELETE FROM {rollup}",
+        f"""INSERT INTO {rollup} (day, {key}, count)
+            SELECT COALESCE(date({day}), ''), COALESCE({alias}.{key}, ''), COUNT(*)
+            FROM {rows}
+            GROUP BY 1, 2""",
+    )
+] + [
+    "DELETE FROM Rollup_Topic",
+    """INSERT INTO Rollup_Topic (topic, count)
+       SELECT COALESCE(topic, ''), COUNT(*)
+       FROM Topic_Analysis
+       GROUP BY 1""",
+] + TENANT_REBUILD + AGENT_REBUILD
+
+# Rollups added after the first release, backfilled when an existing install gains them.
+LATER_ROLLUPS = {"Rollup_Tenant": TENANT_REBUILD, "Rollup_Agent": AGENT_REBUILD}
+
+
+def install_rollups(conn: sqlite3.Connection) -> None:
+    """
+    Create the rollup tables and triggers. On first install the counters are
+    backfilled in the same transaction, so no write slips between the two;
+    rollups added later are backfilled the first time they are installed.
+    """
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for statement in ROLLUP_TABLES + rollup_triggers():
+            conn.execute(statement)
+        if "Rollup_Dirty" not in existing:
+            for statement in REBUILD:
+                conn.execute(statement)
+            return
+        for table, statements in LATER_ROLLUPS.items():
+            if table not in existing:
+                for statement in statements:
+                    conn.execute(statement)
+
+
+def rollups_dirty(conn: sqlite3.Connection) -> bool:
+    """Whether any partition was touched since the last refresh (a read; works on read-only connections)."""
+    return conn.execute("SELECT 1 FROM Rollup_Dirty LIMIT 1").fetchone() is not None
+
+
+def refresh_rollups(conn: sqlite3.Connection) -> bool:
+    """Recompute the partitions touched since the last refresh. Returns False if none were."""
+    if not rollups_dirty(conn):
+        return False
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for statement in REFRESH:
+            conn.execute(statement)
+    return True
+
+
+def rebuild_rollups(conn: sqlite3.Connection) -> None:
+    """Recompute every counter from the source tables (backfills, repairs)."""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for statement in ROLLUP_TABLES + rollup_triggers():
+            conn.execute(statement)
+        for statement in REBUILD:
+            conn.execute(statement)
+
+
+if __name__ == "__main__":
+    from main import DB_FILE
+
+    parser = argparse.ArgumentParser(description="Maintain the dashboard rollup tables.")
+    parser.add_argument("command", choices=["install", "rebuild"])
+    parser.add_argument("--db", default=DB_FILE, help="SQLite database file")
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.db) as conn:
+        if args.command == "install":
+            install_rollups(conn)
+        else:
+            rebuild_rollups(conn)
+    print(f"Rollups {'installed' if args.command == 'install' else 'rebuilt'} in {args.db}")
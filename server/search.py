@@ -0,0 +1,267 @@
+"""
+Full-text search over message content.
+
+`Message_Search` is an FTS5 index of Message.content. Triggers keep it in step
+with every writer, so the preprocess job and the chatroom need no changes; an
+INSERT OR REPLACE fires no delete trigger, so the insert trigger drops any old
+entry for the message first.
+
+Tenants write "rojak", Malay and English mixed in one message, in informal
+spelling. The tokenizer folds case and diacritics, splits on hyphens (so
+reduplicated "kawan-kawan" finds "kawan") and stems English words ("leaking"
+finds "leak"); Malay words pass the stemmer unchanged. On the query side every
+word is matched as a prefix, which covers attached particles and suffixes
+("bocorlah", "rosaknya") and clipped spellings ("aircon" finds "aircond"), and
+a few common short forms are expanded to their variants.
+"""
+
+import html
+import json
+import re
+import sqlite3
+from typing import Dict, List, Optional, Sequence
+
+from conversation_store import iso_utc
+
+TOKENIZER = "porter unicode61 remove_diacritics 2"
+
+SEARCH_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS Message_Search USING fts5(
+        content,
+        tokenize = '{TOKENIZER}'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS trg_message_search_insert
+        AFTER INSERT ON Message
+        BEGIN
+            DELETE FROM Message_Search WHERE rowid = NEW.message_id;
+            INSERT INTO Message_Search (rowid, content) VALUES (NEW.message_id, NEW.content);
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_message_search_update
+        AFTER UPDATE OF message_id, content ON Message
+        BEGIN
+            DELETE FROM Message_Search WHERE rowid = OLD.message_id;
+            INSERT INTO Message_Search (rowid, content) VALUES (NEW.message_id, NEW.content);
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_message_search_delete
+        AFTER DELETE ON Message
+        BEGIN
+            DELETE FROM Message_Search WHERE rowid = OLD.message_id;
+        END""",
+]
+_TRIGGERS = ("trg_message_search_insert", "trg_message_search_update", "trg_message_search_delete")
+
+# Spellings tenants use interchangeably. A query word in a group also matches
+# the others.
+VARIANTS = [
+    {"aircond", "aircon", "air cond", "air con"},
+    {"tak", "tidak", "x", "tk"},
+    {"sudah", "dah", "udah"},
+    {"tolong", "tlg"},
+    {"boleh", "blh"},
+    {"dengan", "dgn"},
+    {"sebab", "sbb", "coz", "because"},
+    {"please", "pls", "plz"},
+    {"wifi", "wi-fi", "internet"},
+]
+_VARIANTS = {word: group for group in VARIANTS for word in group}
+
+_QUERY_PART = re.compile(r'"([^"]*)"|([^\s"]+)')
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Markers snippet() wraps matches in; the text is HTML-escaped before they
+# become <mark> tags, so message content cannot inject markup.
+_OPEN, _CLOSE = "\x02", "\x03"
+
+
+# ----------------------------
+# Schema
+# ----------------------------
+def install_search(conn: sqlite3.Connection) -> None:
+    """
+    Create the index and its triggers. The index is (re)built from Message in
+    the same transaction when it is new or was made with another tokenizer.
+    """
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        existing = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'Message_Search'"
+        ).fetchone()
+        if existing is not None and TOKENIZER not in existing[0]:
+            for trigger in _TRIGGERS:
+                conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            conn.execute("DROP TABLE Message_Search")
+            existing = None
+        for statement in SEARCH_SCHEMA:
+            conn.execute(statement)
+        if existing is None:
+            conn.execute("INSERT INTO Message_Search (rowid, content) SELECT message_id, content FROM Message")
+
+
+def rebuild_search(conn: sqlite3.Connection) -> None:
+    """Re-index every message (repairs, or writes made while the triggers were missing)."""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM Message_Search")
+        conn.execute("INSERT INTO Message_Search (rowid, content) SELECT message_id, content FROM Message")
+
+
+# ----------------------------
+# Queries
+# ----------------------------
+def _phrase(text: str, prefix: bool) -> str:
+    words = _WORD.findall(text)
+    if not words:
+        return ""
+    quoted = '"' + " ".join(words) + '"'
+    # Prefix-match on a last word of 3+ characters; shorter ones would match too much.
+    return quoted + "*" if prefix and len(words[-1]) >= 3 else quoted
+
+
+def build_match(query: str) -> str:
+    """
+    An FTS5 MATCH expression for what a user typed. Every word must appear
+    (as a prefix, or any of its spelling variants); "quoted text" must appear
+    as a phrase. Raises ValueError when nothing searchable is left.
+    """
+    terms: List[str] = []
+    for phrase, word in _QUERY_PART.findall(query):
+        if phrase:
+            term = _phrase(phrase, prefix=False)
+            if term:
+                terms.append(term)
+            continue
+        group = _VARIANTS.get(word.lower().strip(".,!?;:"))
+        for part in [word] if group else _WORD.findall(word):
+            alts = sorted(group or _VARIANTS.get(part.lower(), {part}))
+            alternatives = [t for t in (_phrase(variant, prefix=True) for variant in alts) if t]
+            if alternatives:
+                terms.append(alternatives[0] if len(alternatives) == 1 else f"({' OR '.join(alternatives)})")
+    if not terms:
+        raise ValueError("empty search")
+    return " AND ".join(terms)
+
+
+def _highlight(snippet: Optional[str]) -> Optional[str]:
+    if snippet is None:
+        return None
+    return html.escape(snippet, quote=False).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+def search_messages(
+    conn: sqlite3.Connection,
+    match: str,
+    limit: int,
+    offset: int = 0,
+    tenant_id: Optional[str] = None,
+    sender: Optional[str] = None,
+) -> List[Dict]:
+    """Best-ranked matching messages, with a highlighted snippet and a score (higher is better)."""
+    clauses = ["Message_Search MATCH ?"]
+    params: List = [match]
+    if tenant_id:
+        clauses.append("m.client_id = ?")
+        params.append(tenant_id)
+    if sender == "tenant":
+        clauses.append("m.client_id IS NOT NULL")
+    elif sender == "agent":
+        clauses.append("m.agent_id IS NOT NULL AND m.client_id IS NULL")
+    rows = conn.execute(f"""
+        SELECT
+            s.rowid AS message_id,
+            -bm25(Message_Search) AS score,
+            snippet(Message_Search, 0, char(2), char(3), '…', 24) AS snippet,
+            m.conversation_id,
+            COALESCE(m.client_id, m.agent_id) AS sender_id,
+            CASE
+                WHEN m.client_id IS NOT NULL THEN 'tenant'
+                WHEN m.agent_id IS NOT NULL THEN 'agent'
+                ELSE 'system'
+            END AS sender_type,
+            m.timestamp,
+            {iso_utc('m.timestamp')} AS ts
+        FROM Message_Search s
+        JOIN Message m ON m.message_id = s.rowid
+        WHERE {' AND '.join(clauses)}
+        ORDER BY rank, s.rowid
+        LIMIT ? OFFSET ?
+    """, params + [limit, offset]).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _context_message(row: sqlite3.Row) -> Dict:
+    return {
+        "id": row["message_id"],
+        "senderId": row["sender_id"],
+        "senderType": row["sender_type"],
+        "content": row["content"],
+        "timestamp": row["ts"],
+    }
+
+
+_CONTEXT_SELECT = f"""
+    SELECT
+        message_id,
+        COALESCE(client_id, agent_id) AS sender_id,
+        CASE
+            WHEN client_id IS NOT NULL THEN 'tenant'
+            WHEN agent_id IS NOT NULL THEN 'agent'
+            ELSE 'system'
+        END AS sender_type,
+        content,
+        {iso_utc('timestamp')} AS ts
+    FROM Message
+"""
+
+
+def with_context(conn: sqlite3.Connection, hit: Dict, context: int) -> Dict:
+    """The API shape of a hit: its conversation and up to `context` messages either side."""
+    conversation_id = hit["conversation_id"]
+    conversation = conn.execute("""
+        SELECT
+            c.client_id,
+            CASE c.status WHEN 'in_progress' THEN 'In Progress' ELSE c.status END AS status,
+            (SELECT summary_text FROM Conversation_Summary WHERE conversation_id = c.conversation_id) AS summary,
+            (SELECT json_group_array(topic) FROM Topic_Analysis WHERE conversation_id = c.conversation_id) AS topics
+        FROM Conversation c
+        WHERE c.conversation_id = ?
+    """, (conversation_id,)).fetchone()
+    before: List[Dict] = []
+    after: List[Dict] = []
+    if context:
+        key = (conversation_id, hit["timestamp"] or "", hit["message_id"])
+        before = [_context_message(row) for row in reversed(conn.execute(f"""
+            {_CONTEXT_SELECT}
+            WHERE conversation_id = ? AND (COALESCE(timestamp, ''), message_id) < (?, ?)
+            ORDER BY COALESCE(timestamp, '') DESC, message_id DESC
+            LIMIT ?
+        """, key + (context,)).fetchall())]
+        after = [_context_message(row) for row in conn.execute(f"""
+            {_CONTEXT_SELECT}
+            WHERE conversation_id = ? AND (COALESCE(timestamp, ''), message_id) > (?, ?)
+            ORDER BY COALESCE(timestamp, ''), message_id
+            LIMIT ?
+        """, key + (context,)).fetchall()]
+    return {
+        "messageId": hit["message_id"],
+        "conversationId": f"CONV-{conversation_id}" if conversation_id is not None else None,
+        "score": round(hit["score"], 4),
+        "snippet": _highlight(hit["snippet"]),
+        "senderId": hit["sender_id"],
+        "senderType": hit["sender_type"],
+        "timestamp": hit["ts"],
+        "conversation": None if conversation is None else {
+            "tenantId": conversation["client_id"],
+            "status": conversation["status"],
+            "summary": conversation["summary"],
+            "topics": [t for t in json.loads(conversation["topics"]) if t is not None],
+        },
+        "context": {"before": before, "after": after},
+    }
+
+
+# ----------------------------
+# Merging
+# ----------------------------
+def merge_hits(results: Sequence[List[Dict]]) -> List[Dict]:
+    """Hits from several databases in one ranking. bm25 scores are per index, so this is approximate."""
+    return sorted((hit for hits in results for hit in hits), key=lambda hit: (-hit["score"], hit["message_id"]))
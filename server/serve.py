@@ -0,0 +1,121 @@
+"""
+Production launcher: one supervisor process and N worker processes sharing a socket.
+
+    python serve.py                             # WEB_CONCURRENCY workers (default 1) on HOST:PORT
+    python serve.py --workers 4 --port 4000
+    kill -HUP <supervisor pid>                  # graceful reload, e.g. after a deploy
+    kill -TTIN / -TTOU <supervisor pid>         # one worker more / less
+    python serve.py --reload                    # development: one process, restarted on code changes
+
+The supervisor prepares the databases once (WAL, migrations, rollups,
+document store, digests, change log, search index), so workers do not race
+to migrate the same file, then binds the socket and starts the workers
+(pre-fork: every worker accepts on the socket it inherits). Each worker runs
+the app's startup, cache warmup included (warmup.py), before it accepts a
+connection; until then connections wait in the socket's backlog.
+
+On SIGHUP the workers are replaced one at a time with processes importing
+the current code: the old worker is only stopped once its replacement has
+finished starting up, and it then gets GRACEFUL_TIMEOUT seconds to finish the
+requests it is serving. A worker that dies is replaced. That handshake is
+uvicorn's (0.51 and later, hence the floor in pyproject.toml); older releases
+stop the old worker first.
+
+Replica copies and DuckDB copies (CHAT_REPLICA_DIR, ANALYTICS_ENGINE) are
+per worker: memory and disk for them grow with the worker count.
+
+Two timeouts govern the workers. A worker that does not answer the
+supervisor's ping within HEALTHCHECK_TIMEOUT is taken for hung and replaced;
+the ping is answered from a thread of its own, so this holds during warmup
+too. A replacement started by a reload gets STARTUP_TIMEOUT to finish its
+startup, warmup included, before the reload is abandoned and the old worker
+kept.
+
+    WEB_CONCURRENCY=1        workers
+    GRACEFUL_TIMEOUT=30      seconds an old worker gets for in-flight requests
+    HEALTHCHECK_TIMEOUT=5    seconds a worker may take to answer a liveness ping
+    STARTUP_TIMEOUT=600      seconds a new worker may take to start and warm up on reload
+
+`python main.py` runs this launcher too.
+"""
+
+import argparse
+import logging
+import os
+from socket import socket
+from typing import List, Optional
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+logger = logging.getLogger(__name__)
+
+
+class Supervisor(Multiprocess):
+    """
+    uvicorn's Multiprocess with a startup timeout of its own for reloads. It
+    reads timeout_worker_healthcheck both for liveness pings and for how long
+    a replacement may take to become ready; only the reload gets the long one.
+    """
+
+    def __init__(self, config: uvicorn.Config, sockets: List[socket], startup_timeout: int):
+        super().__init__(config, sockets)
+        self.startup_timeout = startup_timeout
+
+    def restart_all(self) -> None:
+        healthcheck = self.config.timeout_worker_healthcheck
+        self.config.timeout_worker_healthcheck = self.startup_timeout
+        try:
+            super().restart_all()
+        finally:
+            self.config.timeout_worker_healthcheck = healthcheck
+
+
+def serve(
+    host: str, port: int, workers: int, graceful_timeout: int, startup_timeout: int, healthcheck_timeout: int = 5
+) -> None:
+    # Imported here so --reload never loads the app in the watching process.
+    from main import federation, prepare_databases
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    prepare_databases()
+    federation.close()
+
+    config = uvicorn.Config(
+        "main:app",
+        host=host,
+        port=port,
+        workers=workers,
+        timeout_graceful_shutdown=graceful_timeout,
+        timeout_worker_healthcheck=healthcheck_timeout,
+    )
+    sock = config.bind_socket()
+    # A supervisor even for one worker: it is what reloads gracefully on SIGHUP.
+    Supervisor(config, [sock], startup_timeout).run()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the chat-analysis API.")
+    parser.add_argument("--host", default=os.environ.get("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 4000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", 1)))
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.environ.get("GRACEFUL_TIMEOUT", 30)))
+    parser.add_argument("--startup-timeout", type=int, default=int(os.environ.get("STARTUP_TIMEOUT", 600)))
+    parser.add_argument("--healthcheck-timeout", type=int, default=int(os.environ.get("HEALTHCHECK_TIMEOUT", 5)))
+    parser.add_argument("--reload", action="store_true", help="development server restarted on code changes")
+    parser.add_argument("--no-warmup", action="store_true", help="accept traffic without warming the caches")
+    args = parser.parse_args(argv)
+
+    if args.no_warmup:
+        os.environ["WARMUP"] = "0"  # read by the workers, which inherit the environment
+    if args.reload:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+    else:
+        serve(
+            args.host, args.port, max(args.workers, 1),
+            args.graceful_timeout, args.startup_timeout, args.healthcheck_timeout,
+        )
+
+
+if __name__ == "__main__":
+    main()
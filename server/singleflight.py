@@ -0,0 +1,109 @@
+"""
+Request coalescing ("single flight") for the read-only analytics endpoints.
+
+When identical GET requests overlap, only the first one (the leader) runs the
+endpoint; the others wait for it and receive a copy of its response, headers
+included. Requests are identical when they share the path, the query string
+after sorting its parameters, and the headers that change the representation.
+Nothing is kept once the leader finishes, so this never serves stale data: it
+only collapses work that is already in flight.
+"""
+
+import asyncio
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Headers that select a different representation of the same resource.
+VARY_HEADERS = (b"accept", b"accept-encoding", b"if-none-match")
+
+_counters = {"leaders": 0, "followers": 0}
+
+
+def request_key(scope: Scope) -> Tuple:
+    query = sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True))
+    headers = dict(scope.get("headers") or [])
+    return (
+        scope["path"],
+        urlencode(query),
+        tuple(headers.get(name, b"") for name in VARY_HEADERS),
+    )
+
+
+class SingleFlightMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        prefix: str = "/",
+        exclude: Iterable[str] = (),
+        skip: Optional[Callable[[Scope], bool]] = None,
+    ):
+        self.app = app
+        self.prefix = prefix
+        self.exclude = tuple(exclude)
+        # Requests for which buffering would hurt, e.g. streamed responses.
+        self.skip = skip
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+
+    def _coalesces(self, scope: Scope) -> bool:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            return False
+        path = scope["path"]
+        if not path.startswith(self.prefix) or any(part in path for part in self.exclude):
+            return False
+        return not (self.skip and self.skip(scope))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._coalesces(scope):
+            await self.app(scope, receive, send)
+            return
+
+        key = (scope["method"],) + request_key(scope)
+        pending = self._inflight.get(key)
+        if pending is not None:
+            _counters["followers"] += 1
+            try:
+                messages = await asyncio.shield(pending)
+            except Exception:
+                # The leader failed; compute independently rather than share its error.
+                await self.app(scope, receive, send)
+                return
+            await self._replay(messages, send)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        _counters["leaders"] += 1
+        messages: List[Message] = []
+
+        async def capture(message: Message) -> None:
+            messages.append(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        except BaseException as e:
+            # Cancellation of the leader must not look like cancellation of the followers.
+            future.set_exception(e if isinstance(e, Exception) else RuntimeError("coalesced request aborted"))
+            # Mark the exception retrieved in case nobody was waiting.
+            future.exception()
+            raise
+        else:
+            future.set_result(messages)
+        finally:
+            del self._inflight[key]
+        await self._replay(messages, send)
+
+    @staticmethod
+    async def _replay(messages: List[Message], send: Send) -> None:
+        # Outer middleware (CORS) edits header lists in place, so each
+        # receiver gets its own copy.
+        for message in messages:
+            if "headers" in message:
+                message = {**message, "headers": list(message["headers"])}
+            await send(message)
+
+
+def stats() -> Dict:
+    """How many requests ran the endpoint (leaders) and how many shared a result (followers)."""
+    return dict(_counters)
@@ -0,0 +1,121 @@
+"""
+Slow-query log for pooled SQLite connections.
+
+Pool connections are TimedConnection objects: every `execute` is timed, noted
+on the request being profiled (see profiling.py) and, when it takes longer
+than SLOW_QUERY_MS, appended to a JSON-lines log together with its EXPLAIN
+QUERY PLAN, so a regression in one of the large json_object document queries
+can be traced to its plan after the fact. Parameters are logged by type only:
+their values are search text and tenant ids.
+
+The time is that of `execute`: all of the work for writes, sorts and
+aggregates, up to the first row for plain scans (fetching is not included).
+
+    SLOW_QUERY_MS=100                      threshold in milliseconds (0 disables)
+    SLOW_QUERY_LOG=                        log file; unset (the default) keeps no log.
+                                           Rotated to <file>.1 at SLOW_QUERY_LOG_BYTES
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import metrics
+import profiling
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 100))
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG", "")
+SLOW_QUERY_LOG_BYTES = int(os.environ.get("SLOW_QUERY_LOG_BYTES", 16 * 1024 * 1024))
+
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+logger = logging.getLogger(__name__)
+_lock = threading.Lock()
+_disabled = False
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3.Connection whose execute() feeds the request profile and the slow-query log."""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        cursor = super().execute(sql, parameters)
+        seconds = time.perf_counter() - started
+        profiling.note_statement(sql, seconds)
+        if SLOW_QUERY_MS and SLOW_QUERY_LOG and seconds * 1000 >= SLOW_QUERY_MS:
+            record(self, sql, parameters, seconds)
+        return cursor
+
+    def explain(self, sql: str, parameters=()) -> List[str]:
+        """EXPLAIN QUERY PLAN of `sql` as indented lines, or [] when it cannot be explained."""
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        try:
+            rows = super().execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+        except sqlite3.Error:
+            return []
+        depth: Dict[int, int] = {0: -1}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node] + detail)
+        return lines
+
+
+def _param(value) -> str:
+    """What a parameter was, without what it said: 'text(12)', 'integer', 'null'."""
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes)):
+        return f"{'text' if isinstance(value, str) else 'blob'}({len(value)})"
+    return {bool: "integer", int: "integer", float: "real"}.get(type(value), type(value).__name__)
+
+
+def record(conn: TimedConnection, sql: str, parameters, seconds: float) -> None:
+    """Append one slow statement to the log (never raises into the query path)."""
+    global _disabled
+    if _disabled:
+        return
+    if isinstance(parameters, dict):
+        params = {key: _param(value) for key, value in parameters.items()}
+    else:
+        params = [_param(value) for value in parameters]
+    query_id, normalized = metrics.fingerprint(sql)
+    entry = {
+        "at": datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        "ms": round(seconds * 1000, 3),
+        "fingerprint": query_id,
+        "route": profiling.current_route(),
+        "sql": " ".join(sql.split()),
+        "params": params,
+        "plan": conn.explain(sql, parameters),
+    }
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    try:
+        with _lock:
+            if os.path.exists(SLOW_QUERY_LOG) and os.path.getsize(SLOW_QUERY_LOG) >= SLOW_QUERY_LOG_BYTES:
+                os.replace(SLOW_QUERY_LOG, SLOW_QUERY_LOG + ".1")
+            with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as log:
+                log.write(line)
+    except OSError as e:
+        _disabled = True
+        logger.warning(f"Slow-query log disabled, cannot write {SLOW_QUERY_LOG}: {e}")
+
+
+def tail(limit: int) -> List[Dict]:
+    """The newest `limit` entries, newest first."""
+    if not SLOW_QUERY_LOG:
+        return []
+    with _lock:
+        try:
+            with open(SLOW_QUERY_LOG, encoding="utf-8") as log:
+                lines = deque(log, maxlen=limit)
+        except FileNotFoundError:
+            return []
+    return [json.loads(line) for line in reversed(lines) if line.strip()]
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+/agents-performance tests: tickets, tenant sentiment and emotions, reply
+times and rank per agent, across databases.
+
+    python -m pytest test_agents.py
+"""
+
+import sqlite3
+
+import pytest
+
+from conftest import BASE, seed
+
+
+@pytest.fixture
+def db(tmp_path):
+    # Agent 7 answers conversations 1, 3, 5; agent 8 conversations 2, 4, 6; both five minutes after the tenant.
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=6)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO Agent (agent_id, name) VALUES (9, 'Agent 9')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def performance(client):
+    response = client.get(f"{BASE}/agents-performance")
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_per_agent(serve, db):
+    first, idle, last = performance(serve(db))
+    assert first == {
+        "agentId": "8",
+        "agentName": "Agent 8",
+        "totalTickets": 3,
+        "solvedTickets": 1,
+        "resolutionRate": 33.3,
+        "avgSentiment": 0,  # positive, negative, positive: 1 - 2 + 1
+        "sentimentBreakdown": {"positive": 2, "negative": 1},
+        "emotionBreakdown": {"joy": 1, "anger": 1, "sadness": 1},
+        "positiveEmotions": 1,
+        "negativeEmotions": 2,
+        "firstResponseSeconds": 300,
+        "avgResponseSeconds": 300,
+        "score": 19.98,
+        "rank": 1,
+    }
+    # No tickets scores 0, ahead of tenants who were mostly unhappy.
+    assert (idle["agentId"], idle["totalTickets"], idle["firstResponseSeconds"], idle["rank"]) == ("9", 0, None, 2)
+    assert (last["agentId"], last["avgSentiment"], last["score"], last["rank"]) == ("7", -1.33, -33.22, 3)
+    assert last["sentimentBreakdown"] == {"negative": 2, "neutral": 1}
+
+
+def test_reply_times(serve, db):
+    conn = sqlite3.connect(db)
+    conn.executemany(
+        "INSERT INTO Message (content, client_id, agent_id, timestamp, conversation_id) VALUES (?, ?, ?, ?, 1)",
+        [("still leaking", 1, None, "2025-08-01T10:00:00"), ("on our way", None, 7, "2025-08-01T10:15:00")],
+    )
+    conn.commit()
+    conn.close()
+    agent = {a["agentId"]: a for a in performance(serve(db))}["7"]
+    # Replies after 5 min (three conversations) and after 15 min; the first response of each stays 5 min.
+    assert (agent["firstResponseSeconds"], agent["avgResponseSeconds"]) == (300, (3 * 300 + 900) // 4)
+
+
+def test_every_database(serve, db, tmp_path):
+    history = str(tmp_path / "history.db")
+    seed(history, conversations=2, first_id=101, agents=(7,))
+    agents = {a["agentId"]: a for a in performance(serve(db, history))}
+    assert agents["7"]["totalTickets"] == 5 and agents["7"]["solvedTickets"] == 2
+    assert agents["7"]["resolutionRate"] == 40.0
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+DuckDB engine tests: trends from the columnar copy match the SQLite ones,
+and the server switches to the copy once it is exported.
+
+    python -m pytest test_analytics.py
+"""
+
+import sqlite3
+import time
+from contextlib import closing
+
+import pytest
+
+import analytics
+import main
+import trends
+from conftest import BASE, seed
+from federation import Shard
+
+pytest.importorskip("duckdb")
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=20)
+    conn = sqlite3.connect(path)
+    # Either side of New York's DST switch, and a message without a time.
+    for stamp in ("2025-03-08T12:00:00", "2025-03-10T12:00:00", None):
+        message = conn.execute("INSERT INTO Message (content, timestamp) VALUES ('x', ?)", (stamp,)).lastrowid
+        conn.execute("INSERT INTO Sentiment_Analysis (message_id, sentiment) VALUES (?, 'positive')", (message,))
+        conn.execute("INSERT INTO Emotion_Analysis (message_id, emotion) VALUES (?, 'joy')", (message,))
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def duckdb_engine(monkeypatch):
+    monkeypatch.setattr(analytics, "ANALYTICS_ENGINE", "duckdb")
+    yield
+    analytics._copies.clear()
+
+
+@pytest.mark.parametrize("granularity, tz, date_from, date_to", [
+    ("day", "UTC", None, None),
+    ("hour", "Asia/Kolkata", "2025-08-03", "2025-08-05"),
+    ("week", "UTC", None, None),
+    ("month", "America/New_York", None, None),
+    ("day", "America/New_York", "2025-03-01", "2025-08-02"),
+])
+def test_same_series_as_sqlite(db, granularity, tz, date_from, date_to):
+    shard = Shard(db)
+    copy = analytics.ColumnarCopy(shard)
+    copy.export()
+    assert copy.rows == {"sentiments": 42, "emotions": 22}
+    duck = copy.db.cursor()
+    conn = shard.read_pool.connection()
+    for on_duckdb, on_sqlite in ((analytics.sentiment_trend, trends.sentiment_trend),
+                                 (analytics.emotion_trend, trends.emotion_trend)):
+        expected = on_sqlite(conn, granularity, tz, date_from, date_to)
+        assert expected and on_duckdb(duck, granularity, tz, date_from, date_to) == expected
+
+
+def test_due(db, monkeypatch):
+    copy = analytics.ColumnarCopy(Shard(db))
+    assert copy.due()
+    copy.export()
+    monkeypatch.setattr(analytics, "ANALYTICS_INTERVAL", 0)
+    assert not copy.due()  # nothing changed
+    conn = sqlite3.connect(db)
+    conn.execute("DELETE FROM Emotion_Analysis")
+    conn.commit()
+    conn.close()
+    assert copy.due()
+
+
+def test_served_from_the_copy(serve, db, duckdb_engine):
+    client = serve(db)
+    shard = main.federation.primary
+    deadline = time.monotonic() + 30
+    while analytics.copy_of(shard) is None:
+        assert time.monotonic() < deadline, "no DuckDB copy exported"
+        time.sleep(0.05)
+
+    stats = client.get(f"{BASE}/debug/pool").json()["analytics"][db]
+    assert stats["exports"] == 1 and stats["rows"]["sentiments"] == 42
+    with closing(shard.read_pool.open()) as conn:
+        expected = trends.sentiment_trend(conn, "week", "Europe/London")
+    assert client.get(f"{BASE}/sentiment-trend?granularity=week&tz=Europe/London").json()["series"] == expected
+    assert client.get(f"{BASE}/emotion-trend?tz=Nowhere/Special").status_code == 400
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Change feed tests: /changes and the /events stream report writes to the live
+database, resume from a change id, and say so when the changes are gone.
+
+    python -m pytest test_changes.py
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+import main
+from changes import prune_changes
+from conftest import BASE, seed
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=3)
+    return path
+
+
+def write(db: str, *statements: str) -> None:
+    conn = sqlite3.connect(db)
+    for statement in statements:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+
+NEW_MESSAGE = "INSERT INTO Message (message_id, content, client_id, timestamp, conversation_id) " \
+              "VALUES (100, 'still leaking', 1, '2025-08-01T10:00:00', 1)"
+SOLVED = "UPDATE Conversation SET status = 'solved' WHERE conversation_id = 2"
+
+
+class Request:
+    """Just enough of a request for change_events: connected for `polls` checks."""
+
+    def __init__(self, polls: int):
+        self.polls = polls
+
+    async def is_disconnected(self) -> bool:
+        self.polls -= 1
+        return self.polls < 0
+
+
+def events(since=None, polls: int = 3, between=None):
+    """(event, id, data) of what /events sends; `between` runs after the first event."""
+    async def collect():
+        sent = []
+        async for text in main.change_events(Request(polls), since):
+            if text.startswith(":"):
+                continue
+            head, _, data = text.rstrip("\n").rpartition("\ndata: ")
+            fields = dict(line.split(": ", 1) for line in head.splitlines())
+            sent.append((fields["event"], int(fields["id"]), data))
+            if between and len(sent) == 1:
+                between()
+        return sent
+
+    return asyncio.run(collect())
+
+
+def test_changes_since(serve, db):
+    client = serve(db)
+    start = client.get(f"{BASE}/changes?since=0").json()
+    write(db, NEW_MESSAGE, SOLVED)
+
+    feed = client.get(f"{BASE}/changes?since={start['latest']}").json()
+    assert [(c["kind"], c["op"], c["conversationId"]) for c in feed["changes"]] == [
+        ("message", "insert", "CONV-1"), ("conversation", "update", "CONV-2"),
+    ]
+    assert feed["changes"][0]["content"] == "still leaking" and feed["changes"][1]["status"] == "solved"
+    assert feed["latest"] == feed["changes"][-1]["changeId"]
+
+    first = client.get(f"{BASE}/changes?since={start['latest']}&limit=1").json()
+    assert first["changes"] == feed["changes"][:1] and first["latest"] == feed["changes"][0]["changeId"]
+    assert client.get(f"{BASE}/changes?since={feed['latest']}").json() == {"changes": [], "latest": feed["latest"]}
+
+
+def test_trimmed_changes_mean_reload(serve, db):
+    client = serve(db)
+    write(db, NEW_MESSAGE, SOLVED, "UPDATE Conversation SET status = 'in_progress' WHERE conversation_id = 3")
+    conn = sqlite3.connect(db)
+    assert prune_changes(conn, keep=1) == 2
+    conn.close()
+    assert client.get(f"{BASE}/changes?since=0").status_code == 410
+    assert client.get(f"{BASE}/changes?since=999").status_code == 410  # another database
+
+
+def test_events(serve, db, monkeypatch):
+    monkeypatch.setattr(main, "CHANGE_POLL_INTERVAL", 0.01)
+    serve(db)
+    sent = events(between=lambda: write(db, SOLVED))
+    assert [event for event, _, _ in sent] == ["kpis", "conversation", "kpis"]
+    assert '"solved":2' in sent[2][2]
+    assert sent[0][1] < sent[1][1] == sent[2][1]  # every event carries the id to resume from
+
+
+def test_events_resume_and_reset(serve, db, monkeypatch):
+    monkeypatch.setattr(main, "CHANGE_POLL_INTERVAL", 0.01)
+    client = serve(db)
+    write(db, NEW_MESSAGE, SOLVED)
+    latest = client.get(f"{BASE}/changes?since=0").json()["latest"]
+
+    resumed = events(since=latest - 1, polls=1)
+    assert [event for event, _, _ in resumed] == ["kpis", "conversation", "kpis"]
+    assert events(since=latest + 5, polls=1)[1][:2] == ("reset", latest)
+
+
+def test_last_event_id_is_a_change_id(serve, db):
+    assert serve(db).get(f"{BASE}/events", headers={"Last-Event-ID": "abc"}).status_code == 400
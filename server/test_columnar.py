@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Columnar output tests: Arrow and Parquet tables hold what the JSON holds.
+
+    python -m pytest test_columnar.py
+"""
+
+import io
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from conftest import BASE, seed
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=3)
+    conn = sqlite3.connect(path)
+    # What the chatroom writes: datetime.utcnow().isoformat(), microseconds included.
+    conn.execute("UPDATE Message SET timestamp = '2025-08-01T09:00:00.123456' WHERE message_id = 1")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def read(response):
+    assert response.status_code == 200, response.text
+    if response.headers["content-type"].startswith("application/vnd.apache.parquet"):
+        return pq.read_table(io.BytesIO(response.content))
+    return pa.ipc.open_stream(response.content).read_all()
+
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_timestamps_agree_with_json(serve, db, fmt):
+    client = serve(db)
+    table = read(client.get(f"{BASE}/conversations?format={fmt}&table=messages"))
+    assert table.schema.field("timestamp").type == pa.timestamp("us", tz="UTC")
+
+    stamps = dict(zip(table.column("message_id").to_pylist(), table.column("timestamp").to_pylist()))
+    assert stamps[1] == datetime(2025, 8, 1, 9, 0, 0, 123456, tzinfo=timezone.utc)
+    for message in client.get(f"{BASE}/conversations/CONV-1").json()["messages"]:
+        returned = datetime.fromisoformat(message["timestamp"].replace("Z", "+00:00"))
+        assert stamps[message["id"]] == returned
+
+
+def test_tables_follow_the_filters(serve, db):
+    client = serve(db)
+    table = read(client.get(f"{BASE}/conversations?format=arrow&status=solved"))
+    assert table.column("conversation_id").to_pylist() == [1]
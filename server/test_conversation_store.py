@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Conversation document tests: timestamps as the API returns them, and
+rebuilding the store.
+
+    python -m pytest test_conversation_store.py
+"""
+
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from changes import install_change_log
+from conversation_store import install_document_store, iso_utc, rebuild_all_documents, select_messages
+from migrations import migrate
+
+
+@pytest.mark.parametrize(
+    "stored, returned",
+    [
+        ("2025-08-11T21:49:00", "2025-08-11T21:49:00Z"),
+        ("2025-08-11 21:49:00", "2025-08-11T21:49:00Z"),
+        ("2025-08-11T21:49:00.000", "2025-08-11T21:49:00Z"),
+        ("2025-08-11T21:49:00.000000", "2025-08-11T21:49:00Z"),
+        ("2025-08-11T21:49:00.25", "2025-08-11T21:49:00.25Z"),
+        ("2025-08-11T21:49:00.123", "2025-08-11T21:49:00.123Z"),
+        ("2025-08-11T21:49:00.123456", "2025-08-11T21:49:00.123456Z"),
+        ("2025-08-11T21:49:00.123456Z", "2025-08-11T21:49:00.123456Z"),
+        ("2025-08-11T21:49:00.123456+08:00", "2025-08-11T13:49:00.123456Z"),
+        ("2025-08-11", "2025-08-11T00:00:00Z"),
+        ("", None),
+        (None, None),
+        ("yesterday", "yesterday"),
+    ],
+)
+def test_iso_utc(stored, returned):
+    conn = sqlite3.connect(":memory:")
+    assert conn.execute(f"SELECT {iso_utc('?1')}", (stored,)).fetchone()[0] == returned
+
+
+def test_microseconds_round_trip():
+    """What the chatroom stores (datetime.utcnow().isoformat()) comes back as the same instant."""
+    written = datetime(2025, 8, 11, 21, 49, 0, 123456)
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    install_document_store(conn)
+    install_change_log(conn)
+    conn.executescript(f"""
+        INSERT INTO Client (client_id, name) VALUES (1, 'Tenant 1');
+        INSERT INTO Conversation (conversation_id, client_id) VALUES (1, 1);
+        INSERT INTO Message (content, client_id, timestamp, conversation_id)
+            VALUES ('aircond leaking', 1, '{written.isoformat()}', 1);
+    """)
+    install_document_store(conn)  # builds the stale document
+
+    document = json.loads(conn.execute("SELECT document FROM Conversation_Document").fetchone()[0])
+    messages, _ = select_messages(conn, 1, 10, None)
+    change = json.loads(conn.execute("SELECT data FROM Change_Log WHERE kind = 'message'").fetchone()[0])
+    for returned in (document["messages"][0]["timestamp"], json.loads(messages[0])["timestamp"], change["timestamp"]):
+        assert returned.endswith("Z")
+        assert datetime.fromisoformat(returned[:-1]) == written
+
+
+def test_rebuild_repairs_every_document():
+    conn = sqlite3.connect(":memory:")
+    migrate(conn)
+    conn.executescript("""
+        INSERT INTO Client (client_id, name) VALUES (1, 'Tenant 1');
+        INSERT INTO Conversation (conversation_id, client_id, status) VALUES (1, 1, 'solved'), (2, 1, 'urgent');
+    """)
+    install_document_store(conn)
+    built = conn.execute("SELECT conversation_id, document FROM Conversation_Document ORDER BY 1").fetchall()
+    conn.executescript("""
+        UPDATE Conversation_Document SET document = '{}' WHERE conversation_id = 1;
+        DELETE FROM Conversation_Document WHERE conversation_id = 2;
+    """)
+
+    assert rebuild_all_documents(conn) == 2
+    assert conn.execute("SELECT conversation_id, document FROM Conversation_Document ORDER BY 1").fetchall() == built
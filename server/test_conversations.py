@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+/conversations tests: keyset pagination and the server-side filters.
+
+    python -m pytest test_conversations.py
+"""
+
+import sqlite3
+
+import pytest
+
+from conftest import BASE, seed
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=23)
+    return path
+
+
+def pages(client, query: str = "", limit: int = 5):
+    """Every page of a paged listing, following X-Next-Cursor."""
+    result = []
+    cursor = None
+    while True:
+        url = f"{BASE}/conversations?limit={limit}{query}" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url)
+        assert response.status_code == 200, response.text
+        result.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return result
+
+
+def newest_first(conversations):
+    return sorted(conversations, key=lambda c: (c["lastUpdated"], int(c["id"].split("-")[1])), reverse=True)
+
+
+def test_pages_cover_every_conversation_once(serve, db):
+    client = serve(db)
+    everything = client.get(f"{BASE}/conversations").json()
+    assert len(everything) == 23
+
+    paged = pages(client)
+    assert [len(page) for page in paged] == [5, 5, 5, 5, 3]
+    listed = [c for page in paged for c in page]
+    assert listed == newest_first(listed)
+    assert sorted(c["id"] for c in listed) == sorted(c["id"] for c in everything)
+
+
+def test_cursor_is_stable_under_new_writes(serve, db):
+    client = serve(db)
+    first = client.get(f"{BASE}/conversations?limit=5")
+    # A conversation newer than everything listed so far must not shift the next page.
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO Conversation (conversation_id, client_id, started_at, status) VALUES (99, 1, NULL, 'urgent')")
+    conn.execute(
+        "INSERT INTO Message (content, client_id, timestamp, conversation_id) VALUES ('new', 1, '2025-09-30T10:00:00', 99)"
+    )
+    conn.commit()
+    conn.close()
+    second = client.get(f"{BASE}/conversations?limit=5&cursor={first.headers['X-Next-Cursor']}").json()
+    seen = {c["id"] for c in first.json()}
+    assert not seen & {c["id"] for c in second}
+    assert "CONV-99" not in {c["id"] for c in second}
+    assert client.get(f"{BASE}/conversations?limit=1").json()[0]["id"] == "CONV-99"
+
+
+@pytest.mark.parametrize(
+    "query, keep",
+    [
+        ("status=solved", lambda c: c["status"] == "solved"),
+        ("status=in_progress", lambda c: c["status"] == "In Progress"),
+        ("tenant_id=2", lambda c: c["tenantId"] == 2),
+        ("agent_id=8", lambda c: "8" in map(str, c["agentIds"])),
+        ("sentiment=moderate%20negative", lambda c: c["sentiment"] == "moderate negative"),
+        ("emotion=anger", lambda c: "anger" in c["emotions"]),
+        ("emotion=anger&emotion=joy", lambda c: {"anger", "joy"} & set(c["emotions"])),
+        ("topic=billing&agent_id=7", lambda c: "billing" in c["topics"] and "7" in map(str, c["agentIds"])),
+        ("date_from=2025-08-05&date_to=2025-08-09", lambda c: "2025-08-05" <= c["lastUpdated"][:10] <= "2025-08-09"),
+        ("search=ROOM%202", lambda c: "room 2" in c["summary"].lower()),
+        ("search=bill", lambda c: "billing" in c["topics"]),
+        ("search=sad&status=urgent", lambda c: "sadness" in c["emotions"] and c["status"] == "urgent"),
+    ],
+)
+def test_filters_match_the_dashboard(serve, db, query, keep):
+    client = serve(db)
+    everything = client.get(f"{BASE}/conversations").json()
+    expected = sorted(c["id"] for c in everything if keep(c))
+    assert expected, "the seed data should match every filter"
+
+    assert sorted(c["id"] for c in client.get(f"{BASE}/conversations?{query}").json()) == expected
+    assert sorted(c["id"] for page in pages(client, "&" + query, limit=2) for c in page) == expected
+
+
+def test_slim_list_and_bad_cursor(serve, db):
+    client = serve(db)
+    slim = client.get(f"{BASE}/conversations?limit=3&include_messages=false").json()
+    assert len(slim) == 3 and all("messages" not in c for c in slim)
+    assert client.get(f"{BASE}/conversations?limit=3&cursor=not-a-cursor").status_code == 400
+
+
+def test_search_text_is_literal(serve, db):
+    client = serve(db)
+    assert client.get(f"{BASE}/conversations?search=%25").json() == []
+    assert client.get(f"{BASE}/conversations?search=room_1").json() == []
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Digest tests: condensed summary sentences per period, kept up to date by
+refreshing only what a write touched, behind /summary.
+
+    python -m pytest test_digests.py
+"""
+
+import sqlite3
+
+import pytest
+
+from conftest import BASE, seed
+from digests import DIGEST_SENTENCES, condense, install_digests, rebuild_digests, refresh_digests
+from migrations import migrate
+
+
+@pytest.fixture
+def db(tmp_path):
+    # Twelve conversations, one a day from Friday 2025-08-01, all "Aircond leak in room N."
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=12)
+    return path
+
+
+def digests(conn):
+    return conn.execute("SELECT * FROM Summary_Digest ORDER BY period, start").fetchall()
+
+
+# ----------------------------
+# condense
+# ----------------------------
+def test_repeats_fold_together():
+    assert condense([("Aircond leaking.", 1), ("Aircond leaking.", 2), ("Wifi down. Aircond leaking.", 1)]) == [
+        ("Aircond leaking.", 4), ("Wifi down.", 1),
+    ]
+
+
+def test_bounded():
+    sentences = [(f"Problem {word} reported.", 1) for word in ("alpha", "bravo", "charlie", "delta", "echo",
+                                                                 "foxtrot", "golf", "hotel", "india", "juliet")]
+    digest = condense(sentences)
+    assert len(digest) == DIGEST_SENTENCES and all(count == 1 for _, count in digest)
+
+
+def test_empty():
+    assert condense([("", 1), ("  ", 3), ("a an", 1)]) == []
+
+
+# ----------------------------
+# Maintenance
+# ----------------------------
+def test_refresh_matches_rebuild():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    migrate(conn)
+    install_digests(conn)
+    conn.executescript("""
+        INSERT INTO Conversation (conversation_id, started_at) VALUES
+            (1, '2025-08-01T10:00:00'), (2, '2025-08-04T09:00:00'), (3, '2025-09-01T09:00:00'), (4, NULL);
+        INSERT INTO Conversation_Summary (conversation_id, summary_text) VALUES
+            (1, 'Aircond leaking.'), (2, 'Wifi down. Aircond leaking.'), (3, 'Noisy neighbours.'), (4, 'Door stuck.');
+        UPDATE Conversation_Summary SET summary_text = 'Lift broken.' WHERE conversation_id = 3;
+        UPDATE Conversation SET started_at = '2025-08-02T10:00:00' WHERE conversation_id = 1;
+    """)
+    assert refresh_digests(conn) and not refresh_digests(conn)
+    refreshed = digests(conn)
+    rebuild_digests(conn)
+    assert digests(conn) == refreshed
+    assert ("day", "2025-08-01") not in {row[:2] for row in refreshed}  # the moved conversation left its day
+
+
+# ----------------------------
+# /summary
+# ----------------------------
+@pytest.mark.parametrize("query, start, end, conversations", [
+    ("period=all", None, None, 12),
+    ("period=month&date=2025-08-20", "2025-08-01", "2025-08-31", 12),
+    ("period=week&date=2025-08-06", "2025-08-04", "2025-08-10", 7),
+    ("period=day", "2025-08-12", "2025-08-12", 1),  # the latest day with summaries
+    ("period=day&date=2025-09-01", "2025-09-01", "2025-09-01", 0),
+])
+def test_periods(serve, db, query, start, end, conversations):
+    summary = serve(db).get(f"{BASE}/summary?{query}").json()
+    assert (summary["start"], summary["end"], summary["conversations"]) == (start, end, conversations)
+    if conversations:
+        # Room numbers are too short to tell the summaries apart: one sentence stands for them all.
+        [highlight] = summary["highlights"]
+        assert highlight["count"] == conversations and summary["summary"] == highlight["text"]
+        assert highlight["text"].startswith("Aircond leak in room")
+
+
+def test_follows_writes(serve, db):
+    client = serve(db)
+    conn = sqlite3.connect(db)
+    conn.execute("UPDATE Conversation_Summary SET summary_text = 'Wifi down.' WHERE conversation_id = 12")
+    conn.commit()
+    conn.close()
+    assert client.get(f"{BASE}/summary?period=day").json()["highlights"] == [{"text": "Wifi down.", "count": 1}]
+
+
+def test_every_database(serve, db, tmp_path):
+    history = str(tmp_path / "history.db")
+    seed(history, conversations=3, first_id=101)
+    summary = serve(db, history).get(f"{BASE}/summary?period=week&date=2025-08-01").json()
+    assert summary["conversations"] == 6  # 1-3 August in both
+
+
+@pytest.mark.parametrize("query", ["period=year", "period=day&date=tomorrow"])
+def test_bad_parameters(serve, db, query):
+    assert serve(db).get(f"{BASE}/summary?{query}").status_code == 400
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Federation tests: a live database and an archive served as one, and the id
+check that refuses databases whose ids the merges would mix up.
+
+    python -m pytest test_federation.py
+"""
+
+import sqlite3
+
+import pytest
+
+import main
+from conftest import BASE, seed
+from federation import Federation
+
+
+@pytest.fixture
+def live(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=6)
+    return path
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = str(tmp_path / "archive.db")
+    seed(path, conversations=5, first_id=100)
+    return path
+
+
+def test_answers_merge_both_databases(serve, live, archive):
+    client = serve(live, archive)
+
+    kpis = client.get(f"{BASE}/kpis").json()
+    assert (kpis["total"], kpis["solved"], kpis["inProgress"], kpis["urgent"]) == (11, 4, 4, 3)
+
+    listed = client.get(f"{BASE}/conversations").json()
+    assert sorted(int(c["id"].split("-")[1]) for c in listed) == [1, 2, 3, 4, 5, 6, 100, 101, 102, 103, 104]
+    paged = client.get(f"{BASE}/conversations?limit=20&include_messages=false").json()
+    assert sorted(c["id"] for c in paged) == sorted(c["id"] for c in listed)
+    assert paged == sorted(paged, key=lambda c: c["lastUpdated"], reverse=True)
+
+    conversation = client.get(f"{BASE}/conversations/CONV-100")
+    assert conversation.status_code == 200
+    assert len(conversation.json()["messages"]) == 2
+    assert client.get(f"{BASE}/conversations/CONV-99").status_code == 404
+
+    # Tenant 1: conversations 1, 4, 100 and 103; agent 7: 1, 3, 5, 100, 102 and 104.
+    assert client.get(f"{BASE}/tenants/1").json()["stats"]["conversationCount"] == 4
+    agents = {a["agentId"]: a for a in client.get(f"{BASE}/agents-performance").json()}
+    assert agents["7"]["totalTickets"] == 6
+
+
+def test_archive_writes_show_up(serve, live, archive):
+    client = serve(live, archive)
+    assert client.get(f"{BASE}/kpis").json()["total"] == 11
+
+    conn = sqlite3.connect(archive)
+    conn.execute("DELETE FROM Conversation WHERE conversation_id = 104")
+    conn.commit()
+    conn.close()
+    assert client.get(f"{BASE}/kpis").json()["total"] == 10
+
+
+def test_shared_ids_are_reported(live, tmp_path):
+    other = str(tmp_path / "other.db")
+    seed(other, conversations=3, first_id=5)
+    conn = sqlite3.connect(other)
+    conn.execute("UPDATE Client SET name = 'Someone else' WHERE client_id = 2")
+    conn.commit()
+    conn.close()
+
+    federation = Federation([live, other])
+    try:
+        problems = federation.check_ids()
+    finally:
+        federation.close()
+    assert len(problems) == 2
+    assert "2 Conversation ids" in problems[0] and "e.g. 5" in problems[0]
+    assert "1 Client ids" in problems[1] and "different names" in problems[1]
+
+
+def test_overlapping_databases_are_not_served(monkeypatch, live, archive, tmp_path):
+    monkeypatch.setattr(main, "federation", Federation([live, archive]))
+    main.prepare_databases()  # disjoint: fine
+
+    copy = str(tmp_path / "copy.db")
+    seed(copy, conversations=2)
+    monkeypatch.setattr(main, "federation", Federation([live, copy]))
+    with pytest.raises(RuntimeError, match="cannot be served together"):
+        main.prepare_databases()
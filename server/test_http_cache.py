@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+HTTP caching tests: ETags and 304s on the served API.
+
+    python -m pytest test_http_cache.py
+"""
+
+import sqlite3
+
+import pytest
+
+from conftest import BASE, seed
+from http_cache import etag_matches
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=6)
+    return path
+
+
+def test_unchanged_data_is_not_sent_again(serve, db):
+    client = serve(db)
+    first = client.get(f"{BASE}/kpis")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"') and first.headers["cache-control"] == "no-cache"
+
+    again = client.get(f"{BASE}/kpis", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+
+
+def test_writes_change_the_tag(serve, db):
+    client = serve(db)
+    etag = client.get(f"{BASE}/kpis").headers["etag"]
+
+    conn = sqlite3.connect(db)
+    conn.execute("UPDATE Conversation SET status = 'solved' WHERE conversation_id = 2")
+    conn.commit()
+    conn.close()
+
+    response = client.get(f"{BASE}/kpis", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["solved"] == 3
+
+
+def test_tags_differ_per_representation(serve, db):
+    client = serve(db)
+    url = f"{BASE}/conversations?limit=2"
+    etag = client.get(url).headers["etag"]
+    streamed = client.get(url.replace("limit=2", "stream=1"), headers={"Accept": "application/x-ndjson"})
+    assert streamed.headers["etag"] != etag
+
+
+@pytest.mark.parametrize(
+    "if_none_match, matches",
+    [
+        ('W/"1-a"', True),
+        ('"1-a"', True),
+        ('W/"0-a", W/"1-a"', True),
+        ("*", True),
+        ('W/"1-b"', False),
+        ("", False),
+    ],
+)
+def test_weak_comparison(if_none_match, matches):
+    assert etag_matches(if_none_match, 'W/"1-a"') is matches
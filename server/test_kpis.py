@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+/kpis tests: the counters in one query, computed again only when the data
+changes or the entry gets old.
+
+    python -m pytest test_kpis.py
+"""
+
+import sqlite3
+
+import pytest
+
+import main
+from conftest import BASE, seed
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=12)
+    return path
+
+
+@pytest.fixture
+def computed(monkeypatch):
+    calls = []
+    compute = main.compute_kpis
+    monkeypatch.setattr(main, "compute_kpis", lambda shard: calls.append(shard.path) or compute(shard))
+    return calls
+
+
+def test_counters(serve, db):
+    # Statuses cycle solved / in progress / urgent; tenants' messages 1, 4, 5, 8, 9 and 12 are negative.
+    assert serve(db).get(f"{BASE}/kpis").json() == {
+        "total": 12, "inProgress": 4, "solved": 4, "negative": 6, "urgent": 4,
+    }
+
+
+def test_one_query(serve, db):
+    profile = serve(db).get(f"{BASE}/kpis", headers={"X-Profile": "1"}).json()
+    reads = [query["sql"] for query in profile["queries"] if "_Daily" in query["sql"]]
+    assert len(reads) == 1 and "Rollup_Conversation_Daily" in reads[0] and "Rollup_Sentiment_Daily" in reads[0]
+
+
+def test_cached_until_the_data_changes(serve, db, computed):
+    client = serve(db)
+    assert main.get_kpis()["total"] == main.get_kpis()["total"] == 12
+    assert computed == [db]
+
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO Conversation (client_id, started_at, status) VALUES (1, '2025-08-20T10:00:00', 'urgent')")
+    conn.commit()
+    conn.close()
+    assert client.get(f"{BASE}/kpis").json()["urgent"] == 5
+    assert computed == [db, db]
+
+
+def test_cached_for_the_ttl(serve, db, computed, monkeypatch):
+    serve(db)
+    main.get_kpis()
+    main.get_kpis()
+    assert computed == [db]
+    monkeypatch.setattr(main, "KPI_CACHE_TTL", 0)
+    main.get_kpis()
+    assert computed == [db, db]
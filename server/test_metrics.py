@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Metrics tests: request and statement timings per route template and SQL
+fingerprint, in /metrics and /debug/perf.
+
+    python -m pytest test_metrics.py
+"""
+
+import re
+
+import pytest
+
+import metrics
+from conftest import BASE, seed
+from metrics import Histogram, fingerprint, normalize_sql
+
+ROUTE = f"/{BASE.lstrip('/')}/conversations/{{conversation_id}}"
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=3)
+    return path
+
+
+@pytest.fixture
+def client(serve, db):
+    client = serve(db)
+    metrics.reset()
+    yield client
+    metrics.reset()
+
+
+# ----------------------------
+# Building blocks
+# ----------------------------
+def test_fingerprints_fold_literals_and_lists():
+    assert normalize_sql("SELECT *\n  FROM Message WHERE id IN (?, ?, ?) AND content = 'it''s' LIMIT 20") == \
+        "SELECT * FROM Message WHERE id IN (?, ...) AND content = ? LIMIT ?"
+    assert fingerprint("SELECT 1 FROM t WHERE a IN (?, ?)")[0] == fingerprint("SELECT 2 FROM t WHERE a IN (?,?,?)")[0]
+    assert fingerprint("SELECT a FROM t")[0] != fingerprint("SELECT b FROM t")[0]
+
+
+def test_histogram():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 2.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [("0.1", 2), ("1.0", 3), ("+Inf", 4)]
+    assert histogram.quantile(0.5) == pytest.approx(0.1)
+    assert histogram.quantile(0.75) == pytest.approx(1.0)
+    assert histogram.quantile(1.0) == 2.0  # the +Inf bucket gives the largest seen
+    assert Histogram((1.0,)).quantile(0.5) is None
+
+
+# ----------------------------
+# Endpoints
+# ----------------------------
+def test_requests_by_route_template(client):
+    for path in ("CONV-1", "CONV-2", "CONV-99"):
+        client.get(f"{BASE}/conversations/{path}")
+    etag = client.get(f"{BASE}/conversations/CONV-1").headers["etag"]
+    assert client.get(f"{BASE}/conversations/CONV-1", headers={"If-None-Match": etag}).status_code == 304
+
+    [route] = [r for r in client.get(f"{BASE}/debug/perf").json()["routes"] if r["route"] == ROUTE]
+    assert route["requests"] == 5 and route["statuses"] == {"2xx": 3, "4xx": 1, "3xx": 1}
+    assert route["p50Ms"] <= route["p95Ms"] <= route["maxMs"] and route["maxBytes"] > 0
+
+    text = client.get("/metrics").text
+    labels = f'method="GET",route="{ROUTE}"'
+    assert f'http_request_duration_seconds_count{{{labels}}} 5' in text
+    assert f'http_requests_total{{{labels},status="4xx"}} 1' in text
+    assert "/metrics" not in text  # scrapes are not counted
+
+
+def test_queries_by_fingerprint(client):
+    for tenant in (1, 2, 3):
+        client.get(f"{BASE}/tenants/{tenant}")
+    queries = client.get(f"{BASE}/debug/perf").json()["queries"]
+    [tenant] = [q for q in queries if "FROM Client c" in q["sql"] and q["calls"] == 3]
+    assert tenant["rows"] == 3 and tenant["avgRows"] == 1.0
+
+    samples = re.findall(rf'sqlite_query_duration_seconds_count{{query="{tenant["fingerprint"]}"}} (\d+)',
+                         client.get("/metrics").text)
+    assert samples == ["3"]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Migration tests: new and already deployed files end up with the schema the
+preprocess job and the chatroom write to.
+
+    python -m pytest test_migrations.py
+"""
+
+import sqlite3
+
+import pytest
+
+from migrations import MIGRATIONS, applied_versions, migrate
+
+# What the chatroom writes after summarizing a conversation.
+CHATROOM_SUMMARY = """INSERT OR REPLACE INTO Conversation_Summary
+    (conversation_id, summary_text, created_at) VALUES (1, 'Aircond fixed.', '2025-08-11T21:49:00.123456')"""
+
+
+def columns(conn: sqlite3.Connection, table: str):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def test_new_file():
+    conn = sqlite3.connect(":memory:")
+    assert migrate(conn) == [version for version, _, _ in MIGRATIONS]
+    assert columns(conn, "Conversation_Summary") == ["conversation_id", "summary_text", "created_at"]
+    conn.execute(CHATROOM_SUMMARY)
+    assert migrate(conn) == []
+
+
+@pytest.mark.parametrize("recorded", [[], [1, 2, 3]])
+def test_deployed_file_gets_summary_timestamps(recorded):
+    conn = sqlite3.connect(":memory:")
+    # Version 1 as it first shipped, without Conversation_Summary.created_at.
+    for statement in MIGRATIONS[0][2]:
+        conn.execute(statement.replace(",\n            created_at      TEXT\n        )", "\n        )"))
+    assert "created_at" not in columns(conn, "Conversation_Summary")
+    conn.execute("INSERT INTO Conversation_Summary VALUES (1, 'Kept.')")
+    applied_versions(conn)
+    for version in recorded:
+        conn.execute("INSERT INTO Schema_Migration VALUES (?, 'earlier', datetime('now'))", (version,))
+    conn.commit()
+
+    migrate(conn)
+    assert columns(conn, "Conversation_Summary") == ["conversation_id", "summary_text", "created_at"]
+    assert conn.execute("SELECT summary_text, created_at FROM Conversation_Summary").fetchall() == [("Kept.", None)]
+    conn.execute(CHATROOM_SUMMARY)
+    assert applied_versions(conn) == [version for version, _, _ in MIGRATIONS]
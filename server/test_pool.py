@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Connection pool tests: one tuned connection per thread, reused across
+requests, closed with its thread, and repointed without a restart.
+
+    python -m pytest test_pool.py
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from conftest import BASE, seed
+from pool import TUNING, ConnectionPool
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=3)
+    return path
+
+
+def in_thread(fn):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(fn()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_one_connection_per_thread(db):
+    pool = ConnectionPool(db)
+    conn = pool.connection()
+    assert pool.connection() is conn
+    assert in_thread(pool.connection) is not conn
+    assert pool.stats()["opened"] == 2 and pool.stats()["checkouts"] == 3
+
+
+def test_tuned_and_read_only(db):
+    conn = ConnectionPool(db).connection()
+    assert conn.execute("PRAGMA cache_size").fetchone()[0] == TUNING["cache_size"]
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == TUNING["busy_timeout"]
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM Message")
+    ConnectionPool(db, read_only=False).connection().execute("DELETE FROM Topic_Analysis")
+
+
+def test_connections_of_finished_threads_are_closed(db):
+    pool = ConnectionPool(db)
+    finished = in_thread(pool.connection)
+    pool.connection()
+    assert pool.stats()["open"] == 1 and pool.stats()["closedDeadThreads"] == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        finished.execute("SELECT 1")
+
+
+def test_repoint(db, tmp_path):
+    other = str(tmp_path / "other.db")
+    seed(other, conversations=5)
+    pool = ConnectionPool(db)
+    count = lambda: pool.connection().execute("SELECT COUNT(*) FROM Conversation").fetchone()[0]
+    assert count() == 3
+    pool.repoint(other)
+    assert count() == 5
+    assert pool.stats()["generation"] == 1
+
+
+def test_requests_reuse_connections(serve, db):
+    client = serve(db)
+    for offset in range(50):
+        assert client.get(f"{BASE}/conversations?limit=1&offset={offset}").status_code == 200
+    stats = client.get(f"{BASE}/debug/pool").json()["databases"][db]["read"]
+    assert stats["checkouts"] >= 50 and stats["opened"] < stats["checkouts"] / 2
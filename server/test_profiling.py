@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Profiling tests: profiled requests, the slow-query log, and who may see them.
+
+    python -m pytest test_profiling.py
+"""
+
+import json
+import re
+
+import pytest
+
+import profiling
+import slow_queries
+from conftest import BASE, seed
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=6)
+    return path
+
+
+def test_profile_instead_of_the_response(serve, db):
+    client = serve(db)
+    profile = client.get(f"{BASE}/conversations?limit=3", headers={"X-Profile": "1"}).json()
+    assert profile["route"] == f"/{BASE.lstrip('/')}/conversations" and profile["status"] == 200
+    assert any("Conversation_Document" in query["sql"] for query in profile["queries"])
+
+    folded = client.get(f"{BASE}/kpis?profile=folded")
+    assert folded.headers["content-type"].startswith("text/plain")
+
+
+def test_slow_query_log_keeps_plans_not_values(serve, db, monkeypatch, slow_query_log):
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_MS", 1e-9)  # every statement is slow
+    client = serve(db)
+    assert client.get(f"{BASE}/search?q=aircond%20room%203&tenant_id=3").status_code == 200
+
+    entries = client.get(f"{BASE}/debug/slow-queries?limit=1000").json()["entries"]
+    searches = [entry for entry in entries if "Message_Search MATCH" in entry["sql"]]
+    assert searches and all(entry["plan"] for entry in searches)
+    assert "text(1)" in searches[0]["params"]  # tenant_id=3
+    assert all(re.fullmatch(r"(text|blob)\(\d+\)|integer|real|null", param) for param in searches[0]["params"])
+    with open(slow_query_log, encoding="utf-8") as log:
+        written = log.read()
+    assert "aircond" not in written and "room" not in written
+
+
+def test_no_log_by_default(serve, db, monkeypatch, slow_query_log):
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_LOG", "")
+    monkeypatch.setattr(slow_queries, "SLOW_QUERY_MS", 1e-9)
+    client = serve(db)
+    client.get(f"{BASE}/kpis")
+    assert client.get(f"{BASE}/debug/slow-queries").json() == {"thresholdMs": 1e-9, "log": None, "entries": []}
+
+
+@pytest.mark.parametrize("path", ["debug/pool", "debug/perf", "debug/slow-queries"])
+def test_debug_endpoints_follow_the_allow_list(serve, db, monkeypatch, path):
+    client = serve(db)
+    assert client.get(f"{BASE}/{path}").status_code == 200
+    monkeypatch.setattr(profiling, "PROFILE_ALLOW", [])
+    assert client.get(f"{BASE}/{path}").status_code == 403
+    assert client.get(f"{BASE}/kpis", headers={"X-Profile": "1"}).status_code == 403
+
+
+def test_parameter_types():
+    assert [slow_queries._param(value) for value in ("Tenant 1", b"\x00\x01", 7, 2.5, None, True)] == [
+        "text(8)", "blob(2)", "integer", "real", "null", "integer",
+    ]
+    assert json.dumps(slow_queries._param(object())) == '"object"'
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression suite.
+
+Calls every endpoint against a freshly migrated database, records each SQL
+statement the server runs, and fails if EXPLAIN QUERY PLAN shows a full table
+scan. Planner statistics are dropped first, so the plans are the ones SQLite
+picks for a large database rather than for the few rows seeded here.
+
+    python -m pytest test_query_plans.py
+    python test_query_plans.py
+"""
+
+import os
+import re
+import sqlite3
+import tempfile
+from typing import Dict, List
+
+import columnar
+import pool
+
+BASE = "/coliving-ai-os/chat-analysis"
+
+ENDPOINTS = [
+    "/kpis",
+    "/conversations",
+    "/conversations?limit=2",
+    "/conversations?status=solved&limit=5",
+    "/conversations?tenant_id=1&limit=5",
+    "/conversations?agent_id=7&limit=5",
+    "/conversations?sentiment=strong%20negative&limit=5",
+    "/conversations?emotion=joy&topic=noise&limit=5",
+    "/conversations?date_from=2025-08-01&date_to=2025-08-31&limit=5",
+    "/conversations?include_messages=false&limit=5",
+    "/conversations?stream=1&status=solved",
+    "/conversations/CONV-1",
+    "/conversations/CONV-1/messages?limit=1",
+    "/sentiment-distribution",
+    "/sentiment-distribution?date_from=2025-08-01&date_to=2025-08-31",
+    "/emotion-distribution",
+    "/sentiment-trend",
+    "/sentiment-trend?granularity=week&tz=Europe/London&date_from=2025-08-01&date_to=2025-08-31",
+    "/emotion-trend?granularity=hour&tz=Asia/Kuala_Lumpur",
+    "/sentiment-by-service",
+    "/emotion-by-service",
+    "/trending-topics",
+    "/summary",
+    "/summary?period=week",
+    "/summary?period=day&date=2025-08-02",
+    "/tenants",
+    "/tenants?sort=-conversations&limit=5",
+    "/tenants?sort=lastContact&limit=5&cursor=eyJvZmZzZXQiOiA1fQ",
+    "/tenants/1",
+    "/agents",
+    "/agents-performance",
+    "/search?q=aircond%20leaking",
+    "/search?q=leak&tenant_id=1&sender=tenant&context=2&limit=1",
+    "/changes?since=0",
+]
+if columnar.available():
+    ENDPOINTS += [
+        f"/conversations?format={fmt}&table={table}{query}"
+        for fmt in ("arrow", "parquet")
+        for table in columnar.CONVERSATION_TABLES
+        for query in ("", "&status=solved&topic=noise")
+    ] + ["/sentiment-distribution?format=arrow", "/emotion-distribution?format=parquet"]
+
+# Tables an endpoint reads in full on purpose: the response is every row, or
+# the table is a small rollup whose size is bounded by days x labels.
+FULL_SCAN_ALLOWED = {
+    "Client",                 # /tenants lists every tenant
+    "Agent",                  # /agents lists every agent
+    "Conversation_Document",  # unpaged /conversations returns every document
+    "Rollup_Conversation_Daily",
+    "Rollup_Sentiment_Daily",
+    "Rollup_Emotion_Daily",
+    "Rollup_Topic",
+    "Rollup_Dirty",
+    "Digest_Dirty",
+}
+
+_TABLE_REF = re.compile(
+    r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:ON|WHERE|JOIN|LEFT|CROSS|INNER|GROUP|ORDER|LIMIT|USING)\b)(\w+))?",
+    re.IGNORECASE,
+)
+
+
+def seed(conn: sqlite3.Connection) -> None:
+    conn.executescript("""
+        INSERT INTO Client (client_id, name, date_of_birth) VALUES (1, 'Tenant 1', '1995-03-01');
+        INSERT INTO Client_Profile (client_id, openness) VALUES (1, 0.5);
+        INSERT INTO Agent (agent_id, name) VALUES (7, 'Agent 7');
+        INSERT INTO Conversation (client_id, started_at, status) VALUES (1, '2025-08-01T10:00:00', 'solved');
+        INSERT INTO Message (content, client_id, timestamp, conversation_id)
+            VALUES ('aircond leaking', 1, '2025-08-01T10:00:00', 1);
+        INSERT INTO Message (content, agent_id, timestamp, conversation_id)
+            VALUES ('we check', 7, '2025-08-01T10:05:00', 1);
+        INSERT INTO Sentiment_Analysis (message_id, sentiment) VALUES (1, 'negative');
+        INSERT INTO Emotion_Analysis (message_id, emotion) VALUES (1, 'joy');
+        INSERT INTO Topic_Analysis (conversation_id, topic) VALUES (1, 'noise');
+        INSERT INTO Conversation_Summary (conversation_id, summary_text) VALUES (1, 'Aircond leak');
+    """)
+
+
+def write_more(conn: sqlite3.Connection) -> None:
+    """Touch every rollup partition kind and a document, so the refresh paths run too."""
+    conn.executescript("""
+        INSERT INTO Conversation (client_id, started_at, status) VALUES (1, NULL, 'urgent');
+        INSERT INTO Message (content, client_id, timestamp, conversation_id) VALUES ('again', 1, NULL, 2);
+        INSERT INTO Message (content, client_id, timestamp, conversation_id)
+            VALUES ('still leaking', 1, '2025-08-02T09:00:00', 1);
+        INSERT INTO Sentiment_Analysis (message_id, sentiment) VALUES (3, 'negative');
+        INSERT INTO Sentiment_Analysis (message_id, sentiment) VALUES (4, 'neutral');
+        INSERT INTO Emotion_Analysis (message_id, emotion) VALUES (4, 'anger');
+        INSERT INTO Topic_Analysis (conversation_id, topic) VALUES (1, 'billing');
+        INSERT INTO Topic_Analysis (conversation_id, topic) VALUES (2, NULL);
+        INSERT INTO Conversation_Summary (conversation_id, summary_text) VALUES (2, 'Tenant asked again');
+        UPDATE Conversation_Summary SET summary_text = 'Aircond still leaking' WHERE conversation_id = 1;
+    """)
+
+
+def full_scans(conn: sqlite3.Connection, statement: str) -> List[str]:
+    """Tables EXPLAIN QUERY PLAN reads row by row without an index."""
+    aliases: Dict[str, str] = {}
+    for table, alias in _TABLE_REF.findall(statement):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    scanned = []
+    for row in conn.execute("EXPLAIN QUERY PLAN " + statement):
+        detail = row[3]
+        match = re.match(r"SCAN (\w+)$", detail)
+        if not match:
+            continue  # SEARCH, SCAN ... USING INDEX, SCAN CONSTANT ROW, subqueries
+        table = aliases.get(match.group(1), match.group(1))
+        if table in tables:
+            scanned.append(table)
+    return scanned
+
+
+def collect_statements(workdir: str) -> List[str]:
+    os.makedirs(os.path.join(workdir, "database"))
+    os.chdir(workdir)
+
+    statements: List[str] = []
+    connect = pool.ConnectionPool._connect
+
+    def traced(self):
+        conn = connect(self)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    pool.ConnectionPool._connect = traced
+    try:
+        import cache
+        import main
+        from fastapi.testclient import TestClient
+        from migrations import migrate
+
+        db = sqlite3.connect(main.DB_FILE)
+        migrate(db)
+        seed(db)
+        db.execute("DROP TABLE IF EXISTS sqlite_stat1")
+        db.commit()
+
+        with TestClient(main.app) as client:
+            statements.clear()  # startup installs and backfills on purpose
+            for path in ENDPOINTS:
+                response = client.get(BASE + path)
+                assert response.status_code == 200, f"{path}: {response.status_code} {response.text}"
+            write_more(db)
+            db.commit()
+            cache.clear()
+            for path in ENDPOINTS:
+                assert client.get(BASE + path).status_code == 200, path
+        db.close()
+    finally:
+        pool.ConnectionPool._connect = connect
+    return statements
+
+
+def test_no_full_table_scans():
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        statements = collect_statements(workdir)
+        inspector = sqlite3.connect(os.path.join(workdir, "database", "test.db"))
+        failures = []
+        seen = set()
+        for statement in statements:
+            text = statement.strip()
+            if text in seen or not text.upper().startswith(("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")):
+                if text.upper().startswith("CREATE TEMP"):
+                    inspector.execute(text)  # later statements refer to it
+                continue
+            seen.add(text)
+            scanned = [t for t in full_scans(inspector, text) if t not in FULL_SCAN_ALLOWED]
+            if scanned:
+                failures.append(f"full scan of {', '.join(scanned)}:\n    {' '.join(text.split())[:300]}")
+        inspector.close()
+    finally:
+        os.chdir(cwd)
+
+    assert len(seen) > len(ENDPOINTS), "statement capture did not work"
+    assert not failures, "\n".join(failures)
+
+
+if __name__ == "__main__":
+    test_no_full_table_scans()
+    print("✅ No endpoint query falls back to a full table scan")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Replica tests: reads served from immutable copies of the live database, how
+far behind a copy is, and moving readers onto a new one.
+
+    python -m pytest test_replica.py
+"""
+
+import glob
+import os
+import sqlite3
+import time
+
+import pytest
+
+import main
+import replica
+from changes import install_change_log
+from conftest import BASE, seed
+from replica import Replica
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=6)
+    return path
+
+
+def add_conversation(db: str, status: str = "urgent") -> None:
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO Conversation (client_id, started_at, status) VALUES (1, '2025-08-20T10:00:00', ?)",
+                 (status,))
+    conn.commit()
+    conn.close()
+
+
+def test_copies(db, tmp_path):
+    directory = str(tmp_path / "replicas")
+    copies = Replica(db, directory)
+    live = sqlite3.connect(db)
+    install_change_log(live)
+    first = copies.refresh(live)
+    assert copies.generation == 1 and copies.lag() == 0.0 and copies.changes_behind(live) == 0
+    with sqlite3.connect(first) as copy:
+        assert copy.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        assert copy.execute("SELECT COUNT(*) FROM Conversation").fetchone()[0] == 6
+
+    add_conversation(db)
+    assert copies.lag() > 0 and copies.changes_behind(live) == 1
+
+    copies.refresh(live)
+    copies.refresh(live)
+    # The previous copy may still be serving; the one before is gone.
+    assert sorted(os.path.basename(path) for path in glob.glob(os.path.join(directory, "*.db"))) == [
+        f"live.{os.getpid()}.2.db", f"live.{os.getpid()}.3.db",
+    ]
+    copies.remove_all()
+    assert glob.glob(os.path.join(directory, "*")) == []
+
+
+def test_due(db, tmp_path, monkeypatch):
+    copies = Replica(db, str(tmp_path / "replicas"))
+    live = sqlite3.connect(db)
+    install_change_log(live)
+    copies.refresh(live)
+    assert not copies.due(live)
+
+    add_conversation(db)
+    assert not copies.due(live)  # one change, for less than REPLICA_INTERVAL
+    monkeypatch.setattr(replica, "REPLICA_MAX_CHANGES", 1)
+    assert copies.due(live)
+    monkeypatch.setattr(replica, "REPLICA_MAX_CHANGES", 1000)
+    monkeypatch.setattr(replica, "REPLICA_INTERVAL", 0)
+    assert copies.due(live)
+
+
+def test_served_from_the_copy(serve, db, tmp_path):
+    client = serve(db, replica_dir=str(tmp_path / "replicas"))
+    shard = main.federation.primary
+    assert client.get(f"{BASE}/kpis").json()["urgent"] == 2
+
+    add_conversation(db)
+    assert client.get(f"{BASE}/kpis").json()["urgent"] == 2  # the copy has not got it yet
+    # The change feed reads the live file.
+    [change] = client.get(f"{BASE}/changes?since=0").json()["changes"]
+    assert change["kind"] == "conversation"
+    shard.replica.observe()  # what the refresher does every REPLICA_POLL
+    time.sleep(0.01)
+    stats = client.get(f"{BASE}/debug/pool").json()["databases"][db]
+    assert stats["replica"]["generation"] == 1 and stats["replica"]["lagSeconds"] >= 0.01
+    assert f'sqlite_replica_changes_behind{{database="{db}"}} 1' in client.get("/metrics").text
+
+    shard.refresh_replica()
+    assert client.get(f"{BASE}/kpis").json()["urgent"] == 3
+    stats = client.get(f"{BASE}/debug/pool").json()["databases"][db]
+    assert stats["replica"]["generation"] == 2 and stats["replica"]["lagSeconds"] == 0
+    assert stats["read"]["dbPath"] == shard.replica.path and stats["read"]["immutable"]
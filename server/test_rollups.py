@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Rollup tests: after any write, refreshing the touched partitions must give
+the same counters as recomputing everything from the source tables, and the
+endpoints reading them (/kpis, /tenants, /agents-performance) follow.
+
+    python -m pytest test_rollups.py
+"""
+
+import sqlite3
+from typing import Dict, List
+
+import pytest
+
+from conftest import BASE, seed
+from migrations import migrate
+from rollups import install_rollups, rebuild_rollups, refresh_rollups
+
+ROLLUPS = [
+    "Rollup_Conversation_Daily",
+    "Rollup_Sentiment_Daily",
+    "Rollup_Emotion_Daily",
+    "Rollup_Topic",
+    "Rollup_Tenant",
+    "Rollup_Agent_Conversation",
+    "Rollup_Agent",
+]
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", isolation_level=None)  # each write commits, as the writers do
+    migrate(conn)
+    conn.executescript("""
+        INSERT INTO Client (client_id, name) VALUES (1, 'Tenant 1'), (2, 'Tenant 2');
+        INSERT INTO Agent (agent_id, name) VALUES (7, 'Agent 7');
+        INSERT INTO Conversation (conversation_id, client_id, started_at, status)
+            VALUES (1, 1, '2025-08-01T10:00:00', 'solved'), (2, 2, '2025-08-02T09:00:00', 'in_progress');
+        INSERT INTO Message (message_id, content, client_id, timestamp, conversation_id)
+            VALUES (1, 'aircond leaking', 1, '2025-08-01T10:00:00', 1);
+        INSERT INTO Message (message_id, content, agent_id, timestamp, conversation_id)
+            VALUES (2, 'we check', 7, '2025-08-01T10:05:00', 1);
+        INSERT INTO Message (message_id, content, client_id, timestamp, conversation_id)
+            VALUES (3, 'wifi slow', 2, '2025-08-02T09:00:00', 2);
+        INSERT INTO Sentiment_Analysis (sentiment_id, message_id, sentiment)
+            VALUES (1, 1, 'negative'), (2, 3, 'neutral');
+        INSERT INTO Emotion_Analysis (message_id, emotion) VALUES (1, 'anger'), (3, 'sadness');
+        INSERT INTO Topic_Analysis (conversation_id, topic) VALUES (1, 'maintenance'), (2, 'amenities');
+    """)
+    install_rollups(conn)
+    yield conn
+    conn.close()
+
+
+def snapshot(conn: sqlite3.Connection) -> Dict[str, List]:
+    return {table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall()) for table in ROLLUPS}
+
+
+def assert_refresh_matches_rebuild(conn: sqlite3.Connection) -> None:
+    refresh_rollups(conn)
+    refreshed = snapshot(conn)
+    rebuild_rollups(conn)
+    assert refreshed == snapshot(conn)
+
+
+def conversations_by_status(conn: sqlite3.Connection) -> Dict[str, int]:
+    return dict(conn.execute("SELECT status, SUM(count) FROM Rollup_Conversation_Daily GROUP BY status"))
+
+
+def test_install_backfills(conn):
+    assert conversations_by_status(conn) == {"solved": 1, "in_progress": 1}
+    assert_refresh_matches_rebuild(conn)
+
+
+def test_insert_or_replace_moves_the_old_day(conn):
+    conn.execute("""
+        INSERT OR REPLACE INTO Conversation (conversation_id, client_id, started_at, status)
+        VALUES (1, 2, '2025-08-05T08:00:00', 'solved')
+    """)
+    refresh_rollups(conn)
+    assert conversations_by_status(conn) == {"solved": 1, "in_progress": 1}
+    assert conn.execute("SELECT day FROM Rollup_Conversation_Daily WHERE status = 'solved'").fetchall() == [
+        ("2025-08-05",)
+    ]
+    assert_refresh_matches_rebuild(conn)
+
+
+def test_insert_or_replace_message_and_sentiment(conn):
+    conn.executescript("""
+        INSERT OR REPLACE INTO Message (message_id, content, client_id, timestamp, conversation_id)
+            VALUES (1, 'aircond leaking', 2, '2025-08-03T10:00:00', 2);
+        INSERT OR REPLACE INTO Sentiment_Analysis (sentiment_id, message_id, sentiment)
+            VALUES (2, 1, 'positive');
+    """)
+    assert_refresh_matches_rebuild(conn)
+
+
+@pytest.mark.parametrize(
+    "write",
+    [
+        # inserts
+        """INSERT INTO Conversation (conversation_id, client_id, started_at, status)
+               VALUES (3, 1, '2025-08-01T12:00:00', 'urgent');
+           INSERT INTO Message (message_id, content, client_id, timestamp, conversation_id)
+               VALUES (4, 'no water', 1, '2025-08-01T12:00:00', 3);
+           INSERT INTO Message (message_id, content, agent_id, timestamp, conversation_id)
+               VALUES (5, 'on the way', 7, '2025-08-01T12:30:00', 3);
+           INSERT INTO Sentiment_Analysis (message_id, sentiment) VALUES (4, 'negative');
+           INSERT INTO Emotion_Analysis (message_id, emotion) VALUES (4, 'anger');
+           INSERT INTO Topic_Analysis (conversation_id, topic) VALUES (3, 'maintenance')""",
+        # updates
+        "UPDATE Conversation SET status = 'solved' WHERE conversation_id = 2",
+        "UPDATE Conversation SET started_at = '2025-07-30T08:00:00', client_id = 1 WHERE conversation_id = 2",
+        "UPDATE Message SET timestamp = '2025-08-04T10:00:00' WHERE message_id = 1",
+        "UPDATE Message SET conversation_id = 2, client_id = 2 WHERE message_id = 1",
+        "UPDATE Message SET agent_id = NULL, client_id = 1 WHERE message_id = 2",
+        "UPDATE Sentiment_Analysis SET sentiment = 'positive' WHERE message_id = 1",
+        "UPDATE Emotion_Analysis SET emotion = 'joy' WHERE message_id = 3",
+        "UPDATE Topic_Analysis SET topic = 'noise' WHERE conversation_id = 1",
+        # deletes
+        "DELETE FROM Sentiment_Analysis WHERE message_id = 3",
+        "DELETE FROM Emotion_Analysis WHERE message_id = 1",
+        "DELETE FROM Topic_Analysis WHERE conversation_id = 2",
+        "DELETE FROM Message WHERE message_id = 2",
+        "DELETE FROM Message WHERE conversation_id = 1; DELETE FROM Conversation WHERE conversation_id = 1",
+    ],
+)
+def test_refresh_after_write(conn, write):
+    refresh_rollups(conn)
+    conn.executescript(write)
+    assert_refresh_matches_rebuild(conn)
+
+
+def test_endpoints_follow_writes(serve, tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=6)
+    client = serve(path)
+
+    def read():
+        kpis = client.get(f"{BASE}/kpis").json()
+        tenant = client.get(f"{BASE}/tenants/1").json()["stats"]
+        agents = {a["agentId"]: a for a in client.get(f"{BASE}/agents-performance").json()}
+        return kpis["total"], tenant["conversationCount"], agents["7"]["totalTickets"], agents["7"]["solvedTickets"]
+
+    # Tenant 1 has conversations 1 and 4 (solved, in progress), agent 7 answers 1, 3 and 5.
+    assert read() == (6, 2, 3, 1)
+
+    db = sqlite3.connect(path)
+    db.executescript("""
+        INSERT INTO Conversation (conversation_id, client_id, started_at, status)
+            VALUES (7, 1, '2025-08-07T09:00:00', 'in_progress');
+        INSERT INTO Message (content, agent_id, timestamp, conversation_id) VALUES ('hello', 7, '2025-08-07T09:01:00', 7);
+    """)
+    assert read() == (7, 3, 4, 1)
+
+    db.execute("UPDATE Conversation SET status = 'solved' WHERE conversation_id = 7")
+    db.commit()
+    assert read() == (7, 3, 4, 2)
+
+    db.executescript("DELETE FROM Message WHERE conversation_id = 1; DELETE FROM Conversation WHERE conversation_id = 1;")
+    assert read() == (6, 2, 3, 1)
+    db.close()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Search tests: what build_match makes of what users type, and what /search
+finds with it, in one database or several.
+
+    python -m pytest test_search.py
+"""
+
+import pytest
+
+from conftest import BASE, seed
+from search import build_match
+
+
+def test_words_are_prefixes():
+    assert build_match("slow") == '"slow"*'
+    assert build_match("water leak") == '"water"* AND "leak"*'
+
+
+def test_short_last_word_is_not_a_prefix():
+    assert build_match("ac") == '"ac"'
+
+
+def test_quoted_text_is_a_phrase():
+    assert build_match('"no water" leak') == '"no water" AND "leak"*'
+
+
+def test_spelling_variants():
+    assert build_match("wifi") == '("internet"* OR "wi fi" OR "wifi"*)'
+
+
+@pytest.mark.parametrize(
+    "query, match",
+    [
+        ("wifi,slow", '("internet"* OR "wi fi" OR "wifi"*) AND "slow"*'),
+        ("slow,wifi", '"slow"* AND ("internet"* OR "wi fi" OR "wifi"*)'),
+        ("leak-bocor", '"leak"* AND "bocor"*'),
+        ("paip/bocor", '"paip"* AND "bocor"*'),
+        ("wifi.", '("internet"* OR "wi fi" OR "wifi"*)'),
+    ],
+)
+def test_punctuated_words_are_split(query, match):
+    assert build_match(query) == match
+
+
+def test_nothing_searchable():
+    with pytest.raises(ValueError):
+        build_match('?! "" -')
+
+
+# ----------------------------
+# /search
+# ----------------------------
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=6)
+    return path
+
+
+def search(client, query: str):
+    response = client.get(f"{BASE}/search?{query}")
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.mark.parametrize("query", ["aircond", "aircon", "leaks", "LEAKING"])
+def test_variants_and_stems_find_the_tenant_messages(serve, db, query):
+    hits = search(serve(db), f"q={query}")
+    assert sorted(hit["conversationId"] for hit in hits) == [f"CONV-{i}" for i in range(1, 7)]
+    assert all(hit["senderType"] == "tenant" and "<mark>" in hit["snippet"] for hit in hits)
+
+
+def test_filters_and_context(serve, db):
+    client = serve(db)
+    assert {hit["conversation"]["tenantId"] for hit in search(client, "q=aircond&tenant_id=2")} == {2}
+    assert search(client, "q=aircond&sender=agent") == []
+
+    hit = search(client, "q=aircond%20room%203")[0]
+    assert hit["conversationId"] == "CONV-3"
+    assert [m["content"] for m in hit["context"]["after"]] == ["we check tomorrow"]
+
+
+def test_pages_across_databases(serve, db, tmp_path):
+    archive = str(tmp_path / "archive.db")
+    seed(archive, conversations=5, first_id=100)
+    client = serve(db, archive)
+
+    hits, cursor = [], ""
+    while True:
+        response = client.get(f"{BASE}/search?q=leak&limit=4" + (f"&cursor={cursor}" if cursor else ""))
+        hits += response.json()
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(hits) == 11
+    assert len({hit["conversationId"] for hit in hits}) == 11
+    assert [hit["score"] for hit in hits] == sorted(hit["score"] for hit in hits)[::-1]
+
+
+def test_nothing_to_search_for(serve, db):
+    assert serve(db).get(f"{BASE}/search?q=%3F%21").status_code == 400
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Launcher tests: the timeouts the supervisor runs with, and a served database
+that keeps answering through a graceful reload.
+
+    python -m pytest test_serve.py
+"""
+
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+import serve
+from conftest import BASE, seed
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_reloads_wait_for_warmup_pings_do_not(monkeypatch):
+    seen = []
+    monkeypatch.setattr(Multiprocess, "restart_all", lambda self: seen.append(self.config.timeout_worker_healthcheck))
+    config = uvicorn.Config("main:app", timeout_worker_healthcheck=5)
+    supervisor = serve.Supervisor(config, [], startup_timeout=600)
+
+    supervisor.restart_all()
+    assert seen == [600]
+    assert config.timeout_worker_healthcheck == 5  # what keep_subprocess_alive pings with
+
+
+def test_command_line(monkeypatch):
+    calls = []
+    monkeypatch.setattr(serve, "serve", lambda *args: calls.append(args))
+    monkeypatch.setenv("HEALTHCHECK_TIMEOUT", "3")
+    monkeypatch.setenv("WARMUP", "1")
+    serve.main(["--workers", "0", "--port", "4100", "--no-warmup"])
+    assert calls == [("127.0.0.1", 4100, 1, 30, 600, 3)]
+    assert os.environ["WARMUP"] == "0"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url: str, deadline: float) -> bytes:
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                return response.read()
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="SIGHUP")
+def test_main_serves_through_a_reload(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=6)
+    port = free_port()
+    env = dict(os.environ, CHAT_DB_PATH=path, PORT=str(port), WEB_CONCURRENCY="2", WARMUP="0")
+    url = f"http://127.0.0.1:{port}{BASE}/kpis"
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=HERE, env=env, stderr=subprocess.DEVNULL)
+    try:
+        kpis = get(url, time.monotonic() + 60)
+        process.send_signal(signal.SIGHUP)
+        deadline = time.monotonic() + 60
+        for _ in range(20):
+            assert get(url, deadline) == kpis
+        assert process.poll() is None
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
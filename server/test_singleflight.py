@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Single-flight tests: identical requests that overlap share one run of the
+endpoint; anything else runs on its own.
+
+    python -m pytest test_singleflight.py
+"""
+
+import asyncio
+
+import singleflight
+from singleflight import SingleFlightMiddleware
+
+
+def request(path: str = "/api/kpis", query: bytes = b"", method: str = "GET"):
+    return {"type": "http", "method": method, "path": path, "query_string": query, "headers": []}
+
+
+def slow_app():
+    """An endpoint that takes a while and counts how often it ran."""
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": f'{{"call": {len(calls)}}}'.encode()})
+
+    return app, calls
+
+
+async def fetch(app, scope):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"], b"".join(m.get("body", b"") for m in messages[1:])
+
+
+def test_overlapping_requests_share_one_run():
+    app, calls = slow_app()
+    middleware = SingleFlightMiddleware(app, prefix="/api")
+    before = singleflight.stats()
+
+    async def overlap():
+        # The same request with its parameters in another order is the same request.
+        scopes = [request(query=b"a=1&b=2")] * 4 + [request(query=b"b=2&a=1")]
+        return await asyncio.gather(*(fetch(middleware, scope) for scope in scopes))
+
+    responses = asyncio.run(overlap())
+    assert calls == ["/api/kpis"]
+    assert responses == [(200, b'{"call": 1}')] * 5
+    after = singleflight.stats()
+    assert (after["leaders"] - before["leaders"], after["followers"] - before["followers"]) == (1, 4)
+
+
+def test_different_or_later_requests_run_again():
+    app, calls = slow_app()
+    middleware = SingleFlightMiddleware(app, prefix="/api", exclude=("/stream",))
+
+    async def overlap():
+        return await asyncio.gather(
+            fetch(middleware, request()),
+            fetch(middleware, request(query=b"status=solved")),
+            fetch(middleware, request("/api/stream")),
+            fetch(middleware, request("/api/stream")),
+            fetch(middleware, request(method="POST")),
+        )
+
+    asyncio.run(overlap())
+    assert len(calls) == 5
+    asyncio.run(fetch(middleware, request()))  # nothing kept once the first one finished
+    assert len(calls) == 6
+
+
+def test_followers_recompute_when_the_leader_fails():
+    runs = []
+
+    async def app(scope, receive, send):
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        if len(runs) == 1:
+            raise RuntimeError("boom")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = SingleFlightMiddleware(app, prefix="/api")
+
+    async def overlap():
+        return await asyncio.gather(
+            fetch(middleware, request()), fetch(middleware, request()), return_exceptions=True
+        )
+
+    leader, follower = asyncio.run(overlap())
+    assert isinstance(leader, RuntimeError)
+    assert follower == (200, b"ok")
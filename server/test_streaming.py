@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+NDJSON export tests: a streamed /conversations holds, line by line, what the
+JSON list holds.
+
+    python -m pytest test_streaming.py
+"""
+
+import json
+
+import pytest
+
+import main
+from conftest import BASE, seed
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=7)
+    return path
+
+
+def lines(response):
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.text.endswith("\n")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def by_id(conversations):
+    return sorted(conversations, key=lambda c: c["id"])
+
+
+@pytest.mark.parametrize("query, headers", [
+    ("?stream=1", {}),
+    ("", {"Accept": "application/x-ndjson"}),
+    ("?stream=1&status=urgent", {}),
+    ("?stream=1&include_messages=false", {}),
+])
+def test_lines_are_the_json_list(serve, db, query, headers):
+    client = serve(db)
+    streamed = lines(client.get(f"{BASE}/conversations{query}", headers=headers))
+    listed = client.get(f"{BASE}/conversations{query.replace('stream=1', 'stream=0')}").json()
+    assert streamed and by_id(streamed) == by_id(listed)
+
+
+def test_every_database(serve, db, tmp_path):
+    history = str(tmp_path / "history.db")
+    seed(history, conversations=4, first_id=101)
+    streamed = lines(serve(db, history).get(f"{BASE}/conversations?stream=1&include_messages=false"))
+    assert len(streamed) == 11 and {"CONV-1", "CONV-101"} <= {c["id"] for c in streamed}
+
+
+def test_sent_in_chunks(serve, db, monkeypatch):
+    serve(db)
+    monkeypatch.setattr(main, "STREAM_CHUNK_SIZE", 3)
+    chunks = list(main.stream_conversation_documents([], [], include_messages=False))
+    assert [chunk.count("\n") for chunk in chunks] == [3, 3, 1]
+
+
+@pytest.mark.parametrize("query", ["limit=2", "cursor=abc"])
+def test_not_paged(serve, db, query):
+    assert serve(db).get(f"{BASE}/conversations?stream=1&{query}").status_code == 400
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+/tenants tests: per-tenant aggregates, and ages that stay right across midnight.
+
+    python -m pytest test_tenants.py
+"""
+
+import sqlite3
+from datetime import date
+
+import pytest
+
+import http_cache
+from conftest import BASE, seed
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=6)
+    conn = sqlite3.connect(path)
+    conn.execute("UPDATE Client SET date_of_birth = '1990-06-15' WHERE client_id = 1")
+    conn.commit()
+    conn.close()
+    return path
+
+
+class Today(date):
+    """date whose today() the test sets."""
+    value = date(2025, 8, 1)
+
+    @classmethod
+    def today(cls):
+        return cls.value
+
+
+def age_on(day: date, born: date) -> int:
+    return day.year - born.year - ((day.month, day.day) < (born.month, born.day))
+
+
+def test_aggregates(serve, db):
+    tenant = serve(db).get(f"{BASE}/tenants/1").json()
+    # Conversations 1 (solved) and 4 (in progress).
+    assert tenant["stats"]["conversationCount"] == 2
+    assert tenant["age"] == age_on(date.today(), date(1990, 6, 15))
+
+
+def test_dated_answers_expire_at_midnight(serve, db, monkeypatch):
+    monkeypatch.setattr(http_cache, "date", Today)
+    client = serve(db)
+    tenants = client.get(f"{BASE}/tenants/1").headers["etag"]
+    kpis = client.get(f"{BASE}/kpis").headers["etag"]
+    assert client.get(f"{BASE}/tenants/1", headers={"If-None-Match": tenants}).status_code == 304
+
+    monkeypatch.setattr(Today, "value", date(2025, 8, 2))
+    response = client.get(f"{BASE}/tenants/1", headers={"If-None-Match": tenants})
+    assert response.status_code == 200 and response.headers["etag"] != tenants
+    # Answers that do not depend on the date keep their tag.
+    assert client.get(f"{BASE}/kpis", headers={"If-None-Match": kpis}).status_code == 304
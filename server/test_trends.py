@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Trend tests: sentiment and emotion series bucketed in the caller's timezone.
+
+    python -m pytest test_trends.py
+"""
+
+import sqlite3
+
+import pytest
+
+from conftest import BASE, seed
+
+
+@pytest.fixture
+def db(tmp_path):
+    # Twelve days from Friday 2025-08-01, messages at 09:00 and 09:05 UTC.
+    path = str(tmp_path / "live.db")
+    seed(path, conversations=12)
+    return path
+
+
+def series(client, path, **params):
+    response = client.get(f"{BASE}/{path}", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()["series"]
+
+
+@pytest.mark.parametrize("granularity, buckets", [
+    ("day", [("2025-08-01T00:00:00+00:00", 2), ("2025-08-02T00:00:00+00:00", 2)]),
+    # Weeks start on Monday.
+    ("week", [("2025-07-28T00:00:00+00:00", 6), ("2025-08-04T00:00:00+00:00", 14), ("2025-08-11T00:00:00+00:00", 4)]),
+    ("month", [("2025-08-01T00:00:00+00:00", 24)]),
+])
+def test_buckets(serve, db, granularity, buckets):
+    points = series(serve(db), "sentiment-trend", granularity=granularity)
+    assert [(point["bucket"], point["total"]) for point in points][:len(buckets)] == buckets
+    assert sum(point["total"] for point in points) == 24
+
+
+def test_sentiment_split(serve, db):
+    first, second = series(serve(db), "sentiment-trend", date_to="2025-08-02")
+    # The tenant's message is negative, then positive; agents' replies are neutral.
+    assert first == {"bucket": "2025-08-01T00:00:00+00:00", "total": 2, "positive": 0, "neutral": 1, "negative": 1}
+    assert second == {"bucket": "2025-08-02T00:00:00+00:00", "total": 2, "positive": 1, "neutral": 1, "negative": 0}
+
+
+def test_buckets_in_local_time(serve, db):
+    # 09:00 UTC is 14:30 in Kolkata; the whole local day of 2025-08-03 and no more.
+    points = series(serve(db), "sentiment-trend", granularity="hour", tz="Asia/Kolkata",
+                    date_from="2025-08-03", date_to="2025-08-03")
+    assert [(point["bucket"], point["total"]) for point in points] == [("2025-08-03T14:00:00+05:30", 2)]
+
+
+def test_offset_changes_within_the_range(serve, db):
+    conn = sqlite3.connect(db)
+    for stamp in ("2025-03-08T12:00:00", "2025-03-10T12:00:00"):  # either side of New York's DST switch
+        message = conn.execute("INSERT INTO Message (content, timestamp) VALUES ('x', ?)", (stamp,)).lastrowid
+        conn.execute("INSERT INTO Sentiment_Analysis (message_id, sentiment) VALUES (?, 'positive')", (message,))
+    conn.commit()
+    conn.close()
+
+    points = series(serve(db), "sentiment-trend", tz="America/New_York")
+    assert [point["bucket"] for point in points[:3]] == [
+        "2025-03-08T00:00:00-05:00", "2025-03-10T00:00:00-04:00", "2025-08-01T00:00:00-04:00",
+    ]
+
+
+def test_emotions(serve, db):
+    points = series(serve(db), "emotion-trend", granularity="week")
+    assert points[0] == {
+        "bucket": "2025-07-28T00:00:00+00:00", "total": 3, "emotions": {"anger": 1, "joy": 1, "sadness": 1},
+    }
+
+
+@pytest.mark.parametrize("params", [{"tz": "Mars/Olympus"}, {"date_from": "yesterday"}, {"granularity": "year"}])
+def test_bad_parameters(serve, db, params):
+    assert serve(db).get(f"{BASE}/sentiment-trend", params=params).status_code in (400, 422)
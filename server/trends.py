@@ -0,0 +1,223 @@
+"""
+Time-bucketed sentiment and emotion series for the trend charts.
+
+Messages are grouped in SQL by the start of their hour/day/week/month in the
+caller's timezone, so a response holds one point per bucket instead of every
+message. Stored timestamps are naive UTC. Joins are CROSS JOINs so SQLite walks
+messages through the timestamp index and looks each analysis up by message.
+"""
+
+import sqlite3
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+GRANULARITIES = ("hour", "day", "week", "month")
+
+# Bucket start (naive, local time) for an expression yielding a local datetime.
+_BUCKET_SQL = {
+    "hour": "strftime('%Y-%m-%dT%H:00:00', {local})",
+    "day": "strftime('%Y-%m-%dT00:00:00', {local})",
+    # Weeks start on Monday: jump to the coming Sunday, then back six days.
+    "week": "strftime('%Y-%m-%dT00:00:00', {local}, 'weekday 0', '-6 days')",
+    "month": "strftime('%Y-%m-01T00:00:00', {local})",
+}
+
+
+def _to_local(ts: Optional[str], tz_name: str) -> Optional[str]:
+    if not ts:
+        return None
+    try:
+        dt = datetime.fromisoformat(ts)
+    except ValueError:
+        return None
+    return dt.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(tz_name)).replace(tzinfo=None).isoformat()
+
+
+def _fixed_offset(tz: ZoneInfo, start: datetime, end: datetime) -> Optional[timedelta]:
+    """The zone's UTC offset if it does not change between start and end (sampled monthly)."""
+    offsets = set()
+    probe = start
+    while probe < end:
+        offsets.add(probe.replace(tzinfo=timezone.utc).astimezone(tz).utcoffset())
+        probe += timedelta(days=28)
+    offsets.add(end.replace(tzinfo=timezone.utc).astimezone(tz).utcoffset())
+    return offsets.pop() if len(offsets) == 1 else None
+
+
+def utc_bound(value: str, tz: ZoneInfo, end: bool = False) -> datetime:
+    """
+    Parse a query-string date in the caller's timezone into a naive UTC bound.
+
+    A bare date used as an upper bound covers that whole local day.
+    """
+    value = value.strip()
+    if len(value) == 10:
+        day = date.fromisoformat(value)
+        if end:
+            day += timedelta(days=1)
+        local = datetime(day.year, day.month, day.day, tzinfo=tz)
+    else:
+        local = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if local.tzinfo is None:
+            local = local.replace(tzinfo=tz)
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _local_expression(
+    conn: sqlite3.Connection, tz: ZoneInfo, start: datetime, end: datetime
+) -> Tuple[str, str]:
+    """
+    SQL turning m.timestamp into local time, plus its parameter.
+
+    Zones without an offset change in range use SQLite's own date modifier;
+    otherwise a Python function applies the zone rules per row.
+    """
+    offset = _fixed_offset(tz, start, end)
+    if offset is not None:
+        minutes = int(offset.total_seconds() // 60)
+        return "datetime(m.timestamp, ?)", f"{minutes:+d} minutes"
+    conn.create_function("to_local", 2, _to_local, deterministic=True)
+    return "to_local(m.timestamp, ?)", tz.key
+
+
+def _range(
+    conn: sqlite3.Connection, tz: ZoneInfo, date_from: Optional[str], date_to: Optional[str]
+) -> Tuple[List[str], List, datetime, datetime]:
+    clauses: List[str] = []
+    params: List = []
+    start = end = None
+    if date_from:
+        start = utc_bound(date_from, tz)
+        clauses.append("m.timestamp >= ?")
+        params.append(start.isoformat())
+    if date_to:
+        end = utc_bound(date_to, tz, end=True)
+        clauses.append("m.timestamp < ?")
+        params.append(end.isoformat())
+    if start is None or end is None:
+        lo, hi = conn.execute("SELECT MIN(timestamp), MAX(timestamp) FROM Message").fetchone()
+        now = datetime.utcnow()
+        start = start or (datetime.fromisoformat(lo) if lo else now)
+        end = end or (datetime.fromisoformat(hi) if hi else now)
+    return clauses, params, start, end
+
+
+def _bucket_query(
+    conn: sqlite3.Connection,
+    granularity: str,
+    tz_name: str,
+    date_from: Optional[str],
+    date_to: Optional[str],
+) -> Tuple[ZoneInfo, str, List[str], List]:
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    tz = ZoneInfo(tz_name)
+    clauses, params, start, end = _range(conn, tz, date_from, date_to)
+    local, local_param = _local_expression(conn, tz, start, end)
+    bucket = _BUCKET_SQL[granularity].format(local=local)
+    return tz, bucket, clauses, [local_param] + params
+
+
+def _label(bucket: str, tz: ZoneInfo) -> str:
+    return datetime.fromisoformat(bucket).replace(tzinfo=tz).isoformat()
+
+
+def sentiment_trend(
+    conn: sqlite3.Connection,
+    granularity: str = "day",
+    tz_name: str = "UTC",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> List[Dict]:
+    """Analysed messages per bucket, split into positive / neutral / negative."""
+    tz, bucket, clauses, params = _bucket_query(conn, granularity, tz_name, date_from, date_to)
+    where = "".join(f" AND {c}" for c in clauses)
+    rows = conn.execute(f"""
+        SELECT
+            {bucket} AS bucket,
+            COUNT(*) AS total,
+            COUNT(*) FILTER (WHERE sa.sentiment = 'positive') AS positive,
+            COUNT(*) FILTER (WHERE sa.sentiment = 'negative') AS negative
+        FROM Message m
+        CROSS JOIN Sentiment_Analysis sa ON sa.message_id = m.message_id
+        WHERE m.timestamp IS NOT NULL{where}
+        GROUP BY bucket
+        HAVING bucket IS NOT NULL
+        ORDER BY bucket
+    """, params).fetchall()
+
+    return [
+        {
+            "bucket": _label(row["bucket"], tz),
+            "total": row["total"],
+            "positive": row["positive"],
+            "neutral": row["total"] - row["positive"] - row["negative"],
+            "negative": row["negative"],
+        }
+        for row in rows
+    ]
+
+
+def emotion_trend(
+    conn: sqlite3.Connection,
+    granularity: str = "day",
+    tz_name: str = "UTC",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> List[Dict]:
+    """Per bucket: how many analysed messages there were and how many carried each emotion."""
+    tz, bucket, clauses, params = _bucket_query(conn, granularity, tz_name, date_from, date_to)
+    where = "".join(f" AND {c}" for c in clauses)
+    rows = conn.execute(f"""
+        SELECT
+            {bucket} AS bucket,
+            ea.emotion,
+            COUNT(DISTINCT m.message_id) AS count
+        FROM Message m
+        CROSS JOIN Emotion_Analysis ea ON ea.message_id = m.message_id
+        WHERE m.timestamp IS NOT NULL{where}
+        GROUP BY bucket, ea.emotion
+        HAVING bucket IS NOT NULL
+        ORDER BY bucket
+    """, params).fetchall()
+    totals = conn.execute(f"""
+        SELECT {bucket} AS bucket, COUNT(DISTINCT m.message_id) AS total
+        FROM Message m
+        CROSS JOIN Emotion_Analysis ea ON ea.message_id = m.message_id
+        WHERE m.timestamp IS NOT NULL{where}
+        GROUP BY bucket
+        HAVING bucket IS NOT NULL
+    """, params).fetchall()
+
+    emotions: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for row in rows:
+        emotions[row["bucket"]][row["emotion"]] = row["count"]
+    return [
+        {"bucket": _label(row["bucket"], tz), "total": row["total"], "emotions": emotions[row["bucket"]]}
+        for row in sorted(totals, key=lambda r: r["bucket"])
+    ]
+
+
+def merge_series(results: List[List[Dict]]) -> List[Dict]:
+    """
+    Series computed on several databases as one: per bucket the counts are
+    added, emotion counts emotion by emotion.
+    """
+    if len(results) == 1:
+        return results[0]
+    merged: Dict[str, Dict] = {}
+    for series in results:
+        for point in series:
+            into = merged.setdefault(point["bucket"], {"bucket": point["bucket"]})
+            for field, value in point.items():
+                if field == "bucket":
+                    continue
+                if isinstance(value, dict):
+                    counts = into.setdefault(field, {})
+                    for name, count in value.items():
+                        counts[name] = counts.get(name, 0) + count
+                else:
+                    into[field] = into.get(field, 0) + value
+    return [merged[bucket] for bucket in sorted(merged)]
@@ -0,0 +1,104 @@
+"""
+Cache warmup before a server process takes traffic.
+
+Called at the end of the lifespan startup: each WARMUP_PATHS request is run
+through the whole application in process (no socket), as a dashboard's first
+load would. That refreshes rollups, documents and digests touched since the
+last read, fills the KPI cache, pulls the pages those queries read into memory
+and leaves the bodies in the response cache. uvicorn starts accepting only once
+the startup has finished, and on a rolling reload (serve.py) the worker being
+replaced keeps serving until then.
+
+    WARMUP=0                                   skip it (development)
+    WARMUP_PATHS=/kpis,/conversations,...      comma-separated, under the API base path
+"""
+
+import logging
+import os
+import time
+from typing import Dict, List, Sequence
+
+from starlette.types import ASGIApp, Message
+
+# What the dashboard loads first, then the chart endpoints behind the rollups.
+DEFAULT_PATHS = (
+    "/kpis",
+    "/conversations",
+    "/agents",
+    "/tenants",
+    "/sentiment-distribution",
+    "/emotion-distribution",
+    "/sentiment-by-service",
+    "/emotion-by-service",
+    "/trending-topics",
+    "/sentiment-trend",
+    "/emotion-trend",
+    "/agents-performance",
+    "/summary",
+)
+WARMUP = os.environ.get("WARMUP", "1").strip().lower() not in ("0", "false", "no")
+WARMUP_PATHS = [
+    path.strip() for path in os.environ.get("WARMUP_PATHS", ",".join(DEFAULT_PATHS)).split(",") if path.strip()
+]
+# Browsers ask for these; the compressed body is what gets cached for them.
+ACCEPT_ENCODING = b"gzip, deflate, br"
+
+logger = logging.getLogger(__name__)
+
+
+async def request(app: ASGIApp, target: str) -> Dict:
+    """GET `target` through `app` in process. Returns its status, body size and time."""
+    path, _, query = target.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"warmup"), (b"accept", b"application/json"), (b"accept-encoding", ACCEPT_ENCODING)],
+        "client": ("127.0.0.1", 0),
+        "server": ("warmup", 0),
+    }
+    received = [False]
+    result = {"path": target, "status": 0, "bytes": 0}
+
+    async def receive() -> Message:
+        if received[0]:
+            return {"type": "http.disconnect"}  # asked again only once the response is out
+        received[0] = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            result["bytes"] += len(message.get("body", b""))
+
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+async def warm(app: ASGIApp, base: str, paths: Sequence[str]) -> List[Dict]:
+    """Request every path under `base` once, one after the other; failures are logged, not raised."""
+    started = time.perf_counter()
+    results = []
+    for path in paths:
+        try:
+            result = await request(app, base + path)
+        except Exception:
+            logger.exception(f"Warmup request {path} failed")
+            continue
+        results.append(result)
+        if result["status"] != 200:
+            logger.warning(f"Warmup request {path} answered {result['status']}")
+    logger.info(
+        f"Warmed {len(results)} endpoints in {time.perf_counter() - started:.1f}s: "
+        + ", ".join(f"{result['path'][len(base):]} {result['ms']:.0f}ms" for result in results)
+    )
+    return results